@@ -5,15 +5,41 @@ from typing import List, Dict
 
 import httpx
 
+from .config import thba_app_settings
+from .hedge_helper import hedged_call
+from .rate_limiter import llm_rate_limiter, estimate_tokens, raise_for_rate_limit, response_total_tokens
+
 logger = logging.getLogger(__name__)
 
 
 class AiHelper:
-  def __init__(self, api_key: str, base_url: str, model: str, max_tokens: int = 128000):
+  def __init__(
+      self,
+      api_key: str,
+      base_url: str,
+      model: str,
+      max_tokens: int = 128000,
+      fallback_model: str = "",
+      fallback_base_url: str = "",
+      fallback_api_key: str = "",
+      deadline: float = 0,
+      hedge_percentile: float = thba_app_settings.LLM_HEDGE_PERCENTILE,
+      hedge_default_delay: float = thba_app_settings.LLM_HEDGE_DEFAULT_DELAY,
+  ):
+    """
+    :param fallback_model: 备用模型（OpenAI 兼容接口），主模型慢于历史 hedge_percentile 分位或返回无效结果时发出对冲请求
+    :param deadline: 单次提取的截止时间（秒），超时放弃，0 表示不限
+    """
     self.api_key = api_key
     self.base_url = base_url.rstrip("/")
     self.model = model
     self.max_tokens = max_tokens
+    self.fallback_model = fallback_model
+    self.fallback_base_url = fallback_base_url.rstrip("/")
+    self.fallback_api_key = fallback_api_key
+    self.deadline = deadline
+    self.hedge_percentile = hedge_percentile
+    self.hedge_default_delay = hedge_default_delay
 
   async def extract_terms_from_text(self, book_text: str) -> List[Dict[str, str]]:
     """
@@ -50,22 +76,48 @@ class AiHelper:
         {safe_text} 
         """
 
-    # 3. 调用 OpenAI 兼容接口
-    url = f"{self.base_url}/chat/completions"
+    # 3. 调用 OpenAI 兼容接口（配置了备用模型时，主模型过慢或返回无效结果会向备用模型发出对冲请求）
+    messages = [{"role": "user", "content": prompt}]
+    primary = (self.model, lambda: self._request_terms(self.model, self.base_url, self.api_key, messages))
+    secondary = None
+    if self.fallback_model and self.fallback_model != self.model:
+      secondary = (self.fallback_model, lambda: self._request_terms(self.fallback_model, self.fallback_base_url or self.base_url, self.fallback_api_key or self.api_key, messages))
+    terms, hedge = await hedged_call(primary, secondary, self.deadline, self.hedge_percentile, self.hedge_default_delay)
+    if hedge["hedged"] or hedge["timed_out"]:
+      logger.info(
+          f"AI 术语提取对冲结果: 胜出 {hedge['winner'] or '无'}（{hedge['winner_model']}），"
+          f"耗时 {hedge['latency_s']}s，估计节省 {hedge['saved_s_est']}s，超时 {hedge['timed_out']}"
+      )
+    return terms or []
+
+  async def _request_terms(self, model: str, base_url: str, api_key: str, messages: List[Dict]) -> List[Dict[str, str]]:
+    url = f"{base_url}/chat/completions"
     headers = {
-      "Authorization": f"Bearer {self.api_key}",
+      "Authorization": f"Bearer {api_key}",
       "Content-Type": "application/json"
     }
     payload = {
-      "model": self.model,
-      "messages": [{"role": "user", "content": prompt}],
+      "model": model,
+      "messages": messages,
       "temperature": 0.3,  # 降低温度，让结果更确定、更像知识库
       "stream": False
     }
 
-    try:
+    async def _post() -> httpx.Response:
       async with httpx.AsyncClient(timeout=120) as client:  # 放宽超时时间，长文本处理较慢
         resp = await client.post(url, json=payload, headers=headers)
+      raise_for_rate_limit(resp)
+      if resp.status_code >= 500:
+        # 其余 5xx 抛出 HTTPStatusError，由限流器按可重试错误退避重试
+        resp.raise_for_status()
+      return resp
+
+    try:
+      # 经进程级限流器调用：429 按 Retry-After 冷却后重试，多个提取任务共享同一模型的额度
+      resp = await llm_rate_limiter.call(
+          model, _post, estimate_tokens(payload["messages"]),
+          lambda r: response_total_tokens(r.json()) if r.status_code == 200 else None
+      )
 
       if resp.status_code != 200:
         logger.error(f"AI API Error {resp.status_code}: {resp.text}")
@@ -84,5 +136,5 @@ class AiHelper:
       return []
 
     except Exception as e:
-      logger.error(f"AI 提取失败: {e}")
+      logger.error(f"AI 提取失败 ({model}): {e}")
       return []
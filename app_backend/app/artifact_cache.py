@@ -0,0 +1,164 @@
+# app/artifact_cache.py
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import unicodedata
+from typing import Any, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+  """文本归一化：NFKC + 折叠空白，保证同一段旁白只产生一个缓存键"""
+  return " ".join(unicodedata.normalize("NFKC", text or "").split())
+
+
+class ArtifactCache:
+  """
+  内容寻址的本地产物缓存（按命名空间隔离）。
+
+  目录结构: {root}/{namespace}/{key[:2]}/{key}{suffix} + 同名 .json 元数据。
+  命中时刷新 mtime，超过 max_bytes 时按 mtime 由旧到新淘汰（近似 LRU）。
+  占用量按目录在进程内增量估算，只有估算值超限（或每 RESCAN_EVERY 次写入校准一次）时才扫描整个目录。
+  缓存位于任务目录之外，不会被视频流水线结束时的 rmtree 清理掉。
+  """
+
+  _lock = threading.Lock()
+  # 进程内按缓存目录共享的占用估算与写入计数（同一命名空间会被多处分别实例化）
+  _usage: Dict[str, int] = {}
+  _writes: Dict[str, int] = {}
+  # 每写入这么多次强制扫描校准一次，兼顾其他进程写入与外部删除造成的偏差
+  RESCAN_EVERY = 256
+
+  def __init__(self, namespace: str, root: str = "var/cache", max_bytes: int = 2 * 1024 ** 3):
+    self.namespace = namespace
+    self.home = os.path.join(root, namespace)
+    self.max_bytes = max_bytes
+
+  @staticmethod
+  def make_key(*parts: Any) -> str:
+    """由任意可序列化片段生成稳定的 sha256 键"""
+    digest = hashlib.sha256()
+    for part in parts:
+      if isinstance(part, bytes):
+        digest.update(part)
+      else:
+        digest.update(json.dumps(part, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8"))
+      digest.update(b"\x00")
+    return digest.hexdigest()
+
+  @staticmethod
+  def hash_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+      while chunk := f.read(chunk_size):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+  def _paths(self, key: str, suffix: str) -> Tuple[str, str]:
+    base = os.path.join(self.home, key[:2], key)
+    return f"{base}{suffix}", f"{base}.json"
+
+  def get(self, key: str, suffix: str = "") -> Tuple[str, Dict[str, Any]] | None:
+    """命中返回 (文件路径, 元数据)，未命中返回 None"""
+    data_path, meta_path = self._paths(key, suffix)
+    if not os.path.exists(data_path):
+      return None
+    meta: Dict[str, Any] = {}
+    if os.path.exists(meta_path):
+      try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+          meta = json.load(f)
+      except (OSError, json.JSONDecodeError):
+        # 元数据损坏视为未命中，由调用方重新生成
+        return None
+    try:
+      os.utime(data_path)
+    except OSError:
+      pass
+    return data_path, meta
+
+  def put(self, key: str, src_path: str, meta: Dict[str, Any] | None = None, suffix: str = "", move: bool = False) -> str:
+    """写入缓存（先写临时文件再原子替换），返回缓存内文件路径"""
+    data_path, meta_path = self._paths(key, suffix)
+    os.makedirs(os.path.dirname(data_path), exist_ok=True)
+
+    tmp_path = f"{data_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+      replaced = os.path.getsize(data_path)
+    except OSError:
+      replaced = 0
+    if move:
+      shutil.move(src_path, tmp_path)
+    else:
+      shutil.copyfile(src_path, tmp_path)
+    os.replace(tmp_path, data_path)
+
+    with open(f"{meta_path}.tmp", "w", encoding="utf-8") as f:
+      json.dump(meta or {}, f, ensure_ascii=False)
+    os.replace(f"{meta_path}.tmp", meta_path)
+
+    with self._lock:
+      writes = self._writes[self.home] = self._writes.get(self.home, 0) + 1
+      usage = self._usage.get(self.home)
+      if usage is not None:
+        usage = self._usage[self.home] = usage + os.path.getsize(data_path) - replaced
+    if usage is None or usage > self.max_bytes or writes % self.RESCAN_EVERY == 0:
+      self.evict()
+    return data_path
+
+  def fetch(self, key: str, dest_path: str, suffix: str = "") -> Dict[str, Any] | None:
+    """命中时把缓存文件复制到 dest_path，返回元数据（复制而非硬链接，避免调用方原地改写污染缓存）"""
+    hit = self.get(key, suffix)
+    if not hit:
+      return None
+    data_path, meta = hit
+    os.makedirs(os.path.dirname(dest_path) or ".", exist_ok=True)
+    shutil.copyfile(data_path, dest_path)
+    return meta
+
+  def evict(self) -> int:
+    """按 mtime 淘汰最旧的条目，直到总大小不超过 max_bytes，返回淘汰条目数"""
+    if self.max_bytes <= 0 or not os.path.isdir(self.home):
+      return 0
+
+    with self._lock:
+      entries = []
+      total = 0
+      for bucket in os.scandir(self.home):
+        if not bucket.is_dir():
+          continue
+        for entry in os.scandir(bucket.path):
+          if entry.name.endswith(".json") or entry.name.endswith(".tmp"):
+            continue
+          try:
+            stat = entry.stat()
+          except FileNotFoundError:
+            continue
+          entries.append((stat.st_mtime, stat.st_size, entry.path))
+          total += stat.st_size
+
+      if total <= self.max_bytes:
+        self._usage[self.home] = total
+        return 0
+
+      removed = 0
+      entries.sort()
+      for _mtime, size, path in entries:
+        if total <= self.max_bytes:
+          break
+        meta_path = f"{os.path.splitext(path)[0]}.json"
+        for p in (path, meta_path):
+          try:
+            os.remove(p)
+          except OSError:
+            pass
+        total -= size
+        removed += 1
+      self._usage[self.home] = total
+
+      logger.info(f"[Cache:{self.namespace}] 淘汰 {removed} 个条目，当前占用 {total / 1024 / 1024:.1f}MB")
+      return removed
@@ -0,0 +1,137 @@
+# app/asset_resolver.py
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, Tuple
+
+import httpx
+
+from .artifact_cache import ArtifactCache
+
+logger = logging.getLogger(__name__)
+
+
+class AssetResolver:
+  """
+  OSS 素材（书页 WebP 等）的本地优先解析器，按以下顺序查找，命中即止：
+  1. 本节点的书籍解析产物：process_pdf_logic 生成的文件位于 {local_root}/{object_key}，与 OSS 路径一一对应，直接引用不复制
+  2. 跨任务产物缓存：以 object_key + 版本号寻址（版本号变化即视为新内容，如重新解析后的书页 ID）
+  3. 剩余的经签名地址并发流式下载（限并发、失败重试），边下边写盘，完成后写入缓存
+  """
+
+  def __init__(
+      self,
+      sign_url: Callable[[str], Awaitable[str]],
+      local_root: str = "var",
+      cache: ArtifactCache | None = None,
+      max_concurrency: int = 8,
+      timeout: float = 60,
+      max_retries: int = 3,
+      chunk_size: int = 256 * 1024,
+  ):
+    """
+    :param sign_url: 由 object_key 获取下载签名地址的协程函数
+    :param local_root: 书籍解析产物的本地根目录（OSS 路径即去掉该前缀后的相对路径）
+    :param max_concurrency: 同时进行的下载数
+    :param max_retries: 单个文件的最大尝试次数（网络错误与 5xx 重试，4xx 直接放弃）
+    """
+    self.sign_url = sign_url
+    self.local_root = local_root
+    self.cache = cache
+    self.max_concurrency = max(1, max_concurrency)
+    self.timeout = timeout
+    self.max_retries = max(1, max_retries)
+    self.chunk_size = chunk_size
+
+  def _local_path(self, object_key: str) -> str | None:
+    path = os.path.join(self.local_root, object_key.lstrip("/"))
+    return path if os.path.exists(path) and os.path.getsize(path) > 100 else None
+
+  async def resolve_many(
+      self,
+      assets: Dict[int, Tuple[str, str]],
+      dest_dir: str,
+      suffix: str = "",
+      progress: Callable[[int, int], Awaitable[None]] | None = None,
+  ) -> Dict[int, str]:
+    """
+    :param assets: {序号: (object_key, 版本号)}
+    :param dest_dir: 需要下载或从缓存取回时的落盘目录，文件名为 {序号}{suffix}
+    :param progress: 每完成一个下载回调 (已完成数, 待下载总数)
+    :return: {序号: 本地路径}；获取失败的序号不在结果中，由调用方决定是否容忍
+    """
+    started = time.perf_counter()
+    resolved: Dict[int, str] = {}
+    pending: Dict[int, Tuple[str, str, str]] = {}
+    local_hits = cache_hits = 0
+
+    for seq, (object_key, version) in assets.items():
+      local_path = self._local_path(object_key)
+      if local_path:
+        resolved[seq] = local_path
+        local_hits += 1
+        continue
+      dest_path = os.path.join(dest_dir, f"{seq}{suffix}")
+      cache_key = ArtifactCache.make_key("asset", object_key, version)
+      if self.cache and self.cache.fetch(cache_key, dest_path, suffix=suffix) is not None:
+        resolved[seq] = dest_path
+        cache_hits += 1
+        continue
+      pending[seq] = (object_key, dest_path, cache_key)
+
+    if pending:
+      os.makedirs(dest_dir, exist_ok=True)
+      semaphore = asyncio.Semaphore(self.max_concurrency)
+      done = 0
+      limits = httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency)
+
+      async with httpx.AsyncClient(timeout=self.timeout, limits=limits) as client:
+
+        async def _fetch(seq: int, object_key: str, dest_path: str, cache_key: str):
+          nonlocal done
+          async with semaphore:
+            ok = await self._download(client, object_key, dest_path)
+          if ok:
+            resolved[seq] = dest_path
+            if self.cache:
+              await asyncio.to_thread(self.cache.put, cache_key, dest_path, {"object_key": object_key}, suffix)
+          done += 1
+          if progress:
+            await progress(done, len(pending))
+
+        await asyncio.gather(*[_fetch(seq, *item) for seq, item in pending.items()])
+
+    logger.info(
+        f"[素材] 共 {len(assets)} 个: 本地 {local_hits}, 缓存 {cache_hits}, 下载 {len(pending)}"
+        f"（失败 {len(assets) - len(resolved)}）, 耗时 {time.perf_counter() - started:.2f}s"
+    )
+    return resolved
+
+  async def _download(self, client: httpx.AsyncClient, object_key: str, dest_path: str) -> bool:
+    """流式下载到 .part 临时文件，完整写完后再原子改名，中断不会留下半截文件"""
+    part_path = f"{dest_path}.part"
+    for attempt in range(self.max_retries):
+      try:
+        # 每次重试重新签名，避免签名过期导致的连续失败
+        url = await self.sign_url(object_key)
+        async with client.stream("GET", url) as resp:
+          resp.raise_for_status()
+          with open(part_path, "wb") as f:
+            async for chunk in resp.aiter_bytes(self.chunk_size):
+              f.write(chunk)
+        os.replace(part_path, dest_path)
+        return True
+      except httpx.HTTPStatusError as e:
+        if e.response.status_code < 500:
+          logger.warning(f"[素材] 下载 {object_key} 失败 HTTP {e.response.status_code}，不再重试")
+          break
+        logger.warning(f"[素材] 下载 {object_key} 第 {attempt + 1} 次失败: HTTP {e.response.status_code}")
+      except (httpx.HTTPError, OSError) as e:
+        logger.warning(f"[素材] 下载 {object_key} 第 {attempt + 1} 次失败: {e}")
+      if attempt + 1 < self.max_retries:
+        await asyncio.sleep(0.5 * 2 ** attempt)
+
+    if os.path.exists(part_path):
+      os.remove(part_path)
+    return False
@@ -62,6 +62,23 @@ class ThbaAppSettings(AppSettings, PaySettings):
   AI_MODEL_NAME: str = "deepseek-reasoner"  # 模型名称
   AI_MAX_TOKENS: int = 128000  # 最大 token 数
   AI_ENABLE: bool = True  # 总开关
+  AI_FALLBACK_MODEL_NAME: str = ""  # 备用模型（OpenAI 兼容接口），主模型过慢或返回无效结果时发出对冲请求，留空不对冲
+  AI_FALLBACK_BASE_URL: str = ""  # 备用模型地址，留空与 AI_BASE_URL 相同
+  AI_FALLBACK_API_KEY: str = ""  # 备用模型 API Key，留空与 AI_API_KEY 相同
+  AI_DEADLINE_SECONDS: float = 300  # 单次术语提取的截止时间，超时放弃，0 表示不限
+  TERM_SCAN_WORKERS: int = 0  # 术语坐标扫描的并行进程数，0 表示按 CPU 核数自动取值（最多 4 个），1 表示不启用进程池
+  TERM_SCAN_SHARD_PAGES: int = 50  # 坐标扫描每个分片的页数，分片完成即写库
+  TERM_SCAN_STATE_DIR: str = "var/scan_state"  # 坐标扫描状态（术语与页面指纹），用于增量扫描；丢失时退回全量扫描
+  TERM_SCAN_DELTA_MAX_PAGE_RATIO: float = 0.5  # 内容变化的页面超过该比例时不做增量，直接全量重建
+
+  # --- LLM 调用限流（进程级，按模型标识分别计额度，术语提取与视频脚本共用）---
+  LLM_RATE_LIMITS: str = ""  # 模型标识=RPM:TPM，逗号分隔，如 gemini/gemini-2.5-flash=1000:1000000,deepseek-reasoner=60:0；0 表示不限
+  LLM_DEFAULT_RPM: int = 60  # 未在 LLM_RATE_LIMITS 中列出的模型的默认 RPM
+  LLM_DEFAULT_TPM: int = 0  # 未列出模型的默认 TPM，0 表示不限
+  LLM_MAX_CONCURRENCY: int = 8  # 每个模型的在途请求上限
+  LLM_MAX_RETRIES: int = 5  # 限流 / 网络错误的最大尝试次数（jitter 指数退避，优先遵循 Retry-After）
+  LLM_HEDGE_PERCENTILE: float = 0.9  # 主模型超过其历史耗时的该分位仍未返回时，向备用模型发出对冲请求
+  LLM_HEDGE_DEFAULT_DELAY: float = 120  # 耗时样本不足（少于 20 次）时的对冲等待秒数
 
   # --- 数据库 ---
   # DATABASE_URL: str = "sqlite+aiosqlite:///var/triheart_book_atelier.db"
@@ -88,10 +105,55 @@ class ThbaAppSettings(AppSettings, PaySettings):
   VIDEO_AI_ENABLE: bool = True
   VIDEO_AI_TEMPERATURE: float = 0.3
   VIDEO_AI_MAX_TOKENS: int = 8192
+  VIDEO_AI_FALLBACK_MODEL_NAME: str = ""  # 备用模型（LiteLLM 标识），用于对冲请求，留空不对冲
+  VIDEO_AI_FALLBACK_API_KEY: str = ""  # 备用模型 API Key，留空与 VIDEO_AI_API_KEY 相同
+  VIDEO_AI_FALLBACK_BASE_URL: str = ""  # 备用模型 Base URL
+  VIDEO_AI_DEADLINE_SECONDS: float = 600  # 单次脚本生成的截止时间，超时放弃（计入重试次数），0 表示不限
+  # 送 AI 的章节输入形式：auto 按内容密度自动选择；text: 逐页文字; pdf: 章节 PDF 切片; images: 缩小后的书页图片
+  VIDEO_AI_INPUT_MODE: str = "auto"
+  VIDEO_AI_TEXT_MIN_CHARS: int = 150  # auto 模式下每页至少有这么多字才算文字页
+  VIDEO_AI_TEXT_MAX_IMAGE_RATIO: float = 0.1  # auto 模式下文字页允许的图片/图形面积占比
+  VIDEO_AI_SCAN_MAX_CHARS: int = 20  # auto 模式下平均每页字数低于该值视为扫描版，送书页图片
+  VIDEO_AI_IMAGE_MAX_SIDE: int = 1280  # images 模式书页图片缩放后的最长边（像素），与模型自身的缩放上限取较小者
+  VIDEO_AI_IMAGE_QUALITY: int = 75  # images 模式书页图片重新编码的 WebP 质量
+  VIDEO_AI_IMAGE_GRAYSCALE: bool = False  # images 模式转为灰度（黑白书籍可开启，进一步减小体积）
+  VIDEO_AI_IMAGE_WORKERS: int = 4  # 书页图片预处理线程数
+  VIDEO_AI_IMAGE_CACHE_MAX_MB: int = 512  # 预处理后书页图片的缓存上限（按原图内容哈希寻址）
+  VIDEO_AI_METRICS_PATH: str = "var/metrics/video_llm.jsonl"  # 每次调用的模式、token 与耗时记录，留空不记录
 
   # --- TTS 配音配置 ---
   VIDEO_TTS_VOICE: str = "zh-CN-YunjianNeural"  # 讲书人风格；可选: zh-CN-YunxiNeural(男声), zh-CN-XiaoxiaoNeural(女声)
 
+  # --- 视频流水线产物缓存（跨任务保留，不随任务目录清理）---
+  VIDEO_CACHE_DIR: str = "var/cache"
+  VIDEO_TTS_CACHE_MAX_MB: int = 2048  # TTS 音频缓存上限，超出后按最近使用时间淘汰
+  VIDEO_SEGMENT_CACHE_MAX_MB: int = 4096  # 场景视频片段缓存上限，改稿后未变化的场景直接复用
+  VIDEO_ASSET_CACHE_MAX_MB: int = 2048  # 书页图片缓存上限（本节点没有书籍解析产物时，从 OSS 下载后保留）
+  VIDEO_ASSET_FETCH_CONCURRENCY: int = 8  # 书页图片并发下载数
+  VIDEO_PDF_SLICE_CACHE_MAX_MB: int = 1024  # 章节 PDF 切片缓存上限（送 AI 用，整书一次切好后各章节复用）
+
+  # --- 视频渲染配置 ---
+  VIDEO_RENDER_ENGINE: str = "segment"  # segment: 分段并行编码后流复制拼接（最快）; ffmpeg: 单次滤镜图渲染（带交叉淡化）; moviepy: 逐帧合成（兜底）
+  VIDEO_RENDER_WORKERS: int = 0  # segment 引擎并行编码进程数，0 表示使用全部 CPU 核
+  VIDEO_SUBTITLE_MODE: str = "sidecar"  # off: 无字幕; sidecar: 外挂 WebVTT; burn: ffmpeg 烧录进画面（同时保留外挂）
+
+  # --- 流式播放输出（成片始终为 faststart MP4，另可输出 HLS 多码率切片）---
+  VIDEO_HLS_ENABLE: bool = True
+  VIDEO_HLS_LADDER: str = "1080:2048k,720:1200k,480:600k"  # 高度:码率，逗号分隔；不低于成片分辨率的档位跳过，成片分辨率档按成片码率输出
+  VIDEO_HLS_SEGMENT_SECONDS: int = 6
+  VIDEO_HLS_PLAYLIST_CACHE_SECONDS: int = 600  # 已签名子播放列表的进程内缓存时长，须小于 OSS 下载签名的有效期
+
+  # --- 成片上传（流式读取磁盘；大文件经存储客户端的 minio SDK 分片上传）---
+  VIDEO_UPLOAD_MULTIPART_THRESHOLD_MB: int = 64  # 超过该大小改用分片并发上传
+  VIDEO_UPLOAD_PART_MB: int = 16  # 分片大小（S3 要求不小于 5MB）
+  VIDEO_UPLOAD_CONCURRENCY: int = 4  # 并发上传的分片数
+
+  # --- 整书批量生成（各章节共享阶段并发上限，LLM / 配音 / 渲染交错执行）---
+  VIDEO_BATCH_CHAPTER_CONCURRENCY: int = 3  # 同时在流水线中的章节数（每个章节占用一个 DB Session）
+  VIDEO_BATCH_LLM_CONCURRENCY: int = 2  # 同时调用 LLM 生成脚本的章节数
+  VIDEO_BATCH_TTS_CONCURRENCY: int = 2  # 同时配音的章节数
+  VIDEO_BATCH_RENDER_CONCURRENCY: int = 1  # 同时渲染的章节数（segment 引擎单章已占满全部核）
+
   # # --- 视频输出配置 ---
   # VIDEO_OUTPUT_WIDTH: int = 1080
   # VIDEO_OUTPUT_HEIGHT: int = 1920  # 默认 9:16 竖屏
@@ -1,6 +1,6 @@
 # /app/crud.py
 from brtech_backend.core.crud import StringPKeyCrud, StringPKeyRecurseCrud
-from sqlalchemy import delete, select, and_, Row
+from sqlalchemy import delete, select, and_, or_, Row
 
 from .models import TriHeartBookModel, TriHeartChapterModel, TriHeartPageModel, TriHeartChapterPageModel, TriHeartBookUserModel, TriHeartBookNoteModel, TriHeartTermModel, TriHeartPageTermModel, TriHeartPageAttachmentModel, TriHeartChapterVideoModel
 
@@ -91,6 +91,18 @@ class TriHeartPageTermCrud(StringPKeyCrud[TriHeartPageTermModel]):
     stmt = select(self.model).where(self.model.book_id == book_id, self.model.page_no == page_no)
     return await self.select_all(stmt)
 
+  async def remove_by_terms_or_pages(self, book_id: str, term_ids: list[str], page_numbers: list[int]) -> None:
+    """增量坐标扫描：删除指定术语（全书范围）以及指定页面（全部术语）的坐标关联，不提交"""
+    if not book_id or not (term_ids or page_numbers):
+      return
+    conditions = []
+    if term_ids:
+      conditions.append(self.model.term_id.in_(term_ids))
+    if page_numbers:
+      conditions.append(self.model.page_no.in_(page_numbers))
+    stmt = delete(self.model).where(self.model.book_id == book_id, or_(*conditions))
+    await self.db.execute(stmt)
+
 
 class TriHeartPageAttachmentCrud(StringPKeyCrud[TriHeartPageAttachmentModel]):
   pass
@@ -0,0 +1,38 @@
+# app/ffmpeg_helper.py
+import logging
+import os
+import re
+import shutil
+import subprocess
+from typing import List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class FfmpegHelper:
+  """ffmpeg 命令行封装：统一可执行文件定位与错误处理"""
+
+  @staticmethod
+  def get_exe() -> str:
+    """优先使用 main.py 中通过 imageio-ffmpeg 设置的 IMAGEIO_FFMPEG_EXE，其次是 PATH 中的 ffmpeg"""
+    return os.environ.get("IMAGEIO_FFMPEG_EXE") or shutil.which("ffmpeg") or "ffmpeg"
+
+  @staticmethod
+  def run(args: List[str], cwd: str | None = None) -> None:
+    """执行 ffmpeg，失败时抛出 RuntimeError（附带 stderr 末尾便于排查）"""
+    cmd = [FfmpegHelper.get_exe(), "-hide_banner", "-nostdin", "-loglevel", "error", "-y", *args]
+    logger.debug(f"ffmpeg: {' '.join(cmd)}")
+    proc = subprocess.run(cmd, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if proc.returncode != 0:
+      stderr = proc.stderr.decode("utf-8", errors="replace").strip()
+      raise RuntimeError(f"ffmpeg 执行失败 (code={proc.returncode}): {stderr[-1000:]}")
+
+  @staticmethod
+  def video_size(path: str) -> Tuple[int, int]:
+    """读取视频分辨率（imageio-ffmpeg 不附带 ffprobe，这里解析 ffmpeg -i 的流信息）"""
+    proc = subprocess.run([FfmpegHelper.get_exe(), "-hide_banner", "-nostdin", "-i", path], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    stderr = proc.stderr.decode("utf-8", errors="replace")
+    match = re.search(r"Video:.*?, (\d{2,5})x(\d{2,5})", stderr)
+    if not match:
+      raise RuntimeError(f"无法识别视频分辨率: {path}")
+    return int(match.group(1)), int(match.group(2))
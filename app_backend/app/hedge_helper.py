@@ -0,0 +1,111 @@
+# app/hedge_helper.py
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+  """
+  按模型记录最近若干次 LLM 调用的耗时，用于计算对冲请求的触发时机（进程级共享）。
+  样本由限流器在拿到额度后记录，只含服务商往返耗时，不含限流排队与 429 退避，避免限流期间分位数虚高。
+  """
+
+  def __init__(self, window: int = 200):
+    self.window = window
+    self._samples: Dict[str, Deque[float]] = {}
+
+  def observe(self, model: str, seconds: float):
+    self._samples.setdefault(model, deque(maxlen=self.window)).append(seconds)
+
+  def percentile(self, model: str, q: float, min_samples: int = 20) -> float | None:
+    """返回第 q 分位（0~1）的耗时；样本不足时返回 None"""
+    samples = sorted(self._samples.get(model) or [])
+    if len(samples) < max(1, min_samples):
+      return None
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+latency_tracker = LatencyTracker()
+
+
+async def _timed(func: Callable[[], Awaitable[Any]]) -> Tuple[Any, float, Exception | None]:
+  started = time.perf_counter()
+  try:
+    return await func(), time.perf_counter() - started, None
+  except Exception as e:
+    return None, time.perf_counter() - started, e
+
+
+async def hedged_call(
+    primary: Tuple[str, Callable[[], Awaitable[Any]]],
+    secondary: Tuple[str, Callable[[], Awaitable[Any]]] | None = None,
+    deadline: float = 0,
+    hedge_percentile: float = 0.9,
+    hedge_default_delay: float = 60,
+    min_samples: int = 20,
+    is_valid: Callable[[Any], bool] = bool,
+) -> Tuple[Any, Dict[str, Any]]:
+  """
+  带截止时间的对冲调用：
+  - 主模型超过其历史耗时的 hedge_percentile 分位（样本不足时为 hedge_default_delay）仍未返回，
+    向备用模型发出对冲请求，两者先返回有效结果者胜出，另一个被取消
+  - 主模型先返回无效结果（空 / 异常）时立即改用备用模型
+  - 超过 deadline（秒，0 表示不限）仍无有效结果时全部取消
+
+  :param primary: (模型标识, 调用函数)；调用函数返回结果，无效结果由 is_valid 判定
+  :return: (胜出结果或 None, 调用记录 {winner, winner_model, hedged, hedge_delay_s, latency_s, saved_s_est, timed_out})
+  """
+  started = time.perf_counter()
+  primary_model, primary_func = primary
+  hedge_delay = latency_tracker.percentile(primary_model, hedge_percentile, min_samples) or hedge_default_delay
+  primary_p50 = latency_tracker.percentile(primary_model, 0.5, min_samples)
+  info: Dict[str, Any] = {
+    "winner": None, "winner_model": None, "hedged": False, "hedge_delay_s": round(hedge_delay, 3),
+    "latency_s": None, "saved_s_est": None, "timed_out": False,
+  }
+  tasks: Dict[asyncio.Task, Tuple[str, str]] = {asyncio.create_task(_timed(primary_func)): ("primary", primary_model)}
+
+  def _start_secondary(reason: str):
+    info["hedged"] = True
+    info["hedge_reason"] = reason
+    tasks[asyncio.create_task(_timed(secondary[1]))] = ("secondary", secondary[0])
+    logger.info(f"[LLM对冲] {primary_model} {reason}，向备用模型 {secondary[0]} 发出请求（已等待 {time.perf_counter() - started:.1f}s）")
+
+  try:
+    while tasks:
+      elapsed = time.perf_counter() - started
+      timeouts = []
+      if deadline:
+        timeouts.append(deadline - elapsed)
+      if secondary and not info["hedged"]:
+        timeouts.append(hedge_delay - elapsed)
+      timeout = max(0.0, min(timeouts)) if timeouts else None
+
+      done, _pending = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+      for task in done:
+        role, model = tasks.pop(task)
+        result, latency, error = task.result()
+        if error is None and is_valid(result):
+          info.update(winner=role, winner_model=model, latency_s=round(time.perf_counter() - started, 3))
+          if role == "secondary" and primary_p50 is not None:
+            info["saved_s_est"] = round(max(0.0, primary_p50 - info["latency_s"]), 3)
+          return result, info
+        logger.warning(f"[LLM对冲] {model} 返回无效结果（{error or '空结果'}），耗时 {latency:.1f}s")
+        if role == "primary" and secondary and not info["hedged"]:
+          _start_secondary("返回无效结果")
+
+      elapsed = time.perf_counter() - started
+      if deadline and elapsed >= deadline:
+        info["timed_out"] = True
+        logger.error(f"[LLM对冲] {primary_model} 超过截止时间 {deadline:.0f}s 仍无有效结果，放弃")
+        break
+      if not done and secondary and not info["hedged"] and elapsed >= hedge_delay:
+        _start_secondary(f"超过 P{int(hedge_percentile * 100)} 耗时 {hedge_delay:.1f}s 未返回")
+    return None, info
+  finally:
+    for task in tasks:
+      task.cancel()
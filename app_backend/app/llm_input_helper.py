@@ -0,0 +1,216 @@
+# app/llm_input_helper.py
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Sequence, Tuple
+
+import pymupdf
+from PIL import Image
+
+from .artifact_cache import ArtifactCache
+
+logger = logging.getLogger(__name__)
+
+# 送 AI 的章节输入形式
+MODE_TEXT = "text"  # 逐页文字（带文字块相对坐标），payload 最小
+MODE_PDF = "pdf"  # 章节 PDF 切片，保留版式、矢量图与公式
+MODE_IMAGES = "images"  # 缩小后的书页图片，适合扫描版（无文字层，PDF 里是整页大图）
+LLM_INPUT_MODES = (MODE_TEXT, MODE_PDF, MODE_IMAGES)
+
+# 各家视觉模型处理图片前的内部缩放规则（按 LiteLLM 模型标识前缀匹配），超出部分上传了也会被服务端缩掉
+# (长边上限, 短边上限)，0 表示不限制
+MODEL_IMAGE_LIMITS: Dict[str, Tuple[int, int]] = {
+  "openai/": (2048, 768),  # detail=high：先缩进 2048x2048，再把短边缩到 768
+  "gpt-": (2048, 768),
+  "azure/": (2048, 768),
+  "anthropic/": (1568, 0),
+  "claude": (1568, 0),
+  "gemini/": (3072, 0),  # 按 768x768 切块计费，过大的图只会增加块数
+}
+
+
+class LlmInputHelper:
+  """
+  按章节内容密度选择送 AI 的输入形式：
+  - 每页都有足够的文字、且图片 / 图形覆盖率很低 → text
+  - 平均每页几乎没有文字（扫描版） → images
+  - 其余（图文混排、表格、公式）→ pdf，没有 PDF 切片时退回 images
+  """
+
+  _metrics_lock = threading.Lock()
+
+  def __init__(
+      self,
+      text_min_chars: int = 150,
+      text_max_image_ratio: float = 0.1,
+      scan_max_chars: int = 20,
+      image_max_side: int = 1280,
+      image_quality: int = 75,
+      image_grayscale: bool = False,
+      image_workers: int = 4,
+      image_cache: ArtifactCache | None = None,
+      model: str = "",
+  ):
+    """
+    :param text_min_chars: 每页至少有这么多字才算文字页
+    :param text_max_image_ratio: 文字页允许的图片 / 图形面积占比上限
+    :param scan_max_chars: 平均每页字数低于该值视为扫描版
+    :param image_max_side: images 模式下书页图片缩放后的最长边（像素），与模型自身的缩放上限取较小者
+    :param image_quality: 重新编码 WebP 的质量
+    :param image_grayscale: 转为灰度（黑白书页几乎不损失信息）
+    :param image_workers: 书页图片预处理的线程数
+    :param image_cache: 预处理结果缓存，按原图内容哈希 + 预处理参数寻址
+    :param model: LiteLLM 模型标识，用于确定模型实际使用的分辨率
+    """
+    self.text_min_chars = text_min_chars
+    self.text_max_image_ratio = text_max_image_ratio
+    self.scan_max_chars = scan_max_chars
+    self.image_max_side = image_max_side
+    self.image_quality = image_quality
+    self.image_grayscale = image_grayscale
+    self.image_workers = max(1, image_workers)
+    self.image_cache = image_cache
+    self.model = model
+
+  @staticmethod
+  def measure_pages(page_texts: Sequence[str], pdf_path: str | None = None) -> List[Dict]:
+    """
+    统计每页的内容密度 [{"chars": 字数, "image_ratio": 图片与图形面积占比}]。
+    字数取自库中已有的 page_content；占比由 PDF 切片计算，没有切片时为 None（未知）。
+    """
+    densities = [{"chars": len("".join((text or "").split())), "image_ratio": None} for text in page_texts]
+    if not pdf_path:
+      return densities
+    with pymupdf.open(pdf_path) as doc:
+      for index, page in enumerate(doc):
+        if index >= len(densities):
+          break
+        page_area = abs(page.rect) or 1.0
+        covered = sum(abs(pymupdf.Rect(info["bbox"]) & page.rect) for info in page.get_image_info())
+        for cluster in page.cluster_drawings():
+          area = abs(cluster & page.rect)
+          # 整页的边框 / 底色不算作插图
+          if area < page_area * 0.9:
+            covered += area
+        densities[index]["image_ratio"] = round(min(1.0, covered / page_area), 4)
+    return densities
+
+  def choose_mode(self, densities: List[Dict], has_pdf: bool) -> str:
+    if not densities:
+      return MODE_PDF if has_pdf else MODE_IMAGES
+    avg_chars = sum(d["chars"] for d in densities) / len(densities)
+    if avg_chars < self.scan_max_chars:
+      return MODE_IMAGES
+    text_only = all(
+        d["chars"] >= self.text_min_chars and (d["image_ratio"] or 0.0) <= self.text_max_image_ratio
+        for d in densities
+    )
+    # 图片占比未知（没有 PDF 切片）时只凭字数判断
+    if text_only:
+      return MODE_TEXT
+    return MODE_PDF if has_pdf else MODE_IMAGES
+
+  @staticmethod
+  def extract_text_pages(page_texts: Sequence[str], pdf_path: str | None = None) -> List[str]:
+    """
+    text 模式的逐页文字。有 PDF 切片时按文字块输出并在块前标注 [x, y, w, h] 相对坐标，
+    AI 可据此给出准确的 focus_area；否则直接使用库中的 page_content。
+    """
+    if not pdf_path:
+      return [text or "" for text in page_texts]
+    pages: List[str] = []
+    with pymupdf.open(pdf_path) as doc:
+      for page in doc:
+        width, height = page.rect.width or 1.0, page.rect.height or 1.0
+        lines = []
+        for x0, y0, x1, y1, text, _block_no, block_type in page.get_text("blocks", sort=True):
+          text = " ".join(text.split())
+          if block_type != 0 or not text:
+            continue
+          box = [round(x0 / width, 2), round(y0 / height, 2), round((x1 - x0) / width, 2), round((y1 - y0) / height, 2)]
+          lines.append(f"{box} {text}")
+        pages.append("\n".join(lines))
+    return pages
+
+  def target_size(self, width: int, height: int) -> Tuple[int, int]:
+    """按配置的最长边与模型内部的缩放规则计算目标尺寸（只缩小不放大）"""
+    long_limit, short_limit = self.image_max_side, 0
+    for prefix, (model_long, model_short) in MODEL_IMAGE_LIMITS.items():
+      if self.model.startswith(prefix):
+        long_limit = min(long_limit, model_long) if long_limit else model_long
+        short_limit = model_short
+        break
+    scale = 1.0
+    if long_limit:
+      scale = min(scale, long_limit / max(width, height))
+    if short_limit:
+      scale = min(scale, short_limit / min(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+  def downscale_image(self, image_path: str) -> bytes:
+    """把书页图片缩放到模型实际使用的分辨率，可选转灰度，重新编码为 WebP"""
+    with Image.open(image_path) as img:
+      img = img.convert("L" if self.image_grayscale else "RGB")
+      size = self.target_size(*img.size)
+      if size != img.size:
+        img = img.resize(size, Image.LANCZOS)
+      buffer = io.BytesIO()
+      img.save(buffer, format="WEBP", quality=self.image_quality, method=4)
+      return buffer.getvalue()
+
+  def prepare_images(self, image_paths: Sequence[str]) -> List[bytes]:
+    """
+    并行预处理一组书页图片（顺序与输入一致）。结果按原图内容哈希缓存，
+    改稿重跑、草稿与正式渲染重复调用 AI 时不再重复缩放编码。
+    """
+    started = time.perf_counter()
+    options = (self.model, self.image_max_side, self.image_quality, self.image_grayscale)
+    cache_hits = 0
+
+    def _prepare(image_path: str) -> bytes:
+      nonlocal cache_hits
+      key = ArtifactCache.make_key("llm_image", ArtifactCache.hash_file(image_path), *options) if self.image_cache else ""
+      if self.image_cache:
+        hit = self.image_cache.get(key, ".webp")
+        if hit:
+          cache_hits += 1
+          with open(hit[0], "rb") as f:
+            return f.read()
+      data = self.downscale_image(image_path)
+      if self.image_cache:
+        # 临时文件写在缓存目录内，不污染书页所在的解析产物目录
+        os.makedirs(self.image_cache.home, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=self.image_cache.home, suffix=".tmp", delete=False) as f:
+          f.write(data)
+          tmp_path = f.name
+        self.image_cache.put(key, tmp_path, {"source": image_path}, ".webp", move=True)
+      return data
+
+    with ThreadPoolExecutor(max_workers=self.image_workers) as pool:
+      images = list(pool.map(_prepare, image_paths))
+
+    original = sum(os.path.getsize(p) for p in image_paths)
+    prepared = sum(len(data) for data in images)
+    logger.info(
+        f"[LLM输入] 书页图片 {len(images)} 张: {original / 1024 / 1024:.2f}MB → {prepared / 1024 / 1024:.2f}MB"
+        f"（减少 {1 - prepared / max(1, original):.0%}，base64 后约 {prepared * 4 / 3 / 1024 / 1024:.2f}MB），"
+        f"缓存命中 {cache_hits}，耗时 {time.perf_counter() - started:.2f}s"
+    )
+    return images
+
+  @classmethod
+  def record_metrics(cls, metrics_path: str, record: Dict):
+    """追加一条调用记录（JSONL），用于按模式对比 token 与耗时、调整阈值"""
+    if not metrics_path:
+      return
+    try:
+      os.makedirs(os.path.dirname(metrics_path) or ".", exist_ok=True)
+      with cls._metrics_lock, open(metrics_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except OSError as e:
+      logger.warning(f"[LLM输入] 写入调用记录失败: {e}")
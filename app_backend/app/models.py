@@ -926,6 +926,8 @@ class TriHeartPageAttachmentModel(StringPKeyModel, table=True):
     layout=[
       "book_id", "chapter_id", "status", "duration", "voice_type",
       FieldOption(prop="video_path", table_show=False, add_show=False, edit_show=False, span=24),
+      FieldOption(prop="hls_path", table_show=False, add_show=False, edit_show=False, span=24),
+      FieldOption(prop="draft_video_path", table_show=False, add_show=False, edit_show=False, span=24),
       FieldOption(prop="script_json", table_show=False, add_show=False, edit_show=False, span=24),
       FieldOption(prop="create_person", table_show=False, add_show=False, edit_show=False, search_show=False, detail_show=False),
       FieldOption(prop="create_timestamp", table_show=False, add_show=False, edit_show=False, search_show=False),
@@ -986,6 +988,26 @@ class TriHeartChapterVideoModel(StringPKeyModel, table=True):
       sa_column_kwargs={"name": "video_path", "comment": "视频 OSS 路径"}
   )
 
+  # 已有库需手动补列，见 README「数据库升级」
+  hls_path: Annotated[
+    str | None,
+    FieldOption(table_show=False, add_show=False, edit_show=False, detail_show=True, search_show=False)
+  ] = SQLModelField(
+      description="HLS 主播放列表 OSS 路径",
+      sa_type=String, max_length=256, nullable=True,
+      sa_column_kwargs={"name": "hls_path", "comment": "HLS 主播放列表 OSS 路径"}
+  )
+
+  # 已有库需手动补列，见 README「数据库升级」
+  draft_video_path: Annotated[
+    str | None,
+    FieldOption(table_show=False, add_show=False, edit_show=False, detail_show=True, search_show=False)
+  ] = SQLModelField(
+      description="草稿预览视频 OSS 路径",
+      sa_type=String, max_length=256, nullable=True,
+      sa_column_kwargs={"name": "draft_video_path", "comment": "草稿预览视频 OSS 路径"}
+  )
+
   script_json: Annotated[
     str | None,
     FieldOption(table_show=False, add_show=False, edit_show=False, detail_show=True, search_show=False, span=24, component=UIComponent.JSON_EDITOR, component_props={"rows": 10})
@@ -0,0 +1,124 @@
+# app/motion_helper.py
+import logging
+import os
+from typing import Dict, List, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+logger = logging.getLogger(__name__)
+
+# 脚本中允许的运镜动作
+CAMERA_ACTIONS = ("Steady", "ZoomIn", "ZoomOut", "Highlight")
+# 焦点区域超过画面该比例时视为整页，不做运镜
+FULL_PAGE_RATIO = 0.9
+
+
+class MotionHelper:
+  """
+  运镜引擎：把脚本中的 camera_action + focus_area 预先计算为裁剪/缩放轨迹与高亮遮罩。
+  - ZoomIn / ZoomOut：镜头在整页与焦点区域之间推拉（smoothstep 缓动），由 ffmpeg zoompan 执行
+  - Highlight：焦点外压暗 + 黄色描边的 RGBA 遮罩图，由 ffmpeg overlay 叠加
+  同一条轨迹公式同时生成 zoompan 表达式（ffmpeg 引擎）和逐帧裁剪框（moviepy 兜底），保证两条路径画面一致。
+  """
+
+  # 高亮遮罩在场景开始后延迟淡入（秒）
+  HIGHLIGHT_DELAY = 0.3
+  HIGHLIGHT_FADE = 0.5
+
+  def __init__(self, width: int, height: int, fps: int, max_zoom: float = 1.8):
+    self.width = width
+    self.height = height
+    self.fps = fps
+    self.max_zoom = max_zoom
+
+  @staticmethod
+  def normalize(scene: Dict) -> Tuple[str, List[float]]:
+    """校验脚本中的运镜参数；非法动作、非法区域或整页焦点一律回退为 Steady"""
+    action = scene.get("camera_action") or "Steady"
+    if action not in CAMERA_ACTIONS:
+      action = "Steady"
+    try:
+      fx, fy, fw, fh = (float(v) for v in scene.get("focus_area") or [0.0, 0.0, 1.0, 1.0])
+    except (TypeError, ValueError):
+      return "Steady", [0.0, 0.0, 1.0, 1.0]
+
+    fx, fy = min(max(fx, 0.0), 1.0), min(max(fy, 0.0), 1.0)
+    fw, fh = min(max(fw, 0.0), 1.0 - fx), min(max(fh, 0.0), 1.0 - fy)
+    focus = [round(fx, 4), round(fy, 4), round(fw, 4), round(fh, 4)]
+    if fw <= 0.01 or fh <= 0.01 or (fw >= FULL_PAGE_RATIO and fh >= FULL_PAGE_RATIO):
+      return "Steady", [0.0, 0.0, 1.0, 1.0]
+    return action, focus
+
+  def _target(self, focus: List[float]) -> Tuple[float, float, float]:
+    """焦点区域撑满画面所需的缩放倍数（不超过 max_zoom）及焦点中心"""
+    fx, fy, fw, fh = focus
+    zoom = min(self.max_zoom, 1.0 / max(fw, fh))
+    return zoom, fx + fw / 2, fy + fh / 2
+
+  def crop_box(self, action: str, focus: List[float], progress: float) -> Tuple[float, float, float, float]:
+    """progress ∈ [0, 1] 时的裁剪框（归一化 x, y, w, h）；与 zoompan_filter 的表达式逐项对应"""
+    if action not in ("ZoomIn", "ZoomOut"):
+      return 0.0, 0.0, 1.0, 1.0
+    target, cx, cy = self._target(focus)
+    ease = progress * progress * (3 - 2 * progress)
+    if action == "ZoomOut":
+      ease = 1 - ease
+    zoom = 1 + (target - 1) * ease
+    center_x = 0.5 + (cx - 0.5) * ease
+    center_y = 0.5 + (cy - 0.5) * ease
+    w, h = 1 / zoom, 1 / zoom
+    x = min(max(center_x - w / 2, 0.0), 1 - w)
+    y = min(max(center_y - h / 2, 0.0), 1 - h)
+    return x, y, w, h
+
+  def zoompan_filter(self, action: str, focus: List[float], frames: int, supersample: int = 2) -> str:
+    """
+    生成推拉镜头的滤镜链（输入为单帧书页）。
+    先放大 supersample 倍再 zoompan，缓解 zoompan 按整数像素取裁剪框带来的抖动。
+    """
+    target, cx, cy = self._target(focus)
+    span = max(frames - 1, 1)
+    ease = f"(on/{span})*(on/{span})*(3-2*(on/{span}))"
+    if action == "ZoomOut":
+      ease = f"(1-{ease})"
+    zoom = f"1+{target - 1:.6f}*{ease}"
+    center_x = f"(0.5+{cx - 0.5:.6f}*{ease})"
+    center_y = f"(0.5+{cy - 0.5:.6f}*{ease})"
+    return (
+      f"scale={self.width * supersample}:{self.height * supersample},setsar=1,"
+      f"zoompan=z='{zoom}'"
+      f":x='clip({center_x}*iw-iw/zoom/2,0,iw-iw/zoom)'"
+      f":y='clip({center_y}*ih-ih/zoom/2,0,ih-ih/zoom)'"
+      f":d={frames}:s={self.width}x{self.height}:fps={self.fps}"
+    )
+
+  def highlight_overlay(self, focus: List[float]) -> Image.Image:
+    """焦点外半透明压暗 + 醒目黄色边框的 RGBA 遮罩（对应旧 _make_highlight_clip 的效果）"""
+    w, h = self.width, self.height
+    fx, fy, fw, fh = focus
+    x1, y1 = max(0, int(fx * w)), max(0, int(fy * h))
+    x2, y2 = min(w, int((fx + fw) * w)), min(h, int((fy + fh) * h))
+
+    overlay = np.zeros((h, w, 4), dtype=np.uint8)
+    overlay[..., 3] = 80  # 焦点区域外 alpha ≈ 0.31
+    overlay[y1:y2, x1:x2, 3] = 0  # 焦点区域完全透明
+
+    img = Image.fromarray(overlay, "RGBA")
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([x1 - 2, y1 - 2, x2 + 2, y2 + 2], outline=(255, 255, 150, 200), width=8)  # 外层：浅黄发光
+    draw.rectangle([x1, y1, x2, y2], outline=(255, 220, 0, 255), width=5)  # 内层：亮黄
+    return img
+
+  def write_highlight_overlay(self, focus: List[float], path: str) -> str:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    self.highlight_overlay(focus).save(path, "PNG")
+    return path
+
+  @classmethod
+  def highlight_filter(cls, base_label: str, overlay_label: str, out_label: str) -> str:
+    """高亮遮罩在场景开始 HIGHLIGHT_DELAY 秒后淡入叠加"""
+    return (
+      f"[{overlay_label}]format=rgba,fade=t=in:st={cls.HIGHLIGHT_DELAY}:d={cls.HIGHLIGHT_FADE}:alpha=1[{out_label}m];"
+      f"[{base_label}][{out_label}m]overlay=0:0:shortest=1[{out_label}]"
+    )
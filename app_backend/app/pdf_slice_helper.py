@@ -0,0 +1,41 @@
+# app/pdf_slice_helper.py
+import logging
+import os
+import time
+from typing import Dict, Tuple
+
+import pymupdf
+
+logger = logging.getLogger(__name__)
+
+
+class PdfSliceHelper:
+  """按页码范围批量切分 PDF：整本书只打开、解析一次，依次写出各章节切片（送 AI 用）"""
+
+  @staticmethod
+  def slice_many(pdf_path: str, ranges: Dict[str, Tuple[int, int]], out_dir: str) -> Dict[str, str]:
+    """
+    :param ranges: {切片名: (起始页, 结束页)}，页码从 1 开始、含两端，超出文档范围的部分被截断
+    :param out_dir: 输出目录，文件名为 {切片名}.pdf
+    :return: {切片名: 切片路径}；范围完全落在文档之外的切片不在结果中
+    """
+    started = time.perf_counter()
+    os.makedirs(out_dir, exist_ok=True)
+    result: Dict[str, str] = {}
+    with pymupdf.open(pdf_path) as src:
+      page_count = src.page_count
+      for name, (from_page_no, to_page_no) in ranges.items():
+        start = max(1, from_page_no or 1)
+        end = min(page_count, to_page_no or start)
+        if start > end:
+          logger.warning(f"[PDF切片] {name} 页码范围 {from_page_no}~{to_page_no} 超出文档（共 {page_count} 页），跳过")
+          continue
+        dest_path = os.path.join(out_dir, f"{name}.pdf")
+        with pymupdf.open() as dst:
+          # 只复制切片页引用到的对象（字体、图片），不做全量 garbage 扫描
+          dst.insert_pdf(src, from_page=start - 1, to_page=end - 1, links=False)
+          dst.save(f"{dest_path}.part", garbage=1, deflate=True)
+        os.replace(f"{dest_path}.part", dest_path)
+        result[name] = dest_path
+    logger.info(f"[PDF切片] {os.path.basename(pdf_path)} 共写出 {len(result)}/{len(ranges)} 个切片, 耗时 {time.perf_counter() - started:.2f}s")
+    return result
@@ -0,0 +1,278 @@
+# app/rate_limiter.py
+import asyncio
+import json
+import logging
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+import httpx
+
+from .config import thba_app_settings
+from .hedge_helper import latency_tracker
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitedError(Exception):
+  """服务商返回 429（或 503 过载）；retry_after 为服务商要求的等待秒数，未给出时为 None"""
+
+  def __init__(self, message: str, retry_after: float | None = None):
+    super().__init__(message)
+    self.retry_after = retry_after
+
+
+def parse_retry_after(headers: Any) -> float | None:
+  """解析 Retry-After（秒数或 HTTP 日期）与 OpenAI 风格的 retry-after-ms"""
+  if not headers:
+    return None
+  try:
+    if headers.get("retry-after-ms"):
+      return float(headers["retry-after-ms"]) / 1000
+    value = headers.get("retry-after")
+    if not value:
+      return None
+    try:
+      return max(0.0, float(value))
+    except ValueError:
+      return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+  except (TypeError, ValueError, AttributeError):
+    return None
+
+
+def estimate_tokens(messages: Any, output_tokens: int = 4096) -> int:
+  """
+  粗略估算请求消耗的 token，只用于限流预占，调用完成后按服务商返回的实际用量校正。
+  文字按 1 字 1 token（中文偏保守），图片每张约 1000，PDF 按 base64 体积折算（约每页 300），另加预期输出。
+  """
+  tokens = output_tokens
+  for message in messages or []:
+    content = message.get("content") if isinstance(message, dict) else message
+    parts = content if isinstance(content, list) else [content]
+    for part in parts:
+      if isinstance(part, str):
+        tokens += len(part)
+      elif isinstance(part, dict) and part.get("type") == "text":
+        tokens += len(part.get("text") or "")
+      elif isinstance(part, dict) and part.get("type") == "image_url":
+        url = (part.get("image_url") or {}).get("url", "")
+        # 文字型 PDF 单页约 60KB（base64 约 80KB）
+        tokens += max(300, len(url) // 80000 * 300) if url.startswith("data:application/pdf") else 1000
+  return tokens
+
+
+class TokenBucket:
+  """令牌桶：容量为每分钟额度，按秒匀速补充；允许透支（实际用量超出预占时），透支部分随补充抵消"""
+
+  def __init__(self, per_minute: float):
+    self.capacity = float(per_minute)
+    self.rate = self.capacity / 60
+    self.tokens = self.capacity
+    self.updated = time.monotonic()
+
+  def _refill(self):
+    now = time.monotonic()
+    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+    self.updated = now
+
+  def wait_time(self, amount: float) -> float:
+    """距离余额足够支付 amount 还需等待的秒数（0 表示可立即支付）"""
+    if self.capacity <= 0:
+      return 0.0
+    self._refill()
+    amount = min(amount, self.capacity)  # 单次请求超过整分钟额度时按满桶处理，避免永远等不到
+    return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+  def take(self, amount: float):
+    if self.capacity > 0:
+      self._refill()
+      self.tokens -= min(amount, self.capacity)
+
+  def settle(self, reserved: float, actual: float):
+    """按实际用量校正预占：多用的补扣，少用的退还"""
+    if self.capacity > 0:
+      self._refill()
+      self.tokens = min(self.capacity, self.tokens - (actual - min(reserved, self.capacity)))
+
+  def drain(self):
+    if self.capacity > 0:
+      self._refill()
+      self.tokens = min(self.tokens, 0.0)
+
+
+class _ModelState:
+
+  def __init__(self, rpm: int, tpm: int, concurrency: int):
+    self.requests = TokenBucket(rpm)
+    self.tokens = TokenBucket(tpm)
+    self.semaphore = asyncio.Semaphore(max(1, concurrency))
+    self.lock = asyncio.Lock()
+    self.blocked_until = 0.0  # 收到 429 后整个模型暂停到此时刻（所有调用方共享）
+
+
+class LlmRateLimiter:
+  """
+  进程级 LLM 限流器，按模型标识分别维护：
+  - RPM / TPM 两个令牌桶（TPM 先按估算预占，返回后按实际 usage 校正）
+  - 在途请求数上限
+  - 429 冷却：任一调用收到 429 即按 Retry-After 暂停该模型的所有调用，避免一起撞墙
+  重试采用 full jitter 指数退避，服务商给出 Retry-After 时以其为准。
+  """
+
+  def __init__(
+      self,
+      limits: Dict[str, Tuple[int, int]] | None = None,
+      default_rpm: int = 60,
+      default_tpm: int = 0,
+      max_concurrency: int = 8,
+      max_retries: int = 5,
+      base_delay: float = 1.0,
+      max_delay: float = 60.0,
+  ):
+    """
+    :param limits: {模型标识: (RPM, TPM)}，0 表示不限；未列出的模型使用默认值
+    :param max_concurrency: 每个模型的在途请求上限
+    :param max_retries: 限流 / 网络错误的最大尝试次数
+    """
+    self.limits = limits or {}
+    self.default_rpm = default_rpm
+    self.default_tpm = default_tpm
+    self.max_concurrency = max_concurrency
+    self.max_retries = max(1, max_retries)
+    self.base_delay = base_delay
+    self.max_delay = max_delay
+    self._states: Dict[str, _ModelState] = {}
+
+  @classmethod
+  def from_settings(cls) -> "LlmRateLimiter":
+    """LLM_RATE_LIMITS 格式: 模型标识=RPM:TPM，逗号分隔，如 gemini/gemini-2.5-flash=1000:1000000"""
+    limits: Dict[str, Tuple[int, int]] = {}
+    for item in thba_app_settings.LLM_RATE_LIMITS.split(","):
+      if "=" not in item:
+        continue
+      model, _, budget = item.strip().rpartition("=")
+      rpm, _, tpm = budget.partition(":")
+      try:
+        limits[model.strip()] = (int(rpm or 0), int(tpm or 0))
+      except ValueError:
+        # 配置写错不应导致服务无法启动，该模型退回默认额度
+        logger.warning(f"LLM_RATE_LIMITS 配置项格式错误，已忽略并使用默认额度: {item.strip()}")
+    return cls(
+        limits=limits,
+        default_rpm=thba_app_settings.LLM_DEFAULT_RPM,
+        default_tpm=thba_app_settings.LLM_DEFAULT_TPM,
+        max_concurrency=thba_app_settings.LLM_MAX_CONCURRENCY,
+        max_retries=thba_app_settings.LLM_MAX_RETRIES,
+    )
+
+  def _state(self, model: str) -> _ModelState:
+    state = self._states.get(model)
+    if state is None:
+      rpm, tpm = self.limits.get(model, (self.default_rpm, self.default_tpm))
+      state = self._states[model] = _ModelState(rpm, tpm, self.max_concurrency)
+    return state
+
+  async def _acquire(self, state: _ModelState, tokens: int):
+    # 排队串行判断额度，先到先得，避免大请求被小请求持续插队饿死
+    async with state.lock:
+      while True:
+        wait = max(state.blocked_until - time.monotonic(), state.requests.wait_time(1), state.tokens.wait_time(tokens))
+        if wait <= 0:
+          state.requests.take(1)
+          state.tokens.take(tokens)
+          return
+        await asyncio.sleep(wait)
+
+  def _backoff(self, attempt: int, retry_after: float | None) -> float:
+    if retry_after is not None:
+      # 服务商指定的等待时间再加少量抖动，避免所有等待者同一时刻醒来
+      return min(self.max_delay, retry_after) + random.uniform(0, self.base_delay)
+    return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+  async def call(
+      self,
+      model: str,
+      func: Callable[[], Awaitable[Any]],
+      estimated_tokens: int = 0,
+      usage_of: Callable[[Any], int | None] | None = None,
+  ) -> Any:
+    """
+    在限流下执行一次 LLM 调用（func 每次重试都会被重新调用）。
+    429 / 503 / 网络错误按退避重试，其余异常直接抛出；重试耗尽后抛出最后一次的异常。
+
+    :param estimated_tokens: 预占的 token 数（输入估算 + 预期输出）
+    :param usage_of: 从返回值取实际总 token 数，用于校正 TPM 预占
+    """
+    state = self._state(model)
+    for attempt in range(self.max_retries):
+      await self._acquire(state, estimated_tokens)
+      try:
+        async with state.semaphore:
+          # 只统计服务商往返耗时（不含排队与退避）；对冲落败被取消的请求至少耗时这么久，作为下界样本记入
+          sent = time.perf_counter()
+          try:
+            result = await func()
+          except asyncio.CancelledError:
+            latency_tracker.observe(model, time.perf_counter() - sent)
+            raise
+          latency_tracker.observe(model, time.perf_counter() - sent)
+        actual = usage_of(result) if usage_of else None
+        if actual is not None:
+          state.tokens.settle(estimated_tokens, actual)
+        return result
+      except Exception as e:
+        limited, retry_after = self._classify(e)
+        if limited is None or attempt + 1 >= self.max_retries:
+          raise
+        if limited:
+          # 整个模型进入冷却，并清空请求桶，冷却结束后逐个放行
+          state.blocked_until = max(state.blocked_until, time.monotonic() + (retry_after or self._backoff(attempt, None)))
+          state.requests.drain()
+        delay = self._backoff(attempt, retry_after)
+        logger.warning(f"[LLM限流] {model} 第 {attempt + 1} 次调用{'被限流' if limited else '失败'}: {str(e)[:200]}，{delay:.1f}s 后重试")
+        await asyncio.sleep(delay)
+
+  @staticmethod
+  def _classify(e: Exception) -> Tuple[bool | None, float | None]:
+    """返回 (是否限流, Retry-After)；第一项为 None 表示不可重试"""
+    if isinstance(e, RateLimitedError):
+      return True, e.retry_after
+    if isinstance(e, httpx.HTTPStatusError):
+      status = e.response.status_code
+      if status in (429, 503):
+        return True, parse_retry_after(e.response.headers)
+      return (False, None) if status >= 500 else (None, None)
+    if isinstance(e, (httpx.TransportError, asyncio.TimeoutError)):
+      return False, None
+    # LiteLLM 的异常：带 status_code，部分带原始 response
+    status = getattr(e, "status_code", None)
+    if status in (429, 503):
+      response = getattr(e, "response", None)
+      return True, parse_retry_after(getattr(response, "headers", None))
+    if isinstance(status, int) and status >= 500 or type(e).__name__ in ("Timeout", "APIConnectionError", "InternalServerError"):
+      return False, None
+    return None, None
+
+
+def response_total_tokens(response: Any) -> int | None:
+  """取 OpenAI 兼容响应（LiteLLM 对象或 dict）的 usage.total_tokens"""
+  usage = response.get("usage") if isinstance(response, dict) else getattr(response, "usage", None)
+  if isinstance(usage, dict):
+    return usage.get("total_tokens")
+  return getattr(usage, "total_tokens", None)
+
+
+def raise_for_rate_limit(resp: httpx.Response):
+  """直接用 httpx 调用 OpenAI 兼容接口时，把 429 / 503 转成 RateLimitedError 交给限流器重试"""
+  if resp.status_code in (429, 503):
+    detail = resp.text[:200]
+    try:
+      detail = json.dumps(resp.json(), ensure_ascii=False)[:200]
+    except ValueError:
+      pass
+    raise RateLimitedError(f"HTTP {resp.status_code}: {detail}", parse_retry_after(resp.headers))
+
+
+# 进程级单例：所有 LLM 调用（术语提取、视频脚本）共享同一组额度
+llm_rate_limiter = LlmRateLimiter.from_settings()
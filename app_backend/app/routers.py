@@ -7,7 +7,8 @@ from brtech_backend.core.schemas import RestResponse, PageResult
 from brtech_backend.core.security import AuthContext
 from brtech_backend.dictionary.routers import StringPKeyWithDictionaryRouter
 from brtech_backend.task.services import task_manager
-from fastapi import Path, Depends, Body
+from fastapi import Path, Depends, Body, Query, Request, HTTPException
+from fastapi.responses import Response
 from pydantic import BaseModel, Field, ConfigDict
 from pydantic.alias_generators import to_camel
 
@@ -16,7 +17,7 @@ from .models import TriHeartBookModel, TriHeartChapterModel, TriHeartPageModel,
 from .schemas import TriHeartBookQuery, TriHeartChapterQuery, TriHeartPageQuery, TriHeartChapterPageQuery, TriHeartBookUserQuery, TriHeartBookNoteQuery, TriHeartTermQuery, TriHeartPageTermQuery, TriHeartPageAttachmentQuery, TriHeartChapterVideoQuery
 from .services import (
   TriHeartBookService, TriHeartChapterService, TriHeartPageService, TriHeartChapterPageService, TriHeartBookUserService, TriHeartBookNoteService,
-  TriHeartTermService, TriHeartPageTermService, TriHeartPageAttachmentService, TriHeartChapterVideoService
+  TriHeartTermService, TriHeartPageTermService, TriHeartPageAttachmentService, TriHeartChapterVideoService, HLS_CONTENT_TYPES
 )
 
 
@@ -109,6 +110,7 @@ class TriHeartBookRouter(StringPKeyWithDictionaryRouter[TriHeartBookModel, TriHe
     )
     async def scan_coords_async(
         model_id: str = Path(..., description="书籍ID"),
+        full: bool = Query(False, description="忽略上次的扫描状态，全量重建"),
         auth_context: AuthContext = Depends(self.user_dependency)
     ):
       from .services import run_scan_coords_task
@@ -120,7 +122,7 @@ class TriHeartBookRouter(StringPKeyWithDictionaryRouter[TriHeartBookModel, TriHe
           ref_id=model_id,
           ref_type="book"
       )
-      asyncio.create_task(task_manager.run_task(task_id, run_scan_coords_task(auth_context.user_id, model_id, task_id)))
+      asyncio.create_task(task_manager.run_task(task_id, run_scan_coords_task(auth_context.user_id, model_id, task_id, full=full)))
       return RestResponse.success(data={"taskId": task_id}, message="坐标扫描任务已启动")
 
     @self.router.post(
@@ -207,6 +209,11 @@ class TriHeartPageAttachmentRouter(StringPKeyRouter[TriHeartPageAttachmentModel,
   pass
 
 
+def _playlist_url(request: Request, model_id: str) -> str:
+  """HLS 主播放列表接口的路径（含 API 前缀），子列表以相对路径解析到同一接口下"""
+  return request.url_for("chapter_video_hls_master", model_id=model_id).path
+
+
 @RouterMeta(prefix="/chapterVideo", tags=["三心书坊 - 章节视频管理"], module_name="章节视频管理")
 class TriHeartChapterVideoRouter(StringPKeyWithDictionaryRouter[TriHeartChapterVideoModel, TriHeartChapterVideoCrud, TriHeartChapterVideoQuery, TriHeartChapterVideoService]):
 
@@ -217,29 +224,98 @@ class TriHeartChapterVideoRouter(StringPKeyWithDictionaryRouter[TriHeartChapterV
         "/generate/{modelId}", summary="生成章节视频",
         openapi_extra=self._operation("生成章节视频", OperateType.OTHER, True)
     )
-    async def generate_video(modelId: str = Path(..., description="章节ID"), auth_context: AuthContext = Depends(self.user_dependency)):
+    async def generate_video(
+        modelId: str = Path(..., description="章节ID"),
+        draft: bool = Query(False, description="草稿模式：低清快速预览（标注场景序号），用于审稿，不覆盖正式视频"),
+        auth_context: AuthContext = Depends(self.user_dependency)
+    ):
       from .services import run_video_generation_task
-      task_id = await task_manager.create_task(user_id=auth_context.user_id, task_type="video_generation", task_name="生成章节视频导读", ref_id=modelId, ref_type="chapter")
-      asyncio.create_task(task_manager.run_task(task_id, run_video_generation_task(auth_context.user_id, modelId, task_id)))
-      return RestResponse.success(data={"taskId": task_id}, message="视频导读生成任务已启动")
+      task_name = "生成章节视频草稿预览" if draft else "生成章节视频导读"
+      task_id = await task_manager.create_task(user_id=auth_context.user_id, task_type="video_generation", task_name=task_name, ref_id=modelId, ref_type="chapter")
+      asyncio.create_task(task_manager.run_task(task_id, run_video_generation_task(auth_context.user_id, modelId, task_id, draft=draft)))
+      return RestResponse.success(data={"taskId": task_id}, message=f"{task_name}任务已启动")
+
+    @self.router.post(
+        "/generateBook/{bookId}", summary="整书生成章节视频",
+        openapi_extra=self._operation("整书生成章节视频", OperateType.OTHER, True)
+    )
+    async def generate_book_videos(
+        bookId: str = Path(..., description="书籍ID"),
+        force: bool = Query(False, description="已生成成功的章节也重新生成"),
+        auth_context: AuthContext = Depends(self.user_dependency)
+    ):
+      from .services import run_book_video_generation_task
+      task_id = await task_manager.create_task(user_id=auth_context.user_id, task_type="video_generation", task_name="整书生成章节视频导读", ref_id=bookId, ref_type="book")
+      asyncio.create_task(task_manager.run_task(task_id, run_book_video_generation_task(auth_context.user_id, bookId, task_id, force=force)))
+      return RestResponse.success(data={"taskId": task_id}, message="整书视频导读生成任务已启动")
+
+    @self.router.post(
+        "/prepareSlices/{bookId}", summary="预切分整书章节 PDF",
+        openapi_extra=self._operation("预切分整书章节 PDF", OperateType.OTHER, True)
+    )
+    async def prepare_chapter_slices(
+        bookId: str = Path(..., description="书籍ID"),
+        auth_context: AuthContext = Depends(self.user_dependency)
+    ):
+      from .services import run_chapter_slices_task
+      task_id = await task_manager.create_task(user_id=auth_context.user_id, task_type="pdf_slice", task_name="预切分整书章节 PDF", ref_id=bookId, ref_type="book")
+      asyncio.create_task(task_manager.run_task(task_id, run_chapter_slices_task(auth_context.user_id, bookId, task_id)))
+      return RestResponse.success(data={"taskId": task_id}, message="章节 PDF 切片任务已启动")
 
     @self.router.post(
         "/signUrl/{model_id}", summary="获取视频签名URL",
         openapi_extra=self._operation("获取视频签名URL", OperateType.QUERY)
     )
     async def get_video_sign_url(
+        request: Request,
         model_id: str = Path(..., description="视频记录ID"),
+        video_format: str = Query("mp4", alias="format", description="mp4: MP4 签名地址; hls: HLS 主播放列表地址（无 HLS 时回退为 MP4）; draft: 草稿预览签名地址"),
         service: TriHeartChapterVideoService = Depends(self._get_service),
         auth_context: AuthContext = Depends(self.optional_user_dependency)
     ):
-      sign_url = await service.get_video_sign_url(auth_context.user_id, model_id)
+      if video_format == "hls":
+        video = await service.get(auth_context.user_id, model_id)
+        if video and video.hls_path:
+          return RestResponse.success(data=_playlist_url(request, model_id))
+      sign_url = await service.get_video_sign_url(auth_context.user_id, model_id, draft=video_format == "draft")
       return RestResponse.success(data=sign_url)
 
+    @self.router.get(
+        "/hls/{model_id}/master.m3u8", summary="获取视频 HLS 主播放列表", name="chapter_video_hls_master",
+        openapi_extra=self._operation("获取视频 HLS 主播放列表", OperateType.QUERY)
+    )
+    async def get_video_hls_master(
+        model_id: str = Path(..., description="视频记录ID"),
+        service: TriHeartChapterVideoService = Depends(self._get_service),
+        auth_context: AuthContext = Depends(self.optional_user_dependency)
+    ):
+      playlist = await service.get_video_playlist(auth_context.user_id, model_id)
+      if playlist is None:
+        raise HTTPException(status_code=404, detail="HLS 播放列表不存在")
+      return Response(content=playlist, media_type=HLS_CONTENT_TYPES[".m3u8"], headers={"Cache-Control": "no-cache"})
+
+    @self.router.get(
+        "/hls/{model_id}/{variant}/index.m3u8", summary="获取视频 HLS 子播放列表",
+        openapi_extra=self._operation("获取视频 HLS 子播放列表", OperateType.QUERY)
+    )
+    async def get_video_hls_variant(
+        model_id: str = Path(..., description="视频记录ID"),
+        variant: str = Path(..., description="码率档位，如 720p"),
+        service: TriHeartChapterVideoService = Depends(self._get_service),
+        auth_context: AuthContext = Depends(self.optional_user_dependency)
+    ):
+      # 子列表内的切片地址为临时签名，不能被缓存
+      playlist = await service.get_video_playlist(auth_context.user_id, model_id, variant)
+      if playlist is None:
+        raise HTTPException(status_code=404, detail="HLS 播放列表不存在")
+      return Response(content=playlist, media_type=HLS_CONTENT_TYPES[".m3u8"], headers={"Cache-Control": "no-cache"})
+
     @self.router.post(
         "/byChapter/{chapter_id}", summary="根据章节查询视频",
         openapi_extra=self._operation("根据章节查询视频", OperateType.QUERY)
     )
     async def get_video_by_chapter(
+        request: Request,
         chapter_id: str = Path(..., description="章节ID"),
         service: TriHeartChapterVideoService = Depends(self._get_service),
         auth_context: AuthContext = Depends(self.optional_user_dependency)
@@ -247,7 +323,8 @@ class TriHeartChapterVideoRouter(StringPKeyWithDictionaryRouter[TriHeartChapterV
       video = await service.get_by_chapter_id(auth_context.user_id, chapter_id)
       if video and video.process_status == "2":
         sign_url = await service.get_video_sign_url(auth_context.user_id, video.model_id or "")
-        return RestResponse.success(data={"video": video, "signUrl": sign_url})
+        playlist_url = _playlist_url(request, video.model_id or "") if video.hls_path else ""
+        return RestResponse.success(data={"video": video, "signUrl": sign_url, "playlistUrl": playlist_url})
       return RestResponse.success(data=None)
 
 
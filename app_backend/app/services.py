@@ -1,8 +1,12 @@
 # /app/services.py
 import asyncio
+import contextlib
 import json
 import os
-from typing import List, Tuple, Callable, Dict, Any, Sequence, Generic
+import re
+import shutil
+import time
+from typing import List, Tuple, Callable, Dict, Any, Sequence, Generic, Awaitable, AsyncIterator
 
 import httpx
 from brtech_backend.core import database
@@ -11,19 +15,25 @@ from brtech_backend.core.config import app_settings
 from brtech_backend.core.models import M
 from brtech_backend.core.schemas import UniqueConstraint
 from brtech_backend.core.services import StringPKeyRecurseService, StringPKeyService
+from brtech_backend.core.storage import StorageProvider
 from brtech_backend.dictionary.services import StringPKeyWithDictionaryService
 from brtech_backend.payment.handler import PaymentDispatcher, PaymentServiceMixin
 from brtech_backend.payment.models import PayOrderModel
 from brtech_backend.task.services import task_manager
 from fastapi import HTTPException
 from fastapi.concurrency import run_in_threadpool
+from minio import Minio
 
 from .ai_helper import AiHelper
+from .artifact_cache import ArtifactCache
+from .asset_resolver import AssetResolver
 from .config import thba_app_settings
+from .llm_input_helper import LlmInputHelper, LLM_INPUT_MODES, MODE_TEXT, MODE_PDF, MODE_IMAGES
 # 引入本项目依赖
 from .crud import TriHeartPageCrud, TriHeartBookCrud, TriHeartChapterCrud, TriHeartChapterPageCrud, TriHeartBookNoteCrud, TriHeartBookUserCrud, TriHeartTermCrud, TriHeartPageTermCrud, TriHeartPageAttachmentCrud, TriHeartChapterVideoCrud
 from .models import TriHeartPageModel, TriHeartBookModel, TriHeartChapterModel, TriHeartChapterPageModel, TriHeartBookUserModel, TriHeartBookNoteModel, TriHeartPageTermModel, TriHeartTermModel, TriHeartPageAttachmentModel, TriHeartChapterVideoModel
 from .pdf_helper import PdfStructure, PdfPage, PdfHelper
+from .term_matcher import TermScanState, page_fingerprints, prefilter_pages, scan_terms_sharded
 from .schemas import TriHeartPageQuery, TriHeartBookQuery, TriHeartChapterQuery, TriHeartChapterPageQuery, TriHeartBookUserQuery, TriHeartBookNoteQuery, TriHeartTermQuery, TriHeartPageTermQuery, TriHeartPageAttachmentQuery, TriHeartChapterVideoQuery
 
 # =========================================================
@@ -63,20 +73,42 @@ async def run_extract_terms_task(user_id: str, book_id: str, from_page: int, to_
     await service.ai_extraction_logic(user_id, book_id, from_page, to_page)
 
 
-async def run_scan_coords_task(user_id: str, book_id: str, task_id: str):
+async def run_scan_coords_task(user_id: str, book_id: str, task_id: str, full: bool = False):
   """坐标扫描任务 Wrapper"""
   session_maker = database.get_session_maker()
   async with session_maker() as new_db:
     service = TriHeartBookService(new_db)
-    await service.scan_coordinates_logic(user_id, book_id)
+    await service.scan_coordinates_logic(user_id, book_id, task_id, full=full)
 
 
-async def run_video_generation_task(user_id: str | None, chapter_id: str, task_id: str):
+async def run_video_generation_task(user_id: str | None, chapter_id: str, task_id: str, draft: bool = False):
   """视频导读生成任务 Wrapper"""
   session_maker = database.get_session_maker()
   async with session_maker() as new_db:
     service = TriHeartChapterVideoService(new_db)
-    await service.generate_chapter_video(user_id, chapter_id, task_id)
+    await service.generate_chapter_video(user_id, chapter_id, task_id, draft=draft)
+
+
+async def run_chapter_slices_task(user_id: str | None, book_id: str, task_id: str):
+  """整书章节 PDF 切片预计算任务 Wrapper"""
+  session_maker = database.get_session_maker()
+  async with session_maker() as new_db:
+    service = TriHeartChapterVideoService(new_db)
+    book = await TriHeartBookService(new_db).get(user_id, book_id)
+    if not book or not book.book_pdf_path:
+      await task_manager.update_progress(task_id, 100, "失败：书籍或原始 PDF 不存在")
+      return
+    chapters = await TriHeartChapterService(new_db).query_leaf_chapters(user_id, book_id)
+    slices = await service.prepare_chapter_slices(user_id, book, chapters, report=lambda percent, msg: task_manager.update_progress(task_id, percent, msg))
+    await task_manager.update_progress(task_id, 100, f"章节 PDF 切片完成：{len(slices)}/{len(chapters)} 个章节")
+
+
+async def run_book_video_generation_task(user_id: str | None, book_id: str, task_id: str, force: bool = False):
+  """整书视频导读批量生成任务 Wrapper（章节查询用独立 Session，每个章节另开 Session）"""
+  session_maker = database.get_session_maker()
+  async with session_maker() as new_db:
+    service = TriHeartChapterVideoService(new_db)
+    await service.generate_book_videos(user_id, book_id, task_id, force=force)
 
 
 # =========================================================
@@ -125,6 +157,20 @@ class TriHeartChapterService(StringPKeyRecurseService[TriHeartChapterModel, TriH
         raise e
     return rtn_val
 
+  async def query_leaf_chapters(self, user_id: str | None, book_id: str) -> List[TriHeartChapterModel]:
+    """查询书籍的叶子章节（父章节的页码范围与子章节重叠，按需处理时只取叶子），按起始页排序"""
+    chapters = await self.query_all(user_id, TriHeartChapterQuery(book_id=book_id))
+    # 查询结果可能是平铺列表，也可能带 children 树，统一展开后按 parent_id 判断叶子
+    flat: List[TriHeartChapterModel] = []
+    stack = list(reversed(chapters))
+    while stack:
+      chapter = stack.pop()
+      flat.append(chapter)
+      stack.extend(reversed(getattr(chapter, "children", None) or []))
+    parent_ids = {getattr(c, "parent_id", None) for c in flat}
+    leaves = {c.model_id: c for c in flat if c.model_id not in parent_ids and not getattr(c, "children", None)}
+    return sorted(leaves.values(), key=lambda c: c.from_page_no or 0)
+
 
 class TriHeartPageService(StringPKeyService[TriHeartPageModel, TriHeartPageCrud, TriHeartPageQuery]):
 
@@ -530,7 +576,15 @@ class TriHeartBookService(StringPKeyWithDictionaryService[TriHeartBookModel, Tri
       return
 
     # 3. 调用 AI
-    ai_helper = AiHelper(api_key=app_settings.AI_API_KEY, base_url=app_settings.AI_BASE_URL, model=app_settings.AI_MODEL_NAME, max_tokens=app_settings.AI_MAX_TOKENS)
+    ai_helper = AiHelper(
+        api_key=app_settings.AI_API_KEY, base_url=app_settings.AI_BASE_URL, model=app_settings.AI_MODEL_NAME, max_tokens=app_settings.AI_MAX_TOKENS,
+        fallback_model=thba_app_settings.AI_FALLBACK_MODEL_NAME,
+        fallback_base_url=thba_app_settings.AI_FALLBACK_BASE_URL,
+        fallback_api_key=thba_app_settings.AI_FALLBACK_API_KEY,
+        deadline=thba_app_settings.AI_DEADLINE_SECONDS,
+        hedge_percentile=thba_app_settings.LLM_HEDGE_PERCENTILE,
+        hedge_default_delay=thba_app_settings.LLM_HEDGE_DEFAULT_DELAY
+    )
     try:
       ai_terms_list = await ai_helper.extract_terms_from_text(full_text)
     except Exception as e:
@@ -565,13 +619,14 @@ class TriHeartBookService(StringPKeyWithDictionaryService[TriHeartBookModel, Tri
     else:
       self.logger.info("✅ [AI Task] 没有发现新术语")
 
-  async def scan_coordinates_logic(self, user_id: str, book_id: str):
+  async def scan_coordinates_logic(self, user_id: str, book_id: str, task_id: str | None = None, full: bool = False):
     """
     全书扫描：
     1. 下载 PDF (如果不存在)
     2. 获取该书所有 Term
-    3. 使用 PyMuPDF 扫描所有页面的坐标
-    4. 覆盖写入 PageTerm 关联表
+    3. 使用 PyMuPDF 单遍扫描所有页面的坐标（多术语自动机），按页码分片多进程并行；
+       有上次的扫描状态时只扫描新增 / 改名的术语与内容变化的页面（full=True 时强制全量）
+    4. 写入 PageTerm 关联表（分片完成即写入；增量扫描只删除、重写受影响的记录）
     """
     self.logger.info(f"🔍 [Scan Task] 开始全书坐标扫描: Book={book_id}")
 
@@ -621,50 +676,100 @@ class TriHeartBookService(StringPKeyWithDictionaryService[TriHeartBookModel, Tri
 
     self.logger.info(f"待扫描关键词数: {len(target_keywords)}")
 
-    # 3. 执行扫描 (CPU 密集型，放入线程池)
-    # 扫描全书：1 到 book_page_count
+    # 3. 对比上次的扫描状态：只扫描新增 / 改名的术语（全书）与内容变化的页面（全部术语），没有状态时全量扫描
+    # 扫描全书：1 到 book_page_count（超出实际页数的部分会被截断）
+    # 所有术语建成一个 Aho-Corasick 自动机，每页文字层只扫一遍，耗时基本不随术语数量增长；按页码分片交给进程池并行
+    started = time.perf_counter()
     total_pages = book.book_page_count or 1000
-
-    scan_result = await run_in_threadpool(
-        PdfHelper.scan_terms_in_range,
-        pdf_path=local_pdf_path,
-        from_page=1,
-        to_page=total_pages,
-        keywords=target_keywords
+    current_terms = {term_id: term_key for term_key, term_id in term_map.items()}
+    state_path = os.path.join(thba_app_settings.TERM_SCAN_STATE_DIR, f"{book_id}.json")
+    state = None if full else TermScanState.load(state_path)
+    pdf_stat = TermScanState.stat_pdf(local_pdf_path)
+    if state and state.pdf_stat == pdf_stat:
+      fingerprints = state.pages  # PDF 文件未变，沿用上次的页面指纹
+    else:
+      fingerprints = await run_in_threadpool(page_fingerprints, local_pdf_path)
+    fingerprints = {page_no: digest for page_no, digest in fingerprints.items() if page_no <= total_pages}
+
+    rescan_terms: set[str] = set()
+    removed_terms: set[str] = set()
+    changed_pages: set[int] = set()
+    if state:
+      rescan_terms, removed_terms, changed_pages = state.diff(current_terms, fingerprints)
+      if len(changed_pages) > len(fingerprints) * thba_app_settings.TERM_SCAN_DELTA_MAX_PAGE_RATIO:
+        self.logger.info(f"{len(changed_pages)}/{len(fingerprints)} 页内容有变化，改为全量扫描")
+        state = None
+
+    # 扫描任务列表：(术语, 页码)，页码为 None 表示全书
+    jobs: list[tuple[list[str], list[int] | None]] = []
+    if state is None:
+      mode = "全量"
+      jobs.append((target_keywords, None))
+    else:
+      mode = "增量"
+      if rescan_terms:
+        # 新术语只需在未变化的页面上找（变化的页面下面会用全部术语重扫），先用纯文本粗筛出可能命中的页面
+        rescan_keys = [current_terms[term_id] for term_id in rescan_terms]
+        unchanged_pages = sorted(set(fingerprints) - changed_pages)
+        jobs.append((rescan_keys, await run_in_threadpool(prefilter_pages, local_pdf_path, rescan_keys, unchanged_pages)))
+      if changed_pages:
+        jobs.append((target_keywords, sorted(page_no for page_no in changed_pages if page_no in fingerprints)))
+      if not rescan_terms and not removed_terms and not changed_pages:
+        self.logger.info("✅ [Scan Task] 术语与页面均无变化，无需扫描")
+        if task_id:
+          await task_manager.update_progress(task_id, 100, "坐标扫描完成：术语与页面均无变化")
+        return
+      # 只删除受影响的记录：改名 / 删除的术语（全书）+ 内容变化的页面（全部术语），随后重新插入，等价于按 (页, 术语) upsert
+      await page_term_service.get_crud().remove_by_terms_or_pages(book_id, sorted(rescan_terms | removed_terms), sorted(changed_pages))
+    self.logger.info(
+        f"{mode}扫描: 重扫术语 {len(rescan_terms) if state else len(target_keywords)} 个，"
+        f"内容变化页面 {len(changed_pages)} 页，删除术语 {len(removed_terms)} 个"
     )
 
-    if not scan_result:
+    # 4. 入库：分片扫描完成即写入，同一事务内删除旧记录并分批插入，最后统一提交
+    written = 0
+    for job_index, (keywords, pages) in enumerate(jobs):
+      async for done, total, shard_result in scan_terms_sharded(
+          local_pdf_path, 1, total_pages, keywords,
+          workers=thba_app_settings.TERM_SCAN_WORKERS,
+          shard_pages=thba_app_settings.TERM_SCAN_SHARD_PAGES,
+          pages=pages
+      ):
+        new_page_terms = [
+          TriHeartPageTermModel(
+              book_id=book_id,
+              page_no=page_no,
+              term_id=term_map[match['term']],
+              term_key=match['term'],
+              rects_json=match['rects']
+          )
+          for page_no, matches in shard_result.items()
+          for match in matches
+          if match['term'] in term_map
+        ]
+        if new_page_terms:
+          if state is None and not written:
+            # 全量扫描：首个有命中的分片到达时才清理该书所有的旧坐标记录（全书无命中时保留旧数据）
+            await page_term_service.delete_query(user_id, TriHeartPageTermQuery(book_id=book_id), commit=False)
+          await page_term_service.create_batch(user_id, new_page_terms, commit=False)
+          written += len(new_page_terms)
+        if task_id:
+          percent = min(99, int((job_index + done / total) * 100 / len(jobs)))
+          await task_manager.update_progress(task_id, percent, f"坐标扫描（{mode}）{done}/{total} 页，已写入 {written} 条")
+
+    if state is None and not written:
       self.logger.info("未匹配到任何坐标")
+      if task_id:
+        await task_manager.update_progress(task_id, 100, "坐标扫描完成：未匹配到任何坐标")
       return
 
-    # 4. 入库 (先删后加)
-    # 清理该书所有的旧坐标记录
-    await page_term_service.delete_query(user_id, TriHeartPageTermQuery(book_id=book_id), commit=False)
-
-    new_page_terms = []
-    for page_no, matches in scan_result.items():
-      for match in matches:
-        term_key = match['term']
-        rects = match['rects']
-        term_id = term_map.get(term_key)
-
-        if term_id:
-          new_page_terms.append(TriHeartPageTermModel(
-              book_id=book_id,
-              page_no=page_no,
-              term_id=term_id,
-              term_key=term_key,
-              rects_json=rects
-          ))
-
-    if new_page_terms:
-      # 批量写入
-      # 注意：如果数据量特别大（如几万条），建议分批写入，这里假设一般就在几千条以内
-      await page_term_service.create_batch(user_id, new_page_terms, commit=True)
-      self.logger.info(f"✅ [Scan Task] 扫描完成，更新了 {len(new_page_terms)} 条坐标关联")
-    else:
-      await page_term_service.get_crud().commit()  # 提交删除操作
-      self.logger.info("✅ [Scan Task] 扫描完成，但没有匹配项 (已清理旧数据)")
+    await page_term_service.get_crud().commit()
+    # 提交成功后才记录扫描状态；写库失败时下次仍按旧状态对比
+    TermScanState(current_terms, fingerprints, pdf_stat).save(state_path)
+    summary = f"{mode}扫描完成，写入 {written} 条坐标关联，耗时 {time.perf_counter() - started:.1f}s"
+    self.logger.info(f"✅ [Scan Task] {summary}")
+    if task_id:
+      await task_manager.update_progress(task_id, 100, f"坐标扫描{summary}")
 
 
 class PageRectsMixinService(Generic[M]):
@@ -929,14 +1034,326 @@ class TriHeartPageAttachmentService(StringPKeyWithDictionaryService[TriHeartPage
   pass
 
 
+async def _iter_file(path: str, chunk_size: int = 1024 * 1024) -> AsyncIterator[bytes]:
+  """按块读取文件，作为 httpx 的流式请求体，整个文件不进内存"""
+  with open(path, "rb") as f:
+    while chunk := await asyncio.to_thread(f.read, chunk_size):
+      yield chunk
+
+
+# HLS 子列表目录名（如 720p），同时用于校验接口参数，防止路径穿越
+HLS_VARIANT_PATTERN = re.compile(r"^\d{3,4}p$")
+HLS_CONTENT_TYPES = {
+  ".m3u8": "application/vnd.apple.mpegurl",
+  ".ts": "video/mp2t",
+}
+# 已签名的 HLS 子播放列表：{子列表 OSS 路径@记录更新时间: (过期时间, 内容)}，避免每次播放器请求都逐个切片签名
+_signed_playlists: Dict[str, Tuple[float, str]] = {}
+PREVIEW_CONTENT_TYPES = {
+  ".jpg": "image/jpeg",
+  ".vtt": "text/vtt",
+}
+
+
+class VideoStageGates:
+  """
+  视频流水线各阶段的并发闸门。整书批量生成时所有章节共享同一组闸门：
+  每个阶段各自限流，章节之间自然形成流水线（第 N+1 章调用 LLM 时，第 N 章在配音、第 N-1 章在渲染）。
+  未配置上限的阶段不限流，单章节生成时即为全部放行。
+  """
+
+  def __init__(self, limits: Dict[str, int] | None = None):
+    """:param limits: {阶段名: 并发上限}，阶段名为 llm / tts / render"""
+    self._semaphores = {name: asyncio.Semaphore(max(1, limit)) for name, limit in (limits or {}).items()}
+    self._locks: Dict[str, asyncio.Lock] = {}
+
+  def stage(self, name: str):
+    return self._semaphores.get(name) or contextlib.nullcontext()
+
+  def lock(self, key: str) -> asyncio.Lock:
+    """按 key 互斥（如同一本书的原始 PDF 只允许一个章节下载）"""
+    return self._locks.setdefault(key, asyncio.Lock())
+
+
 class TriHeartChapterVideoService(StringPKeyWithDictionaryService[TriHeartChapterVideoModel, TriHeartChapterVideoCrud, TriHeartChapterVideoQuery]):
 
-  async def get_video_sign_url(self, user_id: str | None, video_id: str) -> str:
-    """获取视频签名 URL"""
+  async def get_video_sign_url(self, user_id: str | None, video_id: str, draft: bool = False) -> str:
+    """获取视频签名 URL（draft 为 True 时返回草稿预览视频）"""
     video = await self.get(user_id, video_id)
-    if not video or not video.video_path:
+    video_path = (video.draft_video_path if draft else video.video_path) if video else None
+    if not video_path:
       return ""
-    return await self.get_oss_download_sign_url(user_id, video.video_path, with_cdn=True)
+    return await self.get_oss_download_sign_url(user_id, video_path, with_cdn=True)
+
+  async def get_video_playlist(self, user_id: str | None, video_id: str, variant: str | None = None) -> str | None:
+    """
+    读取 OSS 上的 HLS 播放列表。OSS 为私有读，切片地址必须逐个签名：
+    - 主播放列表原样返回，其中的子列表为相对路径，由播放器解析到后端的子列表接口
+    - 子列表中的 ts 切片改写为带签名的 OSS 地址；签好的子列表在进程内缓存 VIDEO_HLS_PLAYLIST_CACHE_SECONDS 秒
+    """
+    video = await self.get(user_id, video_id)
+    if not video or not video.hls_path:
+      return None
+    hls_dir = video.hls_path.rsplit("/", 1)[0]
+    if variant is None:
+      playlist_key = video.hls_path
+    elif HLS_VARIANT_PATTERN.match(variant):
+      playlist_key = f"{hls_dir}/{variant}/index.m3u8"
+    else:
+      return None
+
+    # 带上记录更新时间，重新生成视频后旧的签名列表自然失效
+    cache_key = f"{playlist_key}@{video.update_timestamp}"
+    if variant is not None:
+      cached = _signed_playlists.get(cache_key)
+      if cached and cached[0] > time.monotonic():
+        return cached[1]
+
+    playlist_sign_url = await self.get_oss_download_sign_url(user_id, playlist_key)
+    async with httpx.AsyncClient(timeout=30) as client:
+      resp = await client.get(playlist_sign_url)
+      resp.raise_for_status()
+    if variant is None:
+      return resp.text
+
+    lines = []
+    for line in resp.text.splitlines():
+      if line and not line.startswith("#"):
+        line = await self.get_oss_download_sign_url(user_id, f"{hls_dir}/{variant}/{line}", with_cdn=True)
+      lines.append(line)
+    playlist = "\n".join(lines) + "\n"
+
+    now = time.monotonic()
+    for key in [key for key, (expires, _) in _signed_playlists.items() if expires <= now]:
+      del _signed_playlists[key]
+    _signed_playlists[cache_key] = (now + thba_app_settings.VIDEO_HLS_PLAYLIST_CACHE_SECONDS, playlist)
+    return playlist
+
+  async def _upload_file(self, user_id: str | None, client: httpx.AsyncClient, local_path: str, object_key: str, content_type: str):
+    """
+    把本地文件上传到 OSS，请求体均从磁盘流式读取：
+    - 超过 VIDEO_UPLOAD_MULTIPART_THRESHOLD_MB 的文件（成片）交给存储客户端底层的 minio SDK 分片并发上传
+    - 其余通过签名地址单次 PUT
+    """
+    size = os.path.getsize(local_path)
+    storage = StorageProvider.get()
+    minio_client = getattr(storage, "client", None)
+    multipart = size >= thba_app_settings.VIDEO_UPLOAD_MULTIPART_THRESHOLD_MB * 1024 * 1024
+    if multipart and not isinstance(minio_client, Minio):
+      self.logger.warning(f"[OSS] 存储客户端 {type(storage).__name__} 不支持分片上传，{object_key} 改为单次流式 PUT")
+    elif multipart:
+      # 凭据、地址与桶均来自 main.py 中注册的存储客户端；SDK 按分片读盘，失败的分片由其 HTTP 客户端重试
+      await run_in_threadpool(
+          minio_client.fput_object, storage.bucket_name, object_key, local_path,
+          content_type=content_type,
+          part_size=max(5, thba_app_settings.VIDEO_UPLOAD_PART_MB) * 1024 * 1024,
+          num_parallel_uploads=max(1, thba_app_settings.VIDEO_UPLOAD_CONCURRENCY)
+      )
+      return
+
+    upload_sign_url = await self.get_oss_upload_sign_url(user_id, object_key, content_type=content_type)
+    resp = await client.put(
+        url=upload_sign_url["uploadUrl"],
+        content=_iter_file(local_path),
+        headers={**upload_sign_url["headers"], "Content-Length": str(size)}
+    )
+    resp.raise_for_status()
+
+  async def _package_and_upload_hls(self, user_id: str | None, client: httpx.AsyncClient, renderer, mp4_path: str, hls_dir: str, object_prefix: str) -> str:
+    """打包 HLS 多码率切片并并发上传到 {object_prefix}/ 下，返回主播放列表的 OSS 路径"""
+    ladder = []
+    for rung in thba_app_settings.VIDEO_HLS_LADDER.split(","):
+      height, _, bitrate = rung.strip().partition(":")
+      if height and bitrate:
+        ladder.append((int(height), bitrate))
+    master_path = await run_in_threadpool(renderer.package_hls, mp4_path, hls_dir, ladder, thba_app_settings.VIDEO_HLS_SEGMENT_SECONDS)
+
+    semaphore = asyncio.Semaphore(8)
+
+    async def _upload(local_path: str):
+      relative = os.path.relpath(local_path, hls_dir).replace(os.sep, "/")
+      content_type = HLS_CONTENT_TYPES.get(os.path.splitext(local_path)[1], "application/octet-stream")
+      async with semaphore:
+        await self._upload_file(user_id, client, local_path, f"{object_prefix}/{relative}", content_type)
+
+    # 先传切片与子列表，最后传主播放列表，保证主列表可见时其引用的内容均已就绪
+    files = [os.path.join(root, name) for root, _, names in os.walk(hls_dir) for name in names]
+    await asyncio.gather(*[_upload(path) for path in files if path != master_path])
+    await _upload(master_path)
+    return f"{object_prefix}/master.m3u8"
+
+  async def _upload_draft(self, user_id: str | None, video_model: TriHeartChapterVideoModel, script: list, draft_path: str, object_key: str):
+    """上传草稿预览并记录到 draft_video_path，同时保存带实测时长的脚本"""
+    async with httpx.AsyncClient(timeout=120) as client:
+      await self._upload_file(user_id, client, draft_path, object_key, "video/mp4")
+    video_model.draft_video_path = object_key
+    video_model.script_json = json.dumps(script, ensure_ascii=False)
+    await self.update(user_id, video_model, commit=True)
+
+  async def _ensure_book_pdf(self, user_id: str | None, book: TriHeartBookModel, gates: VideoStageGates, report: Callable[[int, str], Awaitable[None]] | None = None) -> str | None:
+    """确保原始 PDF 在本地（本节点解析产物或从 OSS 下载），返回本地路径；下载失败返回 None"""
+    # 多个章节共用同一份原始 PDF，加锁避免重复下载与读到半截文件
+    raw_pdf_local = f"var/{book.book_pdf_path}"
+    async with gates.lock(raw_pdf_local):
+      if not (os.path.exists(raw_pdf_local) and os.path.getsize(raw_pdf_local) > 1024):
+        if report:
+          await report(12, "下载原始 PDF...")
+        pdf_sign_url = await self.get_oss_download_sign_url(user_id, book.book_pdf_path)
+        # 流式写入 .part 文件，不把整本 PDF 读入内存；完整写完后再原子替换
+        async with httpx.AsyncClient(timeout=300) as client:
+          async with client.stream("GET", pdf_sign_url) as resp:
+            if resp.status_code != 200:
+              self.logger.warning(f"[视频生成] PDF 下载失败 HTTP {resp.status_code}，将降级使用 WebP")
+              return None
+            os.makedirs(os.path.dirname(raw_pdf_local), exist_ok=True)
+            try:
+              with open(f"{raw_pdf_local}.part", "wb") as f:
+                async for chunk in resp.aiter_bytes(1024 * 1024):
+                  f.write(chunk)
+            except BaseException:
+              if os.path.exists(f"{raw_pdf_local}.part"):
+                os.remove(f"{raw_pdf_local}.part")
+              raise
+          os.replace(f"{raw_pdf_local}.part", raw_pdf_local)
+          self.logger.info(f"[视频生成] 原始 PDF 已下载至 {raw_pdf_local}")
+    return raw_pdf_local
+
+  async def _book_pdf_fingerprint(self, user_id: str | None, book: TriHeartBookModel, gates: VideoStageGates) -> str:
+    """
+    原始 PDF 的内容指纹：只取第 1 个字节，读响应头中的 ETag，不下载整本 PDF。
+    拿不到 ETag 时退回本地文件的内容哈希（需要先下载）。
+    """
+    try:
+      pdf_sign_url = await self.get_oss_download_sign_url(user_id, book.book_pdf_path)
+      async with httpx.AsyncClient(timeout=30) as client:
+        resp = await client.get(pdf_sign_url, headers={"Range": "bytes=0-0"})
+      etag = resp.headers.get("ETag", "").strip('"') if resp.status_code in (200, 206) else ""
+      if etag:
+        return f"etag:{etag}"
+    except httpx.HTTPError as e:
+      self.logger.warning(f"[PDF切片] 获取 PDF ETag 失败: {e}")
+
+    raw_pdf_local = await self._ensure_book_pdf(user_id, book, gates)
+    if raw_pdf_local:
+      return f"sha256:{await asyncio.to_thread(ArtifactCache.hash_file, raw_pdf_local)}"
+    return f"path:{book.book_pdf_path}"
+
+  async def prepare_chapter_slices(
+      self,
+      user_id: str | None,
+      book: TriHeartBookModel,
+      chapters: Sequence[TriHeartChapterModel],
+      gates: VideoStageGates | None = None,
+      report: Callable[[int, str], Awaitable[None]] | None = None
+  ) -> Dict[str, str]:
+    """
+    准备章节 PDF 切片：先查切片缓存，未命中的章节打开一次原始 PDF 批量切出后写入缓存。
+    缓存键由原始 PDF 的内容指纹（OSS ETag）与页码范围组成，重新上传或修改章节页码后自动失效，修改书籍其他信息不影响。
+
+    :return: {章节ID: 缓存内切片路径}（只读，调用方不要原地修改）
+    """
+    from .pdf_slice_helper import PdfSliceHelper
+
+    cache = ArtifactCache("pdf_slices", root=thba_app_settings.VIDEO_CACHE_DIR, max_bytes=thba_app_settings.VIDEO_PDF_SLICE_CACHE_MAX_MB * 1024 * 1024)
+    result: Dict[str, str] = {}
+    missing: Dict[str, Tuple[int, int]] = {}
+    keys: Dict[str, str] = {}
+    fingerprint = await self._book_pdf_fingerprint(user_id, book, gates or VideoStageGates())
+    for chapter in chapters:
+      if not chapter.from_page_no:
+        continue
+      to_page_no = chapter.to_page_no or chapter.from_page_no
+      keys[chapter.model_id] = ArtifactCache.make_key("pdf_slice", fingerprint, chapter.from_page_no, to_page_no)
+      hit = cache.get(keys[chapter.model_id], ".pdf")
+      if hit:
+        result[chapter.model_id] = hit[0]
+      else:
+        missing[chapter.model_id] = (chapter.from_page_no, to_page_no)
+
+    if missing:
+      raw_pdf_local = await self._ensure_book_pdf(user_id, book, gates or VideoStageGates(), report)
+      if raw_pdf_local:
+        if report:
+          await report(13, f"切片 PDF（{len(missing)} 个章节）...")
+        work_dir = f"var/{user_id}/{book.model_id}/slices_{os.getpid()}_{id(missing)}"
+        try:
+          sliced = await run_in_threadpool(PdfSliceHelper.slice_many, raw_pdf_local, missing, work_dir)
+          for chapter_id, path in sliced.items():
+            from_page_no, to_page_no = missing[chapter_id]
+            meta = {"book_id": book.model_id, "chapter_id": chapter_id, "pdf_path": book.book_pdf_path, "from_page_no": from_page_no, "to_page_no": to_page_no}
+            result[chapter_id] = await asyncio.to_thread(cache.put, keys[chapter_id], path, meta, ".pdf", True)
+        finally:
+          shutil.rmtree(work_dir, ignore_errors=True)
+
+    self.logger.info(f"[PDF切片] 书籍 {book.model_id}: {len(chapters)} 个章节，缓存命中 {len(chapters) - len(missing)}，新切 {len(missing)}，可用 {len(result)}")
+    return result
+
+  async def _prepare_llm_input(
+      self,
+      user_id: str | None,
+      book: TriHeartBookModel | None,
+      chapter: TriHeartChapterModel,
+      pages: List[TriHeartPageModel],
+      page_local_paths: Dict[int, str],
+      gates: VideoStageGates,
+      report: Callable[[int, str], Awaitable[None]]
+  ) -> Dict[str, Any]:
+    """
+    准备送 AI 的章节输入：字数取自库中 page_content，图片占比由 PDF 切片计算，
+    据此在 text / pdf / images 中选择 payload 最小且不丢信息的形式（VIDEO_AI_INPUT_MODE 可强制指定）。
+    """
+    settings = thba_app_settings
+    selector = LlmInputHelper(
+        text_min_chars=settings.VIDEO_AI_TEXT_MIN_CHARS,
+        text_max_image_ratio=settings.VIDEO_AI_TEXT_MAX_IMAGE_RATIO,
+        scan_max_chars=settings.VIDEO_AI_SCAN_MAX_CHARS,
+        image_max_side=settings.VIDEO_AI_IMAGE_MAX_SIDE,
+        image_quality=settings.VIDEO_AI_IMAGE_QUALITY,
+        image_grayscale=settings.VIDEO_AI_IMAGE_GRAYSCALE,
+        image_workers=settings.VIDEO_AI_IMAGE_WORKERS,
+        image_cache=ArtifactCache("llm_images", root=settings.VIDEO_CACHE_DIR, max_bytes=settings.VIDEO_AI_IMAGE_CACHE_MAX_MB * 1024 * 1024),
+        model=settings.VIDEO_AI_MODEL_NAME
+    )
+    # 章节 PDF 切片：优先取切片缓存（整书批量生成会预先一次性切好所有章节），未命中时下载原始 PDF 并切出本章
+    pdf_slice_path: str | None = None
+    if book and book.book_pdf_path:
+      try:
+        pdf_slice_path = (await self.prepare_chapter_slices(user_id, book, [chapter], gates, report)).get(chapter.model_id)
+      except Exception as e:
+        self.logger.warning(f"[视频生成] PDF 切片失败: {e}，将降级使用文字或书页图片")
+
+    page_texts = [page.page_content or "" for page in pages]
+    try:
+      densities = await run_in_threadpool(LlmInputHelper.measure_pages, page_texts, pdf_slice_path)
+    except Exception as e:
+      self.logger.warning(f"[视频生成] 统计书页内容密度失败: {e}")
+      densities = LlmInputHelper.measure_pages(page_texts)
+
+    mode = settings.VIDEO_AI_INPUT_MODE
+    if mode not in LLM_INPUT_MODES:
+      mode = selector.choose_mode(densities, pdf_slice_path is not None)
+    elif mode == MODE_PDF and not pdf_slice_path:
+      mode = MODE_IMAGES
+
+    ratios = [d["image_ratio"] for d in densities if d["image_ratio"] is not None]
+    llm_input: Dict[str, Any] = {
+      "mode": mode,
+      "avg_chars": round(sum(d["chars"] for d in densities) / max(1, len(densities)), 1),
+      "avg_image_ratio": round(sum(ratios) / len(ratios), 4) if ratios else None,
+    }
+    if mode == MODE_TEXT:
+      llm_input["page_texts"] = await run_in_threadpool(LlmInputHelper.extract_text_pages, page_texts, pdf_slice_path)
+    elif mode == MODE_PDF:
+      with open(pdf_slice_path, "rb") as f:
+        llm_input["pdf_bytes"] = f.read()
+    else:
+      llm_input["images"] = await run_in_threadpool(selector.prepare_images, [page_local_paths[k] for k in sorted(page_local_paths)])
+
+    self.logger.info(
+        f"[视频生成] 章节 '{chapter.chapter_title}' 送 AI 模式: {mode}"
+        f"（平均每页 {llm_input['avg_chars']} 字，图片占比 {llm_input['avg_image_ratio']}）"
+    )
+    return llm_input
 
   async def get_by_chapter_id(self, user_id: str | None, chapter_id: str) -> TriHeartChapterVideoModel | None:
     """根据章节 ID 获取已完成的视频"""
@@ -948,29 +1365,47 @@ class TriHeartChapterVideoService(StringPKeyWithDictionaryService[TriHeartChapte
   async def post_select_batch(self, user_id: str | None, models: list[TriHeartChapterVideoModel], query: TriHeartChapterVideoQuery | None = None) -> None:
     await super().post_select_batch(user_id, models, query)
 
-  async def generate_chapter_video(self, user_id: str | None, chapter_id: str, task_id: str):
+  async def generate_chapter_video(
+      self,
+      user_id: str | None,
+      chapter_id: str,
+      task_id: str,
+      draft: bool = False,
+      progress: Callable[[int, str], Awaitable[None]] | None = None,
+      gates: "VideoStageGates | None" = None
+  ) -> bool:
     """
     核心视频生成流水线：
     1. 获取章节信息
     2. 获取书页图片（本地已有则跳过下载）
     3. 调用多模态 LLM 生成脚本（DB 已有则跳过，断点续跑节省费用）
-    4. 调用 Edge-TTS 生成配音（本地已有音频则跳过）
+    4. 调用 Edge-TTS 生成配音（命中跨任务音频缓存则跳过）
     5. 调用 VideoRenderer 渲染视频（本地已有 MP4 则跳过）
     6. 上传 OSS 并保存记录
+
+    draft 为 True 时只渲染低清草稿预览（标注场景序号，供审稿核对节奏与书页对应），
+    单独保存到 draft_video_path，不改动正式视频、HLS、处理状态与书页附件；脚本与配音缓存与正式渲染共用。
+
+    :param progress: 进度回调 (百分比, 消息)，默认直接写入 task_id 对应的任务；整书批量生成时由调用方汇总
+    :param gates: 各阶段（LLM / TTS / 渲染）的并发闸门，整书批量生成时多个章节共享，使不同章节的阶段交错执行
+    :return: 是否生成成功（失败已写入视频记录与任务进度，不向外抛出）
     """
     from .video_script_helper import VideoScriptHelper
     from .tts_helper import TtsHelper
+    from .subtitle_helper import SubtitleHelper
     from .video_renderer import VideoRenderer
 
     chapter_service = TriHeartChapterService(self.db)
     page_service = TriHeartPageService(self.db)
+    report = progress or (lambda percent, msg: task_manager.update_progress(task_id, percent, msg))
+    gates = gates or VideoStageGates()
 
     # 1. 获取章节
     chapter = await chapter_service.get(user_id, chapter_id)
     if not chapter or not chapter.book_id:
       self.logger.error(f"章节 {chapter_id} 不存在")
-      await task_manager.update_progress(task_id, 100, "失败：章节不存在")
-      return
+      await report(100, "失败：章节不存在")
+      return False
 
     book_id = chapter.book_id
     book = await TriHeartBookService(self.db).get(user_id, book_id)
@@ -979,21 +1414,23 @@ class TriHeartChapterVideoService(StringPKeyWithDictionaryService[TriHeartChapte
     # 2. 检查是否已有视频记录（失败重试时保留已有 script_json 用于断点续跑）
     var_prefix = "var/"
     output_dir = f"{var_prefix}{user_id}/{book_id}/{chapter_id}"
-    output_path = f"{output_dir}/output.mp4"
+    output_path = f"{output_dir}/draft.mp4" if draft else f"{output_dir}/output.mp4"
 
     exist = await self.get_by_chapter_id(user_id, chapter_id)
     if exist:
       video_model = exist
-      video_model.process_status = "1"
-      video_model.video_path = ""
-      video_model.duration = 0
-      # 保留 script_json，后续根据其内容跳过 AI 步骤（断点续跑，省钱）
-      await self.update(user_id, video_model, commit=True)
+      if not draft:
+        video_model.process_status = "1"
+        video_model.video_path = ""
+        video_model.hls_path = ""
+        video_model.duration = 0
+        # 保留 script_json，后续根据其内容跳过 AI 步骤（断点续跑，省钱）
+        await self.update(user_id, video_model, commit=True)
     else:
       video_model = TriHeartChapterVideoModel(
           chapter_id=chapter_id,
           book_id=book_id,
-          process_status="1",
+          process_status="0" if draft else "1",
           voice_type=thba_app_settings.VIDEO_TTS_VOICE
       )
       await self.create(user_id, video_model, commit=True)
@@ -1010,98 +1447,34 @@ class TriHeartChapterVideoService(StringPKeyWithDictionaryService[TriHeartChapte
         raise ValueError("章节内无书页数据")
 
       self.logger.info(f"[视频生成] 章节 '{chapter.chapter_title}' 共 {len(pages)} 页")
-      await task_manager.update_progress(task_id, 5, f"已获取 {len(pages)} 张书页")
+      await report(5, f"已获取 {len(pages)} 张书页")
 
-      # 4a. 下载书页 WebP 图片（渲染视频用，断点续跑）
+      # 4a. 获取书页 WebP 图片（渲染视频用）：本节点解析产物 → 跨任务素材缓存 → OSS 并发流式下载
       # page_local_paths key 是连续序号（1, 2, 3...），与脚本中 img_index 严格对应
-      page_local_paths: dict[int, str] = {}
-
       local_dir = f"{var_prefix}{user_id}/{book_id}/{chapter_id}/webp"
-      os.makedirs(local_dir, exist_ok=True)
-
-      # 先把磁盘上已有的 webp 加载进来（跳过已下载的）
-      seq = 0
+      page_assets: dict[int, tuple[str, str]] = {}
       for page in pages:
-        if not page.page_image_crop_path and not page.page_image_path:
-          continue
-        seq += 1
-        local_path = f"{local_dir}/{seq}.webp"
-        if os.path.exists(local_path) and os.path.getsize(local_path) > 100:
-          page_local_paths[seq] = local_path
-          self.logger.info(f"书页序号 {seq}（第 {page.page_no} 页）: 使用本地缓存图片")
-
-      # 下载缺失的 webp
-      missing_pages = [(i + 1, page) for i, page in enumerate(
-          [p for p in pages if p.page_image_crop_path or p.page_image_path]
-      ) if (i + 1) not in page_local_paths]
-
-      if missing_pages:
-        async with httpx.AsyncClient(timeout=60) as client:
-          for idx, (seq_no, page) in enumerate(missing_pages):
-            img_path = page.page_image_crop_path or page.page_image_path
-            sign_url = await self.get_oss_download_sign_url(user_id or "", img_path)
-            try:
-              resp = await client.get(sign_url)
-              if resp.status_code == 200:
-                local_path = f"{local_dir}/{seq_no}.webp"
-                with open(local_path, "wb") as f:
-                  f.write(resp.content)
-                page_local_paths[seq_no] = local_path
-            except Exception as e:
-              self.logger.warning(f"下载书页序号 {seq_no}（第 {page.page_no} 页）失败: {e}")
-
-            if (idx + 1) % 5 == 0:
-              await task_manager.update_progress(task_id, 5 + int(idx / len(missing_pages) * 10), f"下载书页: {idx + 1}/{len(missing_pages)}")
+        img_path = page.page_image_crop_path or page.page_image_path
+        if img_path:
+          # 重新解析书籍会重建书页记录，以书页 ID 作为版本号，缓存不会取到旧图
+          page_assets[len(page_assets) + 1] = (img_path, page.model_id or "")
+
+      async def _fetch_progress(done: int, total: int):
+        if done % 5 == 0 or done == total:
+          await report(5 + int(done / total * 10), f"下载书页: {done}/{total}")
+
+      resolver = AssetResolver(
+          sign_url=lambda key: self.get_oss_download_sign_url(user_id or "", key),
+          local_root=var_prefix,
+          cache=ArtifactCache("assets", root=thba_app_settings.VIDEO_CACHE_DIR, max_bytes=thba_app_settings.VIDEO_ASSET_CACHE_MAX_MB * 1024 * 1024),
+          max_concurrency=thba_app_settings.VIDEO_ASSET_FETCH_CONCURRENCY
+      )
+      page_local_paths: dict[int, str] = await resolver.resolve_many(page_assets, local_dir, ".webp", _fetch_progress)
 
       if not page_local_paths:
         raise ValueError("无法获取任何书页图片")
 
-      # 4b. 生成章节 PDF 切片（送给 AI 用，比 webp 更忠实原文——矢量文字、无损）
-      # 优先从 OSS 下载原始 PDF，再在本地切片；若 PDF 已缓存则复用
-      pdf_slice_path = f"{var_prefix}{user_id}/{book_id}/{chapter_id}/chapter_slice.pdf"
-      pdf_bytes_for_ai: bytes | None = None
-
-      if os.path.exists(pdf_slice_path) and os.path.getsize(pdf_slice_path) > 100:
-        self.logger.info(f"[视频生成] 复用已有 PDF 切片: {pdf_slice_path}")
-        with open(pdf_slice_path, "rb") as f:
-          pdf_bytes_for_ai = f.read()
-      elif book and book.book_pdf_path:
-        # 下载原始 PDF（只下载一次，切片后缓存）
-        raw_pdf_local = f"{var_prefix}{book.book_pdf_path}"
-        if not (os.path.exists(raw_pdf_local) and os.path.getsize(raw_pdf_local) > 1024):
-          await task_manager.update_progress(task_id, 12, "下载原始 PDF...")
-          pdf_sign_url = await self.get_oss_download_sign_url(user_id, book.book_pdf_path)
-          async with httpx.AsyncClient(timeout=300) as client:
-            resp = await client.get(pdf_sign_url)
-            if resp.status_code == 200:
-              os.makedirs(os.path.dirname(raw_pdf_local), exist_ok=True)
-              with open(raw_pdf_local, "wb") as f:
-                f.write(resp.content)
-              self.logger.info(f"[视频生成] 原始 PDF 已下载至 {raw_pdf_local}")
-            else:
-              self.logger.warning(f"[视频生成] PDF 下载失败 HTTP {resp.status_code}，将降级使用 WebP")
-
-        if os.path.exists(raw_pdf_local):
-          try:
-            await task_manager.update_progress(task_id, 13, f"切片 PDF 第 {chapter.from_page_no}~{chapter.to_page_no} 页...")
-            await run_in_threadpool(
-                PdfHelper.slice_pdf,
-                raw_pdf_local, chapter.from_page_no, chapter.to_page_no, pdf_slice_path
-            )
-            with open(pdf_slice_path, "rb") as f:
-              pdf_bytes_for_ai = f.read()
-          except Exception as e:
-            self.logger.warning(f"[视频生成] PDF 切片失败: {e}，将降级使用 WebP")
-
-      # 4c. 降级策略：若 PDF 切片不可用，回退到 WebP 图片列表
-      ordered_webp_bytes: list[bytes] = []
-      if pdf_bytes_for_ai is None:
-        self.logger.info("[视频生成] PDF 切片不可用，降级使用 WebP 图片列表送 AI")
-        for k in sorted(page_local_paths.keys()):
-          with open(page_local_paths[k], "rb") as f:
-            ordered_webp_bytes.append(f.read())
-
-      await task_manager.update_progress(task_id, 14, "书页素材准备完毕，准备调用 AI...")
+      await report(14, "书页素材准备完毕")
 
       # 5. AI 生成脚本 — 如已有脚本则跳过（断点续跑，不重复花钱）
       script = None
@@ -1109,86 +1482,105 @@ class TriHeartChapterVideoService(StringPKeyWithDictionaryService[TriHeartChapte
         try:
           script = json.loads(video_model.script_json)
           self.logger.info(f"[视频生成] 使用已有脚本 ({len(script)}个场景)，跳过AI调用")
-          await task_manager.update_progress(task_id, 30, f"已有AI脚本 ({len(script)}个场景)")
+          await report(30, f"已有AI脚本 ({len(script)}个场景)")
         except (json.JSONDecodeError, TypeError):
           script = None
 
       if not script:
-        await task_manager.update_progress(task_id, 15, "AI 正在分析书页内容...")
+        # 4b. 按内容密度选择送 AI 的输入：纯文字章节只发文字，图文混排发 PDF 切片，扫描版发缩小后的书页图片
+        llm_input = await self._prepare_llm_input(user_id, book, chapter, pages, page_local_paths, gates, report)
+        await report(15, f"AI 正在分析书页内容（{llm_input['mode']} 模式）...")
         video_ai = VideoScriptHelper(
             api_key=thba_app_settings.VIDEO_AI_API_KEY,
             base_url=thba_app_settings.VIDEO_AI_BASE_URL,
             model=thba_app_settings.VIDEO_AI_MODEL_NAME,
             temperature=thba_app_settings.VIDEO_AI_TEMPERATURE,
+            fallback_model=thba_app_settings.VIDEO_AI_FALLBACK_MODEL_NAME,
+            fallback_api_key=thba_app_settings.VIDEO_AI_FALLBACK_API_KEY,
+            fallback_base_url=thba_app_settings.VIDEO_AI_FALLBACK_BASE_URL,
+            deadline=thba_app_settings.VIDEO_AI_DEADLINE_SECONDS,
+            hedge_percentile=thba_app_settings.LLM_HEDGE_PERCENTILE,
+            hedge_default_delay=thba_app_settings.LLM_HEDGE_DEFAULT_DELAY
         )
 
-        for attempt in range(3):
-          if pdf_bytes_for_ai is not None:
-            # 优先路径：PDF 切片送 AI（矢量原文，理解更准确）
-            script = await video_ai.generate_script_from_pdf(
-                pdf_bytes=pdf_bytes_for_ai,
-                book_title=book_title,
-                chapter_title=chapter.chapter_title or ""
-            )
-          else:
-            # 降级路径：WebP 图片列表送 AI
-            script = await video_ai.generate_script(
-                page_images=ordered_webp_bytes,
-                book_title=book_title,
-                chapter_title=chapter.chapter_title or ""
-            )
-          if script:
-            break
-          self.logger.warning(f"LLM 脚本生成第 {attempt + 1} 次失败，重试...")
-          await asyncio.sleep(2)
+        async with gates.stage("llm"):
+          for attempt in range(3):
+            if llm_input["mode"] == MODE_TEXT:
+              script = await video_ai.generate_script_from_text(
+                  page_texts=llm_input["page_texts"],
+                  book_title=book_title,
+                  chapter_title=chapter.chapter_title or ""
+              )
+            elif llm_input["mode"] == MODE_PDF:
+              # PDF 切片送 AI（矢量原文，理解更准确）
+              script = await video_ai.generate_script_from_pdf(
+                  pdf_bytes=llm_input["pdf_bytes"],
+                  book_title=book_title,
+                  chapter_title=chapter.chapter_title or ""
+              )
+            else:
+              script = await video_ai.generate_script(
+                  page_images=llm_input["images"],
+                  book_title=book_title,
+                  chapter_title=chapter.chapter_title or ""
+              )
+            LlmInputHelper.record_metrics(thba_app_settings.VIDEO_AI_METRICS_PATH, {
+              "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "book_id": book_id,
+              "chapter_id": chapter_id,
+              "attempt": attempt + 1,
+              "pages": len(pages),
+              "avg_chars": llm_input["avg_chars"],
+              "avg_image_ratio": llm_input["avg_image_ratio"],
+              **video_ai.last_call,
+            })
+            if script:
+              break
+            # 限流与网络错误已由 llm_rate_limiter 退避重试，到这里是内容无效（空结果 / 非 JSON），直接重新生成
+            self.logger.warning(f"LLM 脚本生成第 {attempt + 1} 次失败，重试...")
 
         if not script:
           raise ValueError("AI 脚本生成失败（已重试 3 次）")
 
         self.logger.info(f"[视频生成] AI 生成了 {len(script)} 个场景")
-        await task_manager.update_progress(task_id, 30, f"AI 脚本生成完成 ({len(script)} 个场景)")
+        await report(30, f"AI 脚本生成完成 ({len(script)} 个场景)")
 
         # 立即持久化脚本，防止后续步骤失败后丢失（这是最贵的一步，一定要存）
         video_model.script_json = json.dumps(script, ensure_ascii=False)
         await self.update(user_id, video_model, commit=True)
 
-      # 6. TTS 配音（本地已有音频文件则跳过，断点续跑）
-      await task_manager.update_progress(task_id, 32, "正在生成配音...")
-      tts = TtsHelper(voice=thba_app_settings.VIDEO_TTS_VOICE)
+      # 6. TTS 配音（按旁白内容命中跨任务音频缓存，改稿后只有变动的场景需要重新合成）
+      await report(32, "正在生成配音...")
+      tts_cache = ArtifactCache("tts", root=thba_app_settings.VIDEO_CACHE_DIR, max_bytes=thba_app_settings.VIDEO_TTS_CACHE_MAX_MB * 1024 * 1024)
+      tts = TtsHelper(voice=thba_app_settings.VIDEO_TTS_VOICE, cache=tts_cache)
       audio_dir = f"{var_prefix}{user_id}/{book_id}/{chapter_id}/audio"
       os.makedirs(audio_dir, exist_ok=True)
 
       scene_audio_paths: dict[int, str] = {}
+      scene_boundaries: dict[int, list] = {}  # TTS 边界事件，用于生成字幕
       total_duration = 0.0
-      tts_newly_generated = False  # 标记本轮是否有新生成的音频，用于决定是否持久化 script
-
-      for scene in script:
-        scene_id = scene.get("scene_id", 0)
-        narration = scene.get("narration", "")
-        # target_dur = scene.get("duration", 5.0)
-
-        audio_path = f"{audio_dir}/scene_{scene_id}.mp3"
-
-        if os.path.exists(audio_path) and os.path.getsize(audio_path) > 100:
-          # 音频已存在，直接复用。audio_duration 是上轮 TTS 实测时长，比 AI 估算的更准确
-          # existing_dur = scene.get("audio_duration", target_dur)
-          existing_dur = scene.get("audio_duration", scene.get("duration", 5.0))
-          scene_audio_paths[scene_id] = audio_path
-          total_duration += existing_dur
-          scene["duration"] = existing_dur
-          self.logger.info(f"场景 {scene_id}: 跳过已存在的音频，时长 {existing_dur:.1f}s")
-        else:
-          # dur = await tts.synthesize(narration, audio_path, target_dur)
-          dur = await tts.synthesize(narration, audio_path)
+      tts_newly_generated = False  # 标记本轮是否有时长变化的音频，用于决定是否持久化 script
+
+      async with gates.stage("tts"):
+        for scene in script:
+          scene_id = scene.get("scene_id", 0)
+          narration = scene.get("narration", "")
+
+          audio_path = f"{audio_dir}/scene_{scene_id}.mp3"
+
+          # 缓存命中时立即返回缓存音频及其实测时长，未命中才真正调用 TTS
+          dur, boundaries = await tts.synthesize_with_boundaries(narration, audio_path)
           if dur > 0:
             scene_audio_paths[scene_id] = audio_path
+            scene_boundaries[scene_id] = boundaries
             total_duration += dur
+            if scene.get("audio_duration") != dur:
+              tts_newly_generated = True
             scene["duration"] = dur  # 以实际音频长度更新场景长度
             scene["audio_duration"] = dur
-            tts_newly_generated = True
 
-        progress = 32 + int(len(scene_audio_paths) / len(script) * 18)
-        await task_manager.update_progress(task_id, progress, f"配音中: {len(scene_audio_paths)}/{len(script)}")
+          percent = 32 + int(len(scene_audio_paths) / len(script) * 18)
+          await report(percent, f"配音中: {len(scene_audio_paths)}/{len(script)}")
 
       if not scene_audio_paths:
         raise ValueError("TTS 配音全部失败")
@@ -1200,43 +1592,95 @@ class TriHeartChapterVideoService(StringPKeyWithDictionaryService[TriHeartChapte
         await self.update(user_id, video_model, commit=True)
         self.logger.info("[视频生成] TTS 完成，已持久化含实测时长的脚本")
 
+      # 6b. 预混整章旁白音轨，并把场景边界时间戳写回脚本（供字幕、章节标记使用）
+      # 草稿帧率、分辨率与正式渲染不同，片段不写入片段缓存
+      renderer = VideoRenderer(
+          engine=thba_app_settings.VIDEO_RENDER_ENGINE,
+          workers=thba_app_settings.VIDEO_RENDER_WORKERS,
+          segment_cache=None if draft else ArtifactCache("segments", root=thba_app_settings.VIDEO_CACHE_DIR, max_bytes=thba_app_settings.VIDEO_SEGMENT_CACHE_MAX_MB * 1024 * 1024),
+          draft=draft
+      )
+      timeline = renderer.plan_timeline(script, scene_audio_paths)
+      for scene, item in zip(script, timeline):
+        scene["start"] = item["start"]
+        scene["end"] = item["end"]
+      narration_path = f"{var_prefix}{user_id}/{book_id}/{chapter_id}/{'draft_' if draft else ''}narration.m4a"
+      await run_in_threadpool(renderer.build_narration, timeline, narration_path)
+
+      # 6c. 由 TTS 边界事件生成整章字幕：sidecar 外挂 WebVTT，burn 由 ffmpeg 烧录进画面（草稿不带字幕）
+      subtitle_mode = "off" if draft else thba_app_settings.VIDEO_SUBTITLE_MODE
+      subtitle_cues = SubtitleHelper().build_cues(script, timeline, scene_boundaries) if subtitle_mode in ("sidecar", "burn") else []
+
       # 7. 渲染视频（检查是否已有渲染结果）
-      await task_manager.update_progress(task_id, 50, "正在渲染视频...")
+      await report(50, "正在渲染视频...")
 
       if os.path.exists(output_path) and os.path.getsize(output_path) > 1024:
         self.logger.info(f"跳过渲染，使用已有视频文件 {output_path}")
-        await task_manager.update_progress(task_id, 80, "已有渲染结果，跳过渲染")
+        await report(80, "已有渲染结果，跳过渲染")
       else:
         # renderer = VideoRenderer(
         #     output_width=thba_app_settings.VIDEO_OUTPUT_WIDTH,
         #     output_height=thba_app_settings.VIDEO_OUTPUT_HEIGHT
         # )
-        renderer = VideoRenderer()
-        await run_in_threadpool(
-            renderer.render,
-            scenes=script,
-            page_image_paths=page_local_paths,
-            scene_audio_paths=scene_audio_paths,
-            output_path=output_path
-        )
-        await task_manager.update_progress(task_id, 80, "视频渲染完成，正在上传...")
+        async with gates.stage("render"):
+          await run_in_threadpool(
+              renderer.render,
+              scenes=script,
+              page_image_paths=page_local_paths,
+              scene_audio_paths=scene_audio_paths,
+              output_path=output_path,
+              narration_path=narration_path,
+              subtitles=subtitle_cues if subtitle_mode == "burn" else None
+          )
+        await report(80, "视频渲染完成，正在上传...")
 
-      # 8. 上传视频至 OSS
-      object_key = f"{user_id}/{book_id}/{chapter_id}/chapter_video_{chapter_id}.mp4"
-      content_type = "video/mp4"
+      object_prefix = f"{user_id}/{book_id}/{chapter_id}"
+      if draft:
+        await self._upload_draft(user_id, video_model, script, output_path, f"{object_prefix}/chapter_video_{chapter_id}_draft.mp4")
+        await report(100, "草稿预览生成完成！")
+        self.logger.info(f"[视频生成] 草稿预览完成! 时长 {total_duration:.1f}s, 路径 {video_model.draft_video_path}")
+        shutil.rmtree(f"{var_prefix}{user_id}/{book_id}/{chapter_id}", ignore_errors=True)
+        return True
+
+      # 8. 上传视频至 OSS（faststart MP4 + 可选 HLS 多码率切片，均位于章节前缀下）
+      object_key = f"{object_prefix}/chapter_video_{chapter_id}.mp4"
+      hls_key = ""
 
-      upload_sign_url = await self.get_oss_upload_sign_url(user_id, object_key, content_type=content_type)
       async with httpx.AsyncClient(timeout=120) as client:
-        with open(output_path, "rb") as f:
-          resp = await client.put(
-              url=upload_sign_url["uploadUrl"],
-              content=f.read(),
-              headers=upload_sign_url["headers"]
-          )
-          resp.raise_for_status()
+        await self._upload_file(user_id, client, output_path, object_key, "video/mp4")
+
+        # 封面与拖动预览雪碧图直接由书页生成，不解码视频；失败不影响视频交付
+        preview_keys: dict[str, str] = {}
+        try:
+          preview_paths = await run_in_threadpool(renderer.build_previews, timeline, page_local_paths, f"{output_dir}/preview")
+          for name, local_path in preview_paths.items():
+            preview_key = f"{object_prefix}/{os.path.basename(local_path)}"
+            await self._upload_file(user_id, client, local_path, preview_key, PREVIEW_CONTENT_TYPES[os.path.splitext(local_path)[1]])
+            preview_keys[name] = preview_key
+        except Exception as preview_e:
+          self.logger.warning(f"[视频生成] 封面/预览图生成失败: {preview_e}")
+
+        # 外挂字幕始终上传（烧录模式下也保留，便于检索与无障碍阅读）
+        if subtitle_cues:
+          try:
+            subtitle_path = SubtitleHelper.write_vtt(subtitle_cues, f"{output_dir}/subtitles.vtt")
+            subtitle_key = f"{object_prefix}/subtitles.vtt"
+            await self._upload_file(user_id, client, subtitle_path, subtitle_key, PREVIEW_CONTENT_TYPES[".vtt"])
+            preview_keys["subtitles"] = subtitle_key
+          except Exception as subtitle_e:
+            self.logger.warning(f"[视频生成] 外挂字幕生成/上传失败: {subtitle_e}")
+
+        if thba_app_settings.VIDEO_HLS_ENABLE:
+          await report(85, "正在打包 HLS 流...")
+          try:
+            hls_key = await self._package_and_upload_hls(user_id, client, renderer, output_path, f"{output_dir}/hls", f"{object_prefix}/hls")
+          except Exception as hls_e:
+            # HLS 只是播放体验优化，失败时仍以 MP4 交付
+            self.logger.warning(f"[视频生成] HLS 打包/上传失败，仅提供 MP4: {hls_e}")
 
       # 9. 更新数据库记录
       video_model.video_path = object_key
+      video_model.hls_path = hls_key
       video_model.script_json = json.dumps(script, ensure_ascii=False)
       video_model.duration = round(total_duration, 1)
       video_model.process_status = "2"
@@ -1255,9 +1699,10 @@ class TriHeartChapterVideoService(StringPKeyWithDictionaryService[TriHeartChapte
           (a for a in existing_attachments if a.display_name == attach_display_name),
           None
       )
+      attach_extra_data = {"duration": round(total_duration, 1), "chapter_id": chapter_id, **preview_keys}
       if existing_attach:
         existing_attach.file_path = object_key
-        existing_attach.extra_data = {"duration": round(total_duration, 1), "chapter_id": chapter_id}
+        existing_attach.extra_data = attach_extra_data
         await attachment_service.update(user_id, existing_attach, commit=True)
       else:
         new_attach = TriHeartPageAttachmentModel(
@@ -1266,29 +1711,111 @@ class TriHeartChapterVideoService(StringPKeyWithDictionaryService[TriHeartChapte
             display_name=attach_display_name,
             attachment_type="video",
             file_path=object_key,
-            extra_data={"duration": round(total_duration, 1), "chapter_id": chapter_id}
+            extra_data=attach_extra_data
         )
         await attachment_service.create(user_id, new_attach, commit=True)
 
-      await task_manager.update_progress(task_id, 100, "视频导读生成完成！")
+      await report(100, "视频导读生成完成！")
       self.logger.info(f"[视频生成] 完成! 时长 {total_duration:.1f}s, 路径 {object_key}")
 
       # 清理本地临时文件
       try:
-        import shutil
         shutil.rmtree(f"{var_prefix}{user_id}/{book_id}/{chapter_id}", ignore_errors=True)
       except Exception:
         pass
+      return True
 
     except Exception as e:
       self.logger.error(f"[视频生成] 失败: {e}", exc_info=True)
       try:
-        video_model.process_status = "9"
+        # 草稿失败不影响已有的正式视频状态
+        if not draft:
+          video_model.process_status = "9"
         video_model.remark = str(e)[:500]
         await self.update(user_id, video_model, commit=True)
       except Exception:
         pass
-      await task_manager.update_progress(task_id, 100, f"失败: {str(e)[:100]}")
+      await report(100, f"失败: {str(e)[:100]}")
+      return False
+
+  async def generate_book_videos(self, user_id: str | None, book_id: str, task_id: str, force: bool = False):
+    """
+    整书批量生成视频导读：只处理叶子章节（父章节的页码范围与子章节重叠），
+    所有章节共享一组阶段闸门交错执行，每个章节使用独立的 DB Session，单章失败不影响其他章节。
+    进度为各章节进度的平均值，消息带上最近一次更新的章节名。
+
+    :param force: 为 True 时已生成成功的章节也重新生成（已有脚本仍会复用）
+    """
+    leaves = await TriHeartChapterService(self.db).query_leaf_chapters(user_id, book_id)
+    if not leaves:
+      await task_manager.update_progress(task_id, 100, "失败：书籍没有章节")
+      return
+
+    # 打开一次原始 PDF 切出所有章节，后续各章节直接命中切片缓存；失败时各章节仍会单独尝试
+    book = await TriHeartBookService(self.db).get(user_id, book_id)
+    if book and book.book_pdf_path:
+      try:
+        await task_manager.update_progress(task_id, 1, f"正在切分 {len(leaves)} 个章节的 PDF...")
+        await self.prepare_chapter_slices(user_id, book, leaves)
+      except Exception as e:
+        self.logger.warning(f"[整书视频] 批量切分 PDF 失败: {e}")
+
+    settings = thba_app_settings
+    gates = VideoStageGates({
+      "llm": settings.VIDEO_BATCH_LLM_CONCURRENCY,
+      "tts": settings.VIDEO_BATCH_TTS_CONCURRENCY,
+      "render": settings.VIDEO_BATCH_RENDER_CONCURRENCY,
+    })
+    # 限制同时在流水线中的章节数，避免一次占用过多 DB 连接与磁盘空间
+    in_flight = asyncio.Semaphore(max(1, settings.VIDEO_BATCH_CHAPTER_CONCURRENCY))
+    session_maker = database.get_session_maker()
+    percents: dict[str, int] = {c.model_id: 0 for c in leaves}
+    results: dict[str, str] = {}
+    last_reported = -1
+
+    self.logger.info(f"[整书视频] 书籍 {book_id} 共 {len(leaves)} 个叶子章节")
+
+    async def _report(chapter: TriHeartChapterModel, percent: int, msg: str):
+      nonlocal last_reported
+      percents[chapter.model_id] = percent
+      overall = min(99, sum(percents.values()) // len(percents))
+      # 章节级进度很密，只有总进度变化或章节结束时才写任务记录
+      if overall != last_reported or percent >= 100:
+        last_reported = overall
+        finished = sum(1 for p in percents.values() if p >= 100)
+        await task_manager.update_progress(task_id, overall, f"[{finished}/{len(leaves)}] 《{chapter.chapter_title}》{msg}")
+
+    async def _run(chapter: TriHeartChapterModel):
+      async with in_flight:
+        try:
+          async with session_maker() as chapter_db:
+            service = TriHeartChapterVideoService(chapter_db)
+            exist = await service.get_by_chapter_id(user_id, chapter.model_id)
+            if exist and exist.process_status == "2" and not force:
+              results[chapter.model_id] = "skipped"
+              await _report(chapter, 100, "已有视频，跳过")
+              return
+            ok = await service.generate_chapter_video(
+                user_id, chapter.model_id, task_id,
+                progress=lambda percent, msg: _report(chapter, percent, msg),
+                gates=gates
+            )
+            results[chapter.model_id] = "success" if ok else "failed"
+        except Exception as e:
+          # generate_chapter_video 自身不抛异常，这里兜底 Session / 查询层面的错误
+          self.logger.error(f"[整书视频] 章节 {chapter.chapter_title} 失败: {e}", exc_info=True)
+          results[chapter.model_id] = "failed"
+          await _report(chapter, 100, f"失败: {str(e)[:100]}")
+
+    await asyncio.gather(*[_run(c) for c in leaves])
+
+    failed = [c.chapter_title for c in leaves if results.get(c.model_id) == "failed"]
+    skipped = sum(1 for r in results.values() if r == "skipped")
+    summary = f"整书视频导读生成完成：成功 {len(leaves) - len(failed) - skipped} 章，跳过 {skipped} 章，失败 {len(failed)} 章"
+    if failed:
+      summary += f"（{'、'.join(t or '' for t in failed[:10])}{' 等' if len(failed) > 10 else ''}）"
+    self.logger.info(f"[整书视频] {summary}")
+    await task_manager.update_progress(task_id, 100, summary)
 
 
 PaymentDispatcher.register_service("book_purchase", TriHeartBookUserService)
@@ -0,0 +1,142 @@
+# app/subtitle_helper.py
+import logging
+import re
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+# 句末标点：字幕行遇到这些字符强制换行
+SENTENCE_END = "。！？!?…"
+# 超长句在标点处切开（标点保留在前一段末尾）
+CLAUSE_PATTERN = re.compile(r"[^，。！？；：、,.!?;:…]+[，。！？；：、,.!?;:…]*")
+
+
+class SubtitleHelper:
+  """旁白字幕：由 TTS 边界事件 + 场景时间线生成按时间轴对齐的 WebVTT / ASS 字幕"""
+
+  def __init__(self, max_chars: int = 18, font_name: str = "Noto Sans CJK SC"):
+    """
+    :param max_chars: 每行最多字数，超出按标点（或硬切）拆为多条字幕
+    :param font_name: ASS 样式字体，找不到时由 libass 通过 fontconfig 回退到可显示中文的字体
+    """
+    self.max_chars = max_chars
+    self.font_name = font_name
+
+  def build_cues(self, scenes: List[Dict], timeline: List[Dict], boundaries: Dict[int, List[Dict]]) -> List[Dict]:
+    """
+    生成整章字幕 [{"start": 秒, "end": 秒, "text": str}]。
+    boundaries 为 {scene_id: TTS 边界事件}，时间相对场景音频起点；
+    缺少边界事件的场景（如旧缓存）按字数比例把旁白分摊到整段配音时长上。
+    """
+    cues: List[Dict] = []
+    for scene, item in zip(scenes, timeline):
+      narration = (scene.get("narration") or "").strip()
+      if not narration:
+        continue
+      events = boundaries.get(item["scene_id"]) or [{"offset": 0.0, "duration": item["duration"], "text": narration}]
+      for line in self._group_lines(self._split_long(events)):
+        start = item["start"] + line["offset"]
+        end = min(start + line["duration"], item["end"])
+        if end - start > 0.05:
+          cues.append({"start": round(start, 3), "end": round(end, 3), "text": line["text"]})
+
+    # 相邻字幕不重叠
+    for prev, cur in zip(cues, cues[1:]):
+      prev["end"] = min(prev["end"], cur["start"])
+    return cues
+
+  def _split_long(self, events: List[Dict]) -> List[Dict]:
+    """超过 max_chars 的事件（通常是整句）在标点处切开，时间按字数比例分配"""
+    result: List[Dict] = []
+    for event in events:
+      text = event["text"].strip()
+      if len(text) <= self.max_chars:
+        if text:
+          result.append({**event, "text": text})
+        continue
+
+      parts: List[str] = []
+      for clause in (m.group() for m in CLAUSE_PATTERN.finditer(text)):
+        # 无标点的超长分句均分为若干行，避免末行只剩一两个字
+        count = -(-len(clause) // self.max_chars)
+        size = -(-len(clause) // count)
+        parts += [clause[i:i + size] for i in range(0, len(clause), size)]
+
+      offset = event["offset"]
+      total = sum(len(p) for p in parts) or 1
+      for part in parts:
+        duration = event["duration"] * len(part) / total
+        result.append({"offset": offset, "duration": duration, "text": part})
+        offset += duration
+    return result
+
+  def _group_lines(self, events: List[Dict]) -> List[Dict]:
+    """把相邻的短事件（逐词边界或短分句）合并成不超过 max_chars 的字幕行，遇到句末标点强制换行"""
+    lines: List[Dict] = []
+    current: Dict | None = None
+    for event in events:
+      if current and len(current["text"]) + len(event["text"]) <= self.max_chars and current["text"][-1] not in SENTENCE_END:
+        current["text"] = self._join(current["text"], event["text"])
+        current["duration"] = event["offset"] + event["duration"] - current["offset"]
+      else:
+        current = dict(event)
+        lines.append(current)
+    return lines
+
+  @staticmethod
+  def _join(left: str, right: str) -> str:
+    """中文直接相连，西文单词之间补空格"""
+    if left[-1].isascii() and left[-1].isalnum() and right[0].isascii() and right[0].isalnum():
+      return f"{left} {right}"
+    return left + right
+
+  @staticmethod
+  def write_vtt(cues: List[Dict], path: str) -> str:
+    lines = ["WEBVTT", ""]
+    for cue in cues:
+      # & 与 < 会被解析为实体与标签，> 转义后文本中不会出现 "-->"
+      text = cue["text"].replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+      lines += [f"{_timestamp(cue['start'])} --> {_timestamp(cue['end'])}", text, ""]
+    with open(path, "w", encoding="utf-8") as f:
+      f.write("\n".join(lines))
+    return path
+
+  def write_ass(self, cues: List[Dict], path: str, width: int, height: int) -> str:
+    """ASS 字幕：底部居中白字 + 半透明黑底（与旧 moviepy 字幕样式一致），供 ffmpeg subtitles 滤镜烧录"""
+    font_size = max(16, int(height * 0.045))
+    margin_v = int(height * 0.06)
+    margin_h = int(width * 0.05)
+    lines = [
+      "[Script Info]",
+      "ScriptType: v4.00+",
+      f"PlayResX: {width}",
+      f"PlayResY: {height}",
+      "WrapStyle: 0",
+      "ScaledBorderAndShadow: yes",
+      "",
+      "[V4+ Styles]",
+      "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding",
+      # BorderStyle=3 为不透明底框，底框颜色取 OutlineColour（alpha 0x4D ≈ 70% 不透明）
+      f"Style: Default,{self.font_name},{font_size},&H00FFFFFF,&H000000FF,&H4D000000,&H4D000000,0,0,0,0,100,100,0,0,3,{max(2, font_size // 6)},0,2,{margin_h},{margin_h},{margin_v},1",
+      "",
+      "[Events]",
+      "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text",
+    ]
+    for cue in cues:
+      text = cue["text"].replace("\\", "＼").replace("{", "｛").replace("}", "｝").replace("\n", "\\N")
+      lines.append(f"Dialogue: 0,{_timestamp(cue['start'], ass=True)},{_timestamp(cue['end'], ass=True)},Default,,0,0,0,,{text}")
+    with open(path, "w", encoding="utf-8") as f:
+      f.write("\n".join(lines) + "\n")
+    return path
+
+
+def _timestamp(seconds: float, ass: bool = False) -> str:
+  """秒 -> 时间戳；WebVTT 为 HH:MM:SS.mmm，ASS 为 H:MM:SS.cc"""
+  digits = 2 if ass else 3
+  unit = 10 ** digits
+  total = int(round(max(seconds, 0.0) * unit))
+  hours, total = divmod(total, 3600 * unit)
+  minutes, total = divmod(total, 60 * unit)
+  secs, frac = divmod(total, unit)
+  hour_str = f"{hours:d}" if ass else f"{hours:02d}"
+  return f"{hour_str}:{minutes:02d}:{secs:02d}.{frac:0{digits}d}"
@@ -0,0 +1,410 @@
+# app/term_matcher.py
+import asyncio
+import contextlib
+import functools
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+import types
+import unicodedata
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import AsyncIterator, Dict, Iterable, List, Sequence, Set, Tuple
+
+import pymupdf
+
+logger = logging.getLogger(__name__)
+
+# 逐字提取文字层：保留空白（用于切分单词），不输出图片块，未知字形用 CID 占位，连字（ﬁ 等）拆成单字
+TEXT_FLAGS = pymupdf.TEXT_PRESERVE_WHITESPACE | pymupdf.TEXT_MEDIABOX_CLIP | pymupdf.TEXT_CID_FOR_UNKNOWN_UNICODE
+
+Box = Tuple[float, float, float, float]
+
+
+@functools.lru_cache(maxsize=65536)
+def fold_char(c: str) -> str:
+  """匹配前的单字归一化：全角转半角（NFKC）、大小写不敏感；只接受一对一映射，保证下标与字框一一对应"""
+  normalized = unicodedata.normalize("NFKC", c)
+  c = normalized if len(normalized) == 1 else c
+  lower = c.lower()
+  return lower if len(lower) == 1 else c
+
+
+def _is_cjk(c: str) -> bool:
+  return "⺀" <= c <= "鿿" or "豈" <= c <= "﫿" or "＀" <= c <= "￯"
+
+
+class TermMatcher:
+  """
+  多术语单遍匹配（Aho-Corasick）：所有 term_key 建成一个自动机，每页文字层只扫描一遍，
+  耗时与页数、字数成正比，基本不随术语数量增长。命中的字符映射回各自的字框，按行合并为矩形。
+
+  匹配规则：大小写与全半角不敏感，连续空白视为一个空格；同一文字块内，中文在行尾折行处直接相连
+  （"区块" + 换行 + "链" 可命中 "区块链"），其余折行视为空格。重叠的术语（如 "区块链" 与 "区块链技术"）都会命中。
+  """
+
+  def __init__(self, terms: Iterable[str]):
+    # 字典树：_goto[节点] = {字符: 子节点}；_fail 为失配指针；_out 为在该节点结束的模式号；
+    # _dict_link 指向失配链上最近的一个有输出的节点，收集输出时沿它跳转，不必遍历整条失配链
+    self._goto: List[Dict[str, int]] = [{}]
+    self._fail: List[int] = [0]
+    self._out: List[List[int]] = [[]]
+    self._dict_link: List[int] = [0]
+    self._patterns: List[Tuple[int, List[str]]] = []  # 模式号 → (模式长度, 归一化后相同的原始术语)
+    pattern_ids: Dict[str, int] = {}
+
+    for term in terms:
+      needle = "".join(fold_char(c) for c in " ".join((term or "").split()))
+      if not needle:
+        continue
+      if needle in pattern_ids:
+        self._patterns[pattern_ids[needle]][1].append(term)
+        continue
+      node = 0
+      for c in needle:
+        nxt = self._goto[node].get(c)
+        if nxt is None:
+          nxt = len(self._goto)
+          self._goto[node][c] = nxt
+          self._goto.append({})
+          self._fail.append(0)
+          self._out.append([])
+          self._dict_link.append(0)
+        node = nxt
+      pattern_ids[needle] = len(self._patterns)
+      self._out[node].append(len(self._patterns))
+      self._patterns.append((len(needle), [term]))
+
+    # BFS 计算失配指针
+    queue = deque(self._goto[0].values())
+    while queue:
+      node = queue.popleft()
+      for c, child in self._goto[node].items():
+        queue.append(child)
+        fail = self._fail[node]
+        while fail and c not in self._goto[fail]:
+          fail = self._fail[fail]
+        target = self._goto[fail].get(c, 0)
+        self._fail[child] = target if target != child else 0
+        self._dict_link[child] = self._fail[child] if self._out[self._fail[child]] else self._dict_link[self._fail[child]]
+
+  @property
+  def pattern_count(self) -> int:
+    return len(self._patterns)
+
+  def find_all(self, text: str) -> List[Tuple[int, int, int]]:
+    """返回 [(起始下标, 结束下标(不含), 模式号)]，text 需已按 fold_char 归一化"""
+    goto, fail, out, dict_link = self._goto, self._fail, self._out, self._dict_link
+    matches: List[Tuple[int, int, int]] = []
+    node = 0
+    for index, c in enumerate(text):
+      while node and c not in goto[node]:
+        node = fail[node]
+      node = goto[node].get(c, 0)
+      hit = node if out[node] else dict_link[node]
+      while hit:
+        for pattern in out[hit]:
+          matches.append((index + 1 - self._patterns[pattern][0], index + 1, pattern))
+        hit = dict_link[hit]
+    return matches
+
+  @staticmethod
+  def page_stream(page: pymupdf.Page) -> Tuple[str, List[Box | None], List[int]]:
+    """
+    把一页文字层展开为归一化字符流，返回 (文本, 每个字符的字框, 每个字符所在的行号)。
+    插入的分隔空格没有字框（None），不会出现在结果矩形里。
+    """
+    chars: List[str] = []
+    boxes: List[Box | None] = []
+    lines: List[int] = []
+    line_no = 0
+
+    def _space(sep: str = " "):
+      if chars and chars[-1] not in (" ", "\n"):
+        chars.append(sep)
+        boxes.append(None)
+        lines.append(-1)
+      elif chars:
+        chars[-1] = "\n" if "\n" in (sep, chars[-1]) else " "
+
+    for block in page.get_text("rawdict", flags=TEXT_FLAGS)["blocks"]:
+      _space("\n")  # 文字块之间用换行分隔，术语中的空白都已归一为空格，因此不会跨块（如分栏）命中
+      for line in block.get("lines", []):
+        first = True
+        for span in line["spans"]:
+          for ch in span["chars"]:
+            c = ch["c"]
+            if c.isspace():
+              _space()
+              continue
+            if first and chars and chars[-1] not in (" ", "\n") and not (_is_cjk(chars[-1]) and _is_cjk(c)):
+              _space()  # 非中文折行视为空格
+            first = False
+            chars.append(fold_char(c))
+            boxes.append(tuple(ch["bbox"]))
+            lines.append(line_no)
+        line_no += 1
+    return "".join(chars), boxes, lines
+
+  def match_page(self, page: pymupdf.Page) -> Dict[str, List[List[float]]]:
+    """返回本页 {术语: 合并后的相对坐标 [[x, y, w, h], ...]}，同一术语的多处命中合在一起"""
+    text, boxes, lines = self.page_stream(page)
+    if not text.strip():
+      return {}
+    width, height = page.rect.width or 1.0, page.rect.height or 1.0
+    x0_page, y0_page = page.rect.x0, page.rect.y0
+    result: Dict[str, List[List[float]]] = {}
+    for start, end, pattern in self.find_all(text):
+      # 命中的字符按行合并：每行一个矩形
+      merged: Dict[int, List[float]] = {}
+      for i in range(start, end):
+        box = boxes[i]
+        if box is None:
+          continue
+        rect = merged.get(lines[i])
+        if rect is None:
+          merged[lines[i]] = list(box)
+        else:
+          rect[0], rect[1] = min(rect[0], box[0]), min(rect[1], box[1])
+          rect[2], rect[3] = max(rect[2], box[2]), max(rect[3], box[3])
+      rects = []
+      for x0, y0, x1, y1 in merged.values():
+        x0, y0 = max(0.0, (x0 - x0_page) / width), max(0.0, (y0 - y0_page) / height)
+        x1, y1 = min(1.0, (x1 - x0_page) / width), min(1.0, (y1 - y0_page) / height)
+        if x1 > x0 and y1 > y0:
+          rects.append([round(x0, 4), round(y0, 4), round(x1 - x0, 4), round(y1 - y0, 4)])
+      for term in self._patterns[pattern][1]:
+        result.setdefault(term, []).extend(rects)
+    return result
+
+  def scan_pages(self, pdf_path: str, page_numbers: Iterable[int]) -> Dict[int, List[Dict]]:
+    """扫描指定页码（从 1 开始，超出文档的页码被忽略），返回 {页码: [{"term": 术语, "rects": [[x, y, w, h], ...]}]}"""
+    result: Dict[int, List[Dict]] = {}
+    if not self._patterns:
+      return result
+    with pymupdf.open(pdf_path) as doc:
+      for page_no in page_numbers:
+        if not 1 <= page_no <= doc.page_count:
+          continue
+        matches = self.match_page(doc[page_no - 1])
+        if matches:
+          result[page_no] = [{"term": term, "rects": rects} for term, rects in matches.items() if rects]
+    return result
+
+  def scan_range(self, pdf_path: str, from_page: int, to_page: int) -> Dict[int, List[Dict]]:
+    """
+    扫描页码范围（从 1 开始、含两端，超出文档的部分被截断）。
+    返回格式与 PdfHelper.scan_terms_in_range 一致: {页码: [{"term": 术语, "rects": [[x, y, w, h], ...]}]}
+    """
+    started = time.perf_counter()
+    with pymupdf.open(pdf_path) as doc:
+      page_count = doc.page_count
+    result = self.scan_pages(pdf_path, range(max(1, from_page), min(page_count, to_page) + 1))
+    logger.info(
+        f"[术语扫描] {len(self._patterns)} 个术语 × 第 {from_page}~{to_page} 页: "
+        f"{len(result)} 页有命中, {sum(len(v) for v in result.values())} 条关联, 耗时 {time.perf_counter() - started:.2f}s"
+    )
+    return result
+
+  @staticmethod
+  def scan_terms_in_range(pdf_path: str, from_page: int, to_page: int, keywords: Sequence[str]) -> Dict[int, List[Dict]]:
+    """PdfHelper.scan_terms_in_range 的单遍替代（参数相同），便于放入线程池调用"""
+    return TermMatcher(keywords).scan_range(pdf_path, from_page, to_page)
+
+
+def page_fingerprints(pdf_path: str) -> Dict[int, str]:
+  """
+  每页内容指纹：页面框 + 解压后的内容流 + 引用的表单 XObject 内容流的 SHA-1。
+  不做文字排版（每页约 0.1ms），重新解析 / 替换 PDF 后只有内容真正变化的页面指纹会变。
+  """
+  fingerprints: Dict[int, str] = {}
+  with pymupdf.open(pdf_path) as doc:
+    for index, page in enumerate(doc):
+      digest = hashlib.sha1(repr(tuple(page.rect)).encode())
+      digest.update(page.read_contents())
+      for xref, *_ in page.get_xobjects():
+        digest.update(doc.xref_stream(xref) or b"")
+      fingerprints[index + 1] = digest.hexdigest()
+  return fingerprints
+
+
+def prefilter_pages(pdf_path: str, keywords: Iterable[str], page_numbers: Iterable[int]) -> List[int]:
+  """
+  用 C 层提取的纯文本粗筛可能命中的页面（比逐字取字框快约 3 倍）。
+  文本与术语按同样的规则归一化并去掉全部空白后做子串查找，只会多选不会漏选。
+  """
+  needles = {"".join(map(fold_char, "".join((k or "").split()))) for k in keywords} - {""}
+  if not needles:
+    return []
+  candidates: List[int] = []
+  with pymupdf.open(pdf_path) as doc:
+    for page_no in page_numbers:
+      if not 1 <= page_no <= doc.page_count:
+        continue
+      text = "".join(map(fold_char, "".join(doc[page_no - 1].get_text("text", flags=TEXT_FLAGS).split())))
+      if any(needle in text for needle in needles):
+        candidates.append(page_no)
+  return candidates
+
+
+class TermScanState:
+  """
+  坐标扫描状态（每本书一个 JSON 文件）：上次扫描时的术语 {term_id: term_key}、每页内容指纹、PDF 文件的 (大小, 修改时间)。
+  只是加速增量扫描的旁路记录，丢失、损坏或版本不符时退回全量扫描。
+  """
+
+  # 匹配规则或指纹算法变化时递增，旧状态全部作废
+  VERSION = 1
+
+  def __init__(self, terms: Dict[str, str] | None = None, pages: Dict[int, str] | None = None, pdf_stat: List[int] | None = None):
+    self.terms = terms or {}
+    self.pages = pages or {}
+    self.pdf_stat = pdf_stat or []
+
+  @staticmethod
+  def stat_pdf(pdf_path: str) -> List[int]:
+    st = os.stat(pdf_path)
+    return [st.st_size, st.st_mtime_ns]
+
+  @classmethod
+  def load(cls, path: str) -> "TermScanState | None":
+    try:
+      with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+      if data.get("version") != cls.VERSION:
+        return None
+      return cls(data["terms"], {int(k): v for k, v in data["pages"].items()}, data.get("pdf_stat"))
+    except (OSError, ValueError, KeyError, TypeError):
+      return None
+
+  def save(self, path: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.part", "w", encoding="utf-8") as f:
+      json.dump({"version": self.VERSION, "terms": self.terms, "pages": self.pages, "pdf_stat": self.pdf_stat}, f, ensure_ascii=False)
+    os.replace(f"{path}.part", path)
+
+  def diff(self, terms: Dict[str, str], pages: Dict[int, str]) -> Tuple[Set[str], Set[str], Set[int]]:
+    """
+    与当前术语、页面指纹对比。
+    :return: (需在全书重新扫描的术语 id（新增或改名）, 已删除的术语 id, 需全部术语重新扫描的页码（内容变化、新增或已消失）)
+    """
+    rescan_terms = {term_id for term_id, term_key in terms.items() if self.terms.get(term_id) != term_key}
+    removed_terms = set(self.terms) - set(terms)
+    changed_pages = {page_no for page_no, digest in pages.items() if self.pages.get(page_no) != digest}
+    changed_pages |= set(self.pages) - set(pages)
+    return rescan_terms, removed_terms, changed_pages
+
+
+# 进程级共享的扫描进程池（首次分片扫描时创建，worker 数变化时重建）
+# 未配置 worker 数时的默认上限：扫描与 Web 服务同机，不占满全部核
+DEFAULT_SCAN_WORKERS = 4
+_scan_pool: ProcessPoolExecutor | None = None
+_scan_pool_workers = 0
+
+
+def _get_scan_pool(workers: int) -> ProcessPoolExecutor:
+  global _scan_pool, _scan_pool_workers
+  if _scan_pool is None or _scan_pool_workers != workers:
+    if _scan_pool is not None:
+      _scan_pool.shutdown(wait=False, cancel_futures=True)
+    # spawn：子进程不继承事件循环、数据库连接与线程锁；worker 由 _detached_main 下的 submit 按需创建
+    _scan_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    _scan_pool_workers = workers
+  return _scan_pool
+
+
+@contextlib.contextmanager
+def _detached_main():
+  """
+  spawn（以及 forkserver）创建 worker 时会把父进程 __main__ 的路径传给子进程，子进程以 __mp_main__ 的名义重新执行启动脚本，
+  python main.py 启动时每个 worker 都会导入整套后端。创建 worker 期间临时换成空的 __main__，
+  子进程只在反序列化任务时导入本模块，与后端的启动方式无关。期间不能有 await，避免其他协程看到替换后的 __main__。
+  """
+  main_module = sys.modules["__main__"]
+  sys.modules["__main__"] = types.ModuleType("__main__")
+  try:
+    yield
+  finally:
+    sys.modules["__main__"] = main_module
+
+
+def _page_count(pdf_path: str) -> int:
+  with pymupdf.open(pdf_path) as doc:
+    return doc.page_count
+
+
+def _scan_shard(pdf_path: str, page_numbers: List[int], keywords: List[str]) -> Dict[int, List[Dict]]:
+  """子进程内执行：各自只读打开 PDF、各自构建自动机（数百个术语构建只需毫秒级）"""
+  return TermMatcher(keywords).scan_pages(pdf_path, page_numbers)
+
+
+async def scan_terms_sharded(
+    pdf_path: str,
+    from_page: int,
+    to_page: int,
+    keywords: Sequence[str],
+    workers: int = 0,
+    shard_pages: int = 50,
+    pages: Iterable[int] | None = None,
+) -> AsyncIterator[Tuple[int, int, Dict[int, List[Dict]]]]:
+  """
+  把页码范围（或指定页码）切成若干分片，交给进程池并行扫描，按完成先后逐个产出分片结果，调用方可边扫边写库。
+  分片数多于 worker 数，页面密度不均时各进程的负载也较均衡。
+
+  :param workers: 并行进程数，0 表示取 CPU 核数与 DEFAULT_SCAN_WORKERS 的较小值；为 1 时不启用进程池，在线程池中逐分片扫描
+  :param shard_pages: 每个分片的页数
+  :param pages: 只扫描这些页码（增量扫描用），给出时忽略 from_page / to_page
+  :return: 异步迭代 (已完成页数, 总页数, 分片结果 {页码: [{"term", "rects"}]})
+  """
+  global _scan_pool
+  page_count = await asyncio.to_thread(_page_count, pdf_path)
+  if pages is not None:
+    page_numbers = sorted({page_no for page_no in pages if 1 <= page_no <= page_count})
+  else:
+    page_numbers = list(range(max(1, from_page), min(page_count, to_page) + 1))
+  if not page_numbers or not keywords:
+    return
+  shard_pages = max(1, shard_pages)
+  shards = [page_numbers[i:i + shard_pages] for i in range(0, len(page_numbers), shard_pages)]
+  total = len(page_numbers)
+  workers = min(workers or min(DEFAULT_SCAN_WORKERS, os.cpu_count() or 1), len(shards))
+  loop = asyncio.get_running_loop()
+  started = time.perf_counter()
+  done = 0
+
+  if workers <= 1:
+    # 单核或只有一个分片：进程池没有收益，直接在线程池中逐分片扫描（同样按分片产出）
+    matcher = TermMatcher(keywords)
+    for shard in shards:
+      result = await loop.run_in_executor(None, matcher.scan_pages, pdf_path, shard)
+      done += len(shard)
+      yield done, total, result
+    logger.info(f"[术语扫描] {len(keywords)} 个术语 × {total} 页扫描完成（单进程），耗时 {time.perf_counter() - started:.2f}s")
+    return
+
+  pool = _get_scan_pool(workers)
+  keywords = list(keywords)
+  # 非 fork 的进程池在 submit 时按需创建 worker
+  with _detached_main():
+    futures = {loop.run_in_executor(pool, _scan_shard, pdf_path, shard, keywords): len(shard) for shard in shards}
+  logger.info(f"[术语扫描] {total} 页切为 {len(shards)} 个分片，{workers} 个进程并行扫描")
+  try:
+    pending = set(futures)
+    while pending:
+      finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+      for future in finished:
+        done += futures[future]
+        yield done, total, future.result()
+  except BrokenProcessPool:
+    # 子进程异常退出（如被 OOM kill）后进程池不可再用，下次扫描重建
+    _scan_pool = None
+    raise
+  finally:
+    for future in futures:
+      future.cancel()
+  logger.info(f"[术语扫描] {len(keywords)} 个术语 × {total} 页扫描完成（{workers} 个进程），耗时 {time.perf_counter() - started:.2f}s")
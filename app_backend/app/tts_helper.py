@@ -1,10 +1,16 @@
 # app/tts_helper.py
+import asyncio
+import io
 import logging
 import os
+import re
+from typing import Dict, List, Tuple
 
 import edge_tts
 from mutagen.mp3 import MP3
 
+from .artifact_cache import ArtifactCache, normalize_text
+
 logger = logging.getLogger(__name__)
 
 # 可用中文音色
@@ -14,35 +20,137 @@ VOICES = {
   "narrator": "zh-CN-YunjianNeural",  # 讲书人（推荐）
 }
 
+# 句末标点（含中英文），切分后标点保留在句尾
+SENTENCE_PATTERN = re.compile(r"[^。！？!?；;…\n]+[。！？!?；;…]*")
+
 
 class TtsHelper:
   """Edge-TTS 封装：将旁白文本转为 MP3 音频"""
 
-  def __init__(self, voice: str = "zh-CN-YunjianNeural"):
+  def __init__(
+      self,
+      voice: str = "zh-CN-YunjianNeural",
+      cache: ArtifactCache | None = None,
+      split_threshold: int = 80,
+      max_concurrency: int = 4,
+      max_retries: int = 3,
+      boundary: str = "SentenceBoundary",
+  ):
     self.voice = voice
+    # edge-tts 每次请求只能选择一种边界事件：SentenceBoundary（带标点的整句）或 WordBoundary（逐词）
+    self.boundary = boundary
+    # 跨任务的音频缓存：键 = 音色 + 归一化旁白文本的哈希，改稿后只有变动的场景需要重新合成
+    self.cache = cache
+    # 超过 split_threshold 字的旁白按句切分并发合成，单句失败只重试该句
+    self.split_threshold = split_threshold
+    self.max_retries = max(1, max_retries)  # 至少尝试一次
+    self._semaphore = asyncio.Semaphore(max_concurrency)
+
+  def cache_key(self, text: str) -> str:
+    return ArtifactCache.make_key("tts", self.voice, normalize_text(text))
 
   async def synthesize(self, text: str, output_path: str) -> float:
     """
     合成语音并返回实际时长。不再接受 target_duration，保证语速自然。
+    命中缓存时直接复制缓存音频并返回缓存中记录的实测时长。
+    """
+    duration, _ = await self.synthesize_with_boundaries(text, output_path)
+    return duration
+
+  async def synthesize_with_boundaries(self, text: str, output_path: str) -> Tuple[float, List[Dict]]:
+    """
+    合成语音，同时返回 edge-tts 推送的边界事件，用于生成字幕。
+    边界格式: [{"offset": 秒, "duration": 秒, "text": str}]，offset 相对本段音频起点。
+    边界随音频一起写入缓存元数据，缓存命中时同样可用。
     """
     if not text or not text.strip():
-      return 0.0
+      return 0.0, []
 
     try:
       os.makedirs(os.path.dirname(output_path) if os.path.dirname(output_path) else ".", exist_ok=True)
 
-      # 直接使用 API 合成
-      communicate = edge_tts.Communicate(text, self.voice)
-      await communicate.save(output_path)
+      key = self.cache_key(text)
+      if self.cache:
+        meta = self.cache.fetch(key, output_path, suffix=".mp3")
+        if meta and meta.get("duration"):
+          logger.info(f"TTS 命中缓存: 时长 {meta['duration']:.2f}s")
+          boundaries = meta.get("boundaries", []) if meta.get("boundary") == self.boundary else []
+          return float(meta["duration"]), boundaries
+
+      # 长旁白按句切分并发合成；edge-tts 输出的是无文件头的 CBR MP3 帧流，按顺序直接拼接即可，无需重新编码
+      sentences = self._split_sentences(text)
+      pieces = await asyncio.gather(*[self._synthesize_sentence(s) for s in sentences])
+      boundaries: List[Dict] = []
+      offset = 0.0
+      with open(output_path, "wb") as f:
+        for audio_bytes, piece_boundaries in pieces:
+          f.write(audio_bytes)
+          # 每段的边界时间相对该段起点，拼接后加上前序各段的时长
+          boundaries += [{**b, "offset": round(b["offset"] + offset, 3)} for b in piece_boundaries]
+          offset += MP3(io.BytesIO(audio_bytes)).info.length
 
       audio = MP3(output_path)
       duration = audio.info.length # 单位是秒
-      logger.info(f"TTS 成功: 时长 {duration:.2f}s")
-      return duration
+      logger.info(f"TTS 成功: {len(sentences)} 段, 时长 {duration:.2f}s")
+
+      if self.cache and duration > 0:
+        meta = {"voice": self.voice, "duration": duration, "boundary": self.boundary, "boundaries": boundaries}
+        self.cache.put(key, output_path, meta, suffix=".mp3")
+      return duration, boundaries
 
     except Exception as e:
       logger.error(f"TTS 合成异常 (API方式): {e}", exc_info=True)
-      return 0.0
+      return 0.0, []
+
+  def _split_sentences(self, text: str) -> List[str]:
+    """按句末标点切分，再把过短的句子合并，避免产生大量零碎请求"""
+    text = text.strip()
+    if len(text) <= self.split_threshold:
+      return [text]
+
+    max_chunk = max(self.split_threshold // 2, 20)
+    chunks: List[str] = []
+    buffer = ""
+    for match in SENTENCE_PATTERN.finditer(text):
+      sentence = match.group().strip()
+      if not sentence:
+        continue
+      if buffer and len(buffer) + len(sentence) > max_chunk:
+        chunks.append(buffer)
+        buffer = ""
+      buffer += sentence
+    if buffer:
+      chunks.append(buffer)
+    return chunks or [text]
+
+  async def _synthesize_sentence(self, sentence: str) -> Tuple[bytes, List[Dict]]:
+    """合成单句并返回 (MP3 字节, 边界事件)，失败时仅重试该句（指数退避）"""
+    last_error: Exception | None = None
+    for attempt in range(self.max_retries):
+      try:
+        async with self._semaphore:
+          communicate = edge_tts.Communicate(sentence, self.voice, boundary=self.boundary)
+          chunks: List[bytes] = []
+          boundaries: List[Dict] = []
+          async for message in communicate.stream():
+            if message["type"] == "audio":
+              chunks.append(message["data"])
+            elif message["type"] in ("WordBoundary", "SentenceBoundary"):
+              # offset / duration 单位为 100 纳秒
+              boundaries.append({
+                "offset": message["offset"] / 10_000_000,
+                "duration": message["duration"] / 10_000_000,
+                "text": message["text"],
+              })
+        if chunks:
+          return b"".join(chunks), boundaries
+        last_error = ValueError("TTS 未返回音频数据")
+      except Exception as e:
+        last_error = e
+      logger.warning(f"TTS 单句合成第 {attempt + 1} 次失败: {last_error}，句子: {sentence[:20]}...")
+      if attempt < self.max_retries - 1:
+        await asyncio.sleep(2 ** attempt)
+    raise last_error
 
   # def _calc_rate(self, text: str, target_duration: float) -> str:
   #   """根据目标时长计算语速"""
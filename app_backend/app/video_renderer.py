@@ -1,19 +1,25 @@
 # app/video_renderer.py
 import logging
 import os
-from typing import List, Dict
+import shutil
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Tuple
 
 import numpy as np
-from PIL import Image
+from mutagen.mp3 import MP3
+from PIL import Image, ImageDraw, ImageFont
 # 配置 moviepy 使用 ImageMagick v7
 from moviepy.config import change_settings
-from moviepy.editor import (
-  AudioFileClip,
-  concatenate_videoclips,
-  vfx,
-)
+from moviepy.editor import concatenate_videoclips
 from moviepy.video.VideoClip import VideoClip
 
+from .artifact_cache import ArtifactCache
+from .ffmpeg_helper import FfmpegHelper
+from .motion_helper import MotionHelper
+from .subtitle_helper import SubtitleHelper
+
 change_settings({"IMAGEMAGICK_BINARY": "magick"})
 
 logger = logging.getLogger(__name__)
@@ -36,23 +42,151 @@ def _find_font() -> str:
   return "Arial"
 
 
+class FrameCache:
+  """
+  书页帧解码缓存（LRU）：同一张书页被多个场景引用时只解码、缩放一次，
+  最多保留 capacity 帧，超出后淘汰最久未使用的帧，帧数组随即可被回收。
+  """
+
+  def __init__(self, width: int, height: int, capacity: int = 2):
+    self.width = width
+    self.height = height
+    self.capacity = max(1, capacity)
+    self._frames: OrderedDict[str, np.ndarray] = OrderedDict()
+    self._lock = threading.Lock()
+    self.decodes = 0
+
+  def get(self, img_path: str) -> np.ndarray:
+    with self._lock:
+      frame = self._frames.get(img_path)
+      if frame is not None:
+        self._frames.move_to_end(img_path)
+        return frame
+
+    with Image.open(img_path) as pil_img:
+      resized_img = pil_img.convert("RGB").resize((self.width, self.height), Image.LANCZOS)
+    frame = np.asarray(resized_img)
+
+    with self._lock:
+      self.decodes += 1
+      self._frames[img_path] = frame
+      self._frames.move_to_end(img_path)
+      while len(self._frames) > self.capacity:
+        self._frames.popitem(last=False)
+    return frame
+
+  def clear(self):
+    with self._lock:
+      self._frames.clear()
+
+
 class VideoRenderer:
   """视频渲染引擎：将书页图片 + 运镜脚本 + 配音合成为 MP4"""
 
-  def __init__(self, fps: int = 24):
-    self.fps = fps
+  # 场景间交叉淡化时长（秒）
+  FADE_DURATION = 0.3
+  # moov 索引前置，播放器拿到文件头即可开始播放与拖动，无需先下载完整文件
+  FASTSTART_ARGS = ("-movflags", "+faststart")
+  # 成片高度上限
+  MAX_HEIGHT = 1080
+  # 草稿模式：低分辨率、低帧率、最快编码预设，只用于审稿时核对节奏与书页对应关系
+  DRAFT_MAX_HEIGHT = 360
+  DRAFT_FPS = 12
+  DRAFT_PRESET = "ultrafast"
+  DRAFT_BITRATE = "300k"
+
+  def __init__(
+      self,
+      fps: int = 24,
+      engine: str = "segment",
+      preset: str = "medium",
+      bitrate: str = "2048k",
+      workers: int = 0,
+      segment_cache: ArtifactCache | None = None,
+      draft: bool = False,
+  ):
+    """
+    :param engine: segment —— 每个场景独立编码为片段，多进程并行后流复制拼接（默认，吃满多核）；
+                   ffmpeg —— 单次 ffmpeg 滤镜图渲染，支持场景间交叉淡化；
+                   moviepy —— 旧的逐帧合成路径，作为兜底保留
+    :param workers: segment 引擎的并行编码数，0 表示使用全部 CPU 核
+    :param segment_cache: segment 引擎的场景片段缓存，改稿后只重新编码键发生变化的场景
+    :param draft: 草稿模式，忽略 fps / preset / bitrate，按 DRAFT_* 参数输出低清预览，并在画面角落标注场景序号
+    """
+    self.draft = draft
+    self.fps = self.DRAFT_FPS if draft else fps
+    self.engine = engine
+    self.preset = self.DRAFT_PRESET if draft else preset
+    self.bitrate = self.DRAFT_BITRATE if draft else bitrate
+    self.workers = workers or os.cpu_count() or 1
+    self.segment_cache = segment_cache
     self.output_width = 0
     self.output_height = 0
+    self.motion: MotionHelper | None = None
+
+  def render(
+      self,
+      scenes: List[Dict],
+      page_image_paths: Dict[int, str],
+      scene_audio_paths: Dict[int, str],
+      output_path: str,
+      narration_path: str | None = None,
+      subtitles: List[Dict] | None = None,
+  ) -> str:
+    """
+    :param narration_path: build_narration 预先生成的整章旁白音轨（AAC），渲染阶段只做封装不再混音；
+                           未提供时在输出目录临时生成一份
+    :param subtitles: 需要烧录进画面的整章字幕 [{"start", "end", "text"}]（SubtitleHelper.build_cues），
+                      由 ffmpeg subtitles 滤镜（libass）渲染；外挂字幕不需要传入
+    """
+    self._init_output_size(page_image_paths)
+    os.makedirs(os.path.dirname(output_path) if os.path.dirname(output_path) else ".", exist_ok=True)
+
+    plan = self._plan_scenes(scenes, page_image_paths, scene_audio_paths)
+    if not plan:
+      raise ValueError("没有可渲染的场景")
+
+    base = os.path.splitext(output_path)[0]
+    temp_paths = [f"{base}_chapters.txt"]
+    draft_dir = f"{base}_draft"
+    if self.draft:
+      self._label_draft_frames(plan, draft_dir)
+    if not narration_path or not os.path.exists(narration_path):
+      narration_path = f"{base}_narration.m4a"
+      temp_paths.append(narration_path)
+      self.build_narration(plan, narration_path)
+    chapters_path = self._write_chapters(plan, temp_paths[0])
+    subtitle_path = None
+    if subtitles:
+      self._assign_scene_cues(plan, subtitles)
+      subtitle_path = f"{base}_subtitles.ass"
+      temp_paths.append(subtitle_path)
+      SubtitleHelper().write_ass(subtitles, subtitle_path, self.output_width, self.output_height)
+
+    try:
+      if self.engine in ("segment", "ffmpeg"):
+        try:
+          if self.engine == "segment":
+            return self._render_segments(plan, narration_path, chapters_path, output_path)
+          return self._render_ffmpeg(plan, narration_path, chapters_path, output_path, subtitle_path)
+        except Exception as e:
+          logger.warning(f"{self.engine} 引擎渲染失败，回退到 moviepy: {e}")
+      return self._render_moviepy(plan, narration_path, output_path, subtitle_path)
+    finally:
+      for path in temp_paths:
+        if os.path.exists(path):
+          os.remove(path)
+      if self.draft:
+        shutil.rmtree(draft_dir, ignore_errors=True)
 
-  def render(self, scenes: List[Dict], page_image_paths: Dict[int, str], scene_audio_paths: Dict[int, str], output_path: str) -> str:
-    # 1. 以第一页图片确定视频分辨率
-    first_img_idx = min(page_image_paths.keys())
-    first_img_path = page_image_paths[first_img_idx]
+  def _init_output_size(self, page_image_paths: Dict[int, str]):
+    # 以第一页图片确定视频分辨率
+    first_img_path = page_image_paths[min(page_image_paths.keys())]
     with Image.open(first_img_path) as img:
       raw_w, raw_h = img.size
 
-    # 限制高度最高 1080，保证性能，同时等比例计算宽度
-    max_h = 1080
+    # 限制高度最高 1080（草稿 360），保证性能，同时等比例计算宽度
+    max_h = self.DRAFT_MAX_HEIGHT if self.draft else self.MAX_HEIGHT
     scale = max_h / raw_h if raw_h > max_h else 1.0
     self.output_width = int(raw_w * scale)
     self.output_height = int(raw_h * scale)
@@ -63,56 +197,558 @@ class VideoRenderer:
     if self.output_height % 2 != 0:
       self.output_height -= 1
 
+    self.motion = MotionHelper(self.output_width, self.output_height, self.fps)
     logger.info(f"视频自适应尺寸: {self.output_width}x{self.output_height}")
 
-    clips = []
+  def plan_timeline(self, scenes: List[Dict], scene_audio_paths: Dict[int, str]) -> List[Dict]:
+    """
+    计算每个场景的音频、时长与起止时间（有配音时以音频实测时长为准）。
+    时长按帧数取整（frames / fps），各场景独立取整，不依赖前序场景，保证音画逐场景对齐；
+    start / end 即场景边界时间戳，供字幕与章节标记使用。
+    """
+    timeline = []
+    start = 0.0
     for i, scene in enumerate(scenes):
-      img_index = scene.get("img_index", 1)
       scene_id = scene.get("scene_id", i + 1)
-      img_path = page_image_paths.get(img_index, first_img_path)
-
-      # 获取配音
       audio_path = scene_audio_paths.get(scene_id)
-      audio_clip = None
       if audio_path and os.path.exists(audio_path):
-        audio_clip = AudioFileClip(audio_path)
-        duration = audio_clip.duration
+        duration = MP3(audio_path).info.length
       else:
+        audio_path = None
         duration = scene.get("duration", 5.0)
+      frames = max(1, round(float(duration) * self.fps))
+      duration = frames / self.fps
+      camera_action, focus_area = MotionHelper.normalize(scene)
+      timeline.append({
+        "scene_id": scene_id,
+        "img_index": scene.get("img_index", 1),
+        "camera_action": camera_action,
+        "focus_area": focus_area,
+        "audio_path": audio_path,
+        "frames": frames,
+        "duration": duration,
+        "start": round(start, 3),
+        "end": round(start + duration, 3),
+      })
+      start += duration
+    return timeline
 
-      # 2. 创建静态书页 Clip
-      page_clip = self._make_static_clip(img_path, duration)
+  def _plan_scenes(self, scenes: List[Dict], page_image_paths: Dict[int, str], scene_audio_paths: Dict[int, str]) -> List[Dict]:
+    """在时间线基础上补充每个场景的书页图片路径"""
+    first_img_path = page_image_paths[min(page_image_paths.keys())]
+    plan = self.plan_timeline(scenes, scene_audio_paths)
+    for item in plan:
+      item["img_path"] = page_image_paths.get(item["img_index"], first_img_path)
+    return plan
 
-      if audio_clip:
-        page_clip = page_clip.set_audio(audio_clip)
+  def _label_draft_frames(self, plan: List[Dict], out_dir: str):
+    """
+    草稿模式：每个场景的书页预先缩放到输出尺寸，并在左上角写上场景序号、起止时间与运镜动作，
+    替换 plan 中的 img_path。ffmpeg 未编译 drawtext，序号由 PIL 直接画进输入图片。
+    推拉镜头不做 zoompan（会把序号裁出画面），改为静止画面 + 焦点框，同样可核对焦点区域是否对准原文。
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    font_path = _find_font()
 
-      # 3. 淡入淡出转场
-      if i > 0:
-        page_clip = page_clip.fx(vfx.fadein, 0.3)
+    def _font(size: int):
+      try:
+        return ImageFont.truetype(font_path, size)
+      except OSError:
+        return ImageFont.load_default(size)
 
-      clips.append(page_clip)
+    for item in plan:
+      with Image.open(item["img_path"]) as img:
+        frame = img.convert("RGB").resize((self.output_width, self.output_height), Image.BILINEAR)
+      label = f"#{item['scene_id']}  {self._vtt_time(item['start'])[3:8]}-{self._vtt_time(item['end'])[3:8]}  P{item['img_index']}  {item['camera_action']}"
+      draw = ImageDraw.Draw(frame)
+      # 竖版书页较窄，字号按标签宽度收缩到画面内
+      font_size = max(14, self.output_height // 16)
+      font = _font(font_size)
+      text_w = draw.textlength(label, font=font)
+      if text_w > self.output_width * 0.9:
+        font_size = max(8, int(font_size * self.output_width * 0.9 / text_w))
+        font = _font(font_size)
+      if item["camera_action"] in ("ZoomIn", "ZoomOut"):
+        fx, fy, fw, fh = item["focus_area"]
+        w, h = self.output_width, self.output_height
+        draw.rectangle([fx * w, fy * h, (fx + fw) * w, (fy + fh) * h], outline=(0, 200, 255), width=3)
+        item["camera_action"] = "Steady"
+      left, top, right, bottom = draw.textbbox((0, 0), label, font=font)
+      pad = font_size // 3
+      draw.rectangle([0, 0, right - left + pad * 2, bottom - top + pad * 2], fill=(0, 0, 0))
+      draw.text((pad - left, pad - top), label, font=font, fill=(255, 220, 0))
+      item["img_path"] = os.path.join(out_dir, f"scene_{item['scene_id']}.png")
+      frame.save(item["img_path"], "PNG", compress_level=1)
 
-    # 拼接并输出
-    final = concatenate_videoclips(clips, method="compose")
+  def build_narration(self, timeline: List[Dict], output_path: str) -> str:
+    """
+    把全部场景配音预混为一条 AAC 旁白音轨：各场景补齐静音/截断到场景时长后顺序拼接，
+    无配音的场景以静音占位。渲染阶段只需封装这一条音轨，混音完全移出逐帧循环。
+    """
     os.makedirs(os.path.dirname(output_path) if os.path.dirname(output_path) else ".", exist_ok=True)
-    final.write_videofile(
-        output_path,
-        fps=self.fps,
-        codec="libx264",
-        audio_codec="aac",
-        preset="medium",
-        bitrate="2048k",
-        threads=4
+    audio_inputs, audio_filters = self._audio_graph(timeline, first_input=0)
+    FfmpegHelper.run([
+      *audio_inputs,
+      "-filter_complex", ";".join(audio_filters),
+      "-map", "[aout]", "-c:a", "aac", "-b:a", "128k",
+      output_path
+    ])
+    return output_path
+
+  @staticmethod
+  def _audio_graph(plan: List[Dict], first_input: int) -> Tuple[List[str], List[str]]:
+    """各场景音频补齐/截断到场景时长后 concat 为一条音轨，输出标签 [aout]"""
+    input_args: List[str] = []
+    filters: List[str] = []
+    for i, item in enumerate(plan):
+      if item["audio_path"]:
+        input_args += ["-i", item["audio_path"]]
+      else:
+        input_args += ["-f", "lavfi", "-t", f"{item['duration']:.3f}", "-i", "anullsrc=r=44100:cl=stereo"]
+      filters.append(f"[{first_input + i}:a]aformat=sample_rates=44100:channel_layouts=stereo,apad,atrim=duration={item['duration']:.6f}[a{i}]")
+    filters.append("".join(f"[a{i}]" for i in range(len(plan))) + f"concat=n={len(plan)}:v=0:a=1[aout]")
+    return input_args, filters
+
+  @staticmethod
+  def _write_chapters(timeline: List[Dict], path: str) -> str:
+    """按场景边界生成 ffmetadata 章节文件，封装进 MP4 后播放器可按场景跳转"""
+    lines = [";FFMETADATA1"]
+    for item in timeline:
+      lines += [
+        "[CHAPTER]",
+        "TIMEBASE=1/1000",
+        f"START={int(round(item['start'] * 1000))}",
+        f"END={int(round(item['end'] * 1000))}",
+        f"title=场景 {item['scene_id']}",
+      ]
+    with open(path, "w", encoding="utf-8") as f:
+      f.write("\n".join(lines) + "\n")
+    return path
+
+  @staticmethod
+  def _assign_scene_cues(plan: List[Dict], subtitles: List[Dict]):
+    """把整章字幕按场景切开并平移到场景内时间，segment 引擎逐片段烧录，片段缓存键也只受本场景字幕影响"""
+    for item in plan:
+      start, end = item["start"], item["end"]
+      item["cues"] = [
+        {"start": round(max(cue["start"], start) - start, 3), "end": round(min(cue["end"], end) - start, 3), "text": cue["text"]}
+        for cue in subtitles if cue["end"] > start and cue["start"] < end
+      ]
+
+  @staticmethod
+  def _subtitles_filter(ass_path: str) -> str:
+    """subtitles 滤镜参数；fontsdir 指向本机找到的中文字体目录，找不到时交给 fontconfig 回退"""
+    font_path = _find_font()
+    fontsdir = f":fontsdir='{os.path.dirname(font_path)}'" if os.path.isabs(font_path) else ""
+    return f"subtitles=filename='{os.path.abspath(ass_path)}'{fontsdir}"
+
+  def _scene_filter(self, item: Dict, frames: int, in_label: str, out_label: str, overlay_label: str | None = None) -> str:
+    """
+    单个场景的画面滤镜，精确输出 frames 帧 yuv420p：
+    - Steady / Highlight：书页解码、缩放一次后用 loop 复用同一帧
+    - ZoomIn / ZoomOut：zoompan 按预先计算的推拉轨迹逐帧裁剪
+    - Highlight：再叠加淡入的压暗 + 描边遮罩（overlay_label 为遮罩图输入）
+    """
+    action = item["camera_action"]
+    if action in ("ZoomIn", "ZoomOut"):
+      chain = f"[{in_label}]{self.motion.zoompan_filter(action, item['focus_area'], frames)},format=yuv420p"
+    else:
+      chain = (
+        f"[{in_label}]scale={self.output_width}:{self.output_height},setsar=1,format=yuv420p,"
+        f"loop=loop=-1:size=1:start=0,setpts=N/{self.fps}/TB,fps={self.fps}"
+      )
+    # 统一输出恒定帧率（xfade 要求）后精确截取 frames 帧
+    chain += f",trim=end_frame={frames}"
+    if action == "Highlight" and overlay_label:
+      chain += f"[{out_label}b];" + MotionHelper.highlight_filter(f"{out_label}b", overlay_label, f"{out_label}h") + f";[{out_label}h]format=yuv420p"
+    return chain + f"[{out_label}]"
+
+  def _overlay_input(self, item: Dict, path: str) -> List[str]:
+    """Highlight 场景的遮罩图输入（循环为视频流，由 overlay 的 shortest 截断）"""
+    self.motion.write_highlight_overlay(item["focus_area"], path)
+    return ["-loop", "1", "-framerate", str(self.fps), "-i", path]
+
+  def _video_codec_args(self, threads: int = 0) -> List[str]:
+    """所有片段必须使用完全一致的编码参数，才能以流复制方式无缝拼接"""
+    return [
+      "-c:v", "libx264", "-preset", self.preset, "-b:v", self.bitrate,
+      "-pix_fmt", "yuv420p", "-profile:v", "high", "-r", str(self.fps),
+      "-video_track_timescale", str(self.fps * 512), "-threads", str(threads),
+    ]
+
+  def _render_segments(self, plan: List[Dict], narration_path: str, chapters_path: str, output_path: str) -> str:
+    """
+    分段并行渲染：
+    1. 每个场景独立编码为纯视频片段（参数一致），多个 ffmpeg 进程并行，吃满渲染节点的全部核
+    2. concat demuxer 以流复制（-c:v copy）拼接片段，同时封装预混好的旁白音轨与章节标记
+    场景之间不能跨片段交叉淡化，改为与旧 moviepy 路径一致的“自黑场淡入”。
+    """
+    work_dir = f"{os.path.splitext(output_path)[0]}_segments"
+    os.makedirs(work_dir, exist_ok=True)
+    # 并行进程数 × 每进程线程数 ≈ CPU 核数
+    threads = max(1, (os.cpu_count() or 1) // self.workers)
+
+    try:
+      segment_paths = [os.path.join(work_dir, f"seg_{i:04d}.mp4") for i in range(len(plan))]
+
+      # 先从片段缓存取回未变化的场景，只有未命中的场景才进入编码队列
+      pending = []
+      image_hashes: Dict[str, str] = {}
+      for i, item in enumerate(plan):
+        key = None
+        if self.segment_cache:
+          key = self._segment_key(item, i > 0, image_hashes)
+          if self.segment_cache.fetch(key, segment_paths[i], suffix=".mp4") is not None:
+            continue
+        ass_path = None
+        if item.get("cues"):
+          ass_path = os.path.join(work_dir, f"seg_{i:04d}.ass")
+          SubtitleHelper().write_ass(item["cues"], ass_path, self.output_width, self.output_height)
+        pending.append((i, item, key, ass_path))
+
+      # ffmpeg 本身就是独立进程，这里用线程池调度子进程即可实现多进程并行，无需再套一层 Python 进程池
+      with ThreadPoolExecutor(max_workers=self.workers) as pool:
+        futures = [
+          pool.submit(self._encode_segment, item, i > 0, segment_paths[i], threads, key, ass_path)
+          for i, item, key, ass_path in pending
+        ]
+        for future in futures:
+          future.result()
+      logger.info(f"分段编码完成: {len(plan)} 个片段, 重新编码 {len(pending)} 个, 并行度 {self.workers}")
+
+      list_path = os.path.join(work_dir, "segments.txt")
+      with open(list_path, "w", encoding="utf-8") as f:
+        for path in segment_paths:
+          f.write(f"file '{os.path.abspath(path)}'\n")
+
+      FfmpegHelper.run([
+        "-f", "concat", "-safe", "0", "-i", list_path,
+        "-i", narration_path,
+        "-i", chapters_path,
+        "-map", "0:v", "-map", "1:a", "-map_chapters", "2",
+        "-c", "copy", *self.FASTSTART_ARGS,
+        output_path
+      ])
+      return output_path
+    finally:
+      shutil.rmtree(work_dir, ignore_errors=True)
+
+  def build_previews(
+      self,
+      timeline: List[Dict],
+      page_image_paths: Dict[int, str],
+      out_dir: str,
+      thumb_width: int = 160,
+      columns: int = 10,
+  ) -> Dict[str, str]:
+    """
+    生成封面图与拖动预览雪碧图（poster.jpg / thumbnails.jpg / thumbnails.vtt）。
+    每个场景都是一张静止书页，直接按时间线从书页图片生成缩略图，无需解码视频；
+    WebVTT 中每个场景一条 cue，指向雪碧图内的 #xywh 区域。
+    """
+    if not timeline:
+      raise ValueError("没有可生成预览的场景")
+    if not self.output_width:
+      self._init_output_size(page_image_paths)
+    os.makedirs(out_dir, exist_ok=True)
+    first_img_path = page_image_paths[min(page_image_paths.keys())]
+
+    # 同一书页只解码一次、只占一格，多个场景的 cue 指向同一格
+    img_paths = [page_image_paths.get(item["img_index"], first_img_path) for item in timeline]
+    tiles = list(dict.fromkeys(img_paths))
+    thumb_height = max(2, round(thumb_width * self.output_height / self.output_width))
+    rows = (len(tiles) + columns - 1) // columns
+    sprite = Image.new("RGB", (thumb_width * min(columns, len(tiles)), thumb_height * rows))
+    for i, img_path in enumerate(tiles):
+      with Image.open(img_path) as img:
+        sprite.paste(img.convert("RGB").resize((thumb_width, thumb_height), Image.LANCZOS), ((i % columns) * thumb_width, (i // columns) * thumb_height))
+
+    cues = ["WEBVTT", ""]
+    for item, img_path in zip(timeline, img_paths):
+      i = tiles.index(img_path)
+      cues += [
+        f"{self._vtt_time(item['start'])} --> {self._vtt_time(item['end'])}",
+        f"thumbnails.jpg#xywh={(i % columns) * thumb_width},{(i // columns) * thumb_height},{thumb_width},{thumb_height}",
+        "",
+      ]
+
+    paths = {
+      "poster": os.path.join(out_dir, "poster.jpg"),
+      "sprite": os.path.join(out_dir, "thumbnails.jpg"),
+      "thumbnails": os.path.join(out_dir, "thumbnails.vtt"),
+    }
+    # 封面取首个场景的书页，与视频第一帧一致
+    with Image.open(page_image_paths.get(timeline[0]["img_index"], first_img_path)) as img:
+      img.convert("RGB").resize((self.output_width, self.output_height), Image.LANCZOS).save(paths["poster"], "JPEG", quality=85)
+    sprite.save(paths["sprite"], "JPEG", quality=80)
+    with open(paths["thumbnails"], "w", encoding="utf-8") as f:
+      f.write("\n".join(cues))
+    return paths
+
+  @staticmethod
+  def _vtt_time(seconds: float) -> str:
+    """秒 -> WebVTT 时间戳 HH:MM:SS.mmm"""
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3600_000)
+    minutes, millis = divmod(millis, 60_000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}.{millis:03d}"
+
+  def package_hls(self, mp4_path: str, out_dir: str, ladder: List[Tuple[int, str]], segment_seconds: int = 6) -> str:
+    """
+    把成片打包为多码率 HLS：{out_dir}/master.m3u8 + {out_dir}/{高度}p/index.m3u8 + ts 切片。
+    成片分辨率（按成片码率）始终作为最高档，阶梯中更低的档位并行转码，不低于成片分辨率的档位跳过。
+    各档使用相同的强制关键帧间隔，切片边界对齐，播放器切换码率时不会错位；
+    成片的 GOP 由片段拼接决定、与切片时长无关，因此最高档同样重新编码而非流复制。
+    返回 master.m3u8 路径。
+    """
+    src_w, src_h = FfmpegHelper.video_size(mp4_path)
+    rungs: Dict[int, str] = {src_h: self.bitrate}
+    for height, bitrate in sorted(ladder, reverse=True):
+      height -= height % 2
+      if height < src_h:
+        rungs.setdefault(height, bitrate)
+
+    os.makedirs(out_dir, exist_ok=True)
+    threads = max(1, (os.cpu_count() or 1) // max(1, len(rungs)))
+    with ThreadPoolExecutor(max_workers=len(rungs)) as pool:
+      futures = [
+        pool.submit(self._encode_hls_variant, mp4_path, out_dir, height, bitrate, height != src_h, segment_seconds, threads)
+        for height, bitrate in rungs.items()
+      ]
+      for future in futures:
+        future.result()
+
+    # 主播放列表按码率从高到低排列，BANDWIDTH 含音频码率；CODECS 与各档实际编码的 profile / level 一致
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
+    for height, bitrate in rungs.items():
+      width = src_w if height == src_h else int(src_w * height / src_h) // 2 * 2
+      bandwidth = self._parse_bitrate(bitrate) + 128_000
+      level = self._hls_level(height)
+      codecs = f"avc1.6400{int(level.replace('.', '')):02x},mp4a.40.2"
+      lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},RESOLUTION={width}x{height},CODECS="{codecs}"')
+      lines.append(f"{height}p/index.m3u8")
+    master_path = os.path.join(out_dir, "master.m3u8")
+    with open(master_path, "w", encoding="utf-8") as f:
+      f.write("\n".join(lines) + "\n")
+    logger.info(f"HLS 打包完成: {len(rungs)} 档 {', '.join(f'{h}p' for h in rungs)}")
+    return master_path
+
+  def _encode_hls_variant(self, mp4_path: str, out_dir: str, height: int, bitrate: str, scale: bool, segment_seconds: int, threads: int) -> str:
+    variant_dir = os.path.join(out_dir, f"{height}p")
+    os.makedirs(variant_dir, exist_ok=True)
+    FfmpegHelper.run([
+      "-i", mp4_path,
+      *(["-vf", f"scale=-2:{height}"] if scale else []),
+      "-c:v", "libx264", "-preset", self.preset, "-b:v", bitrate,
+      "-pix_fmt", "yuv420p", "-profile:v", "high", "-level:v", self._hls_level(height), "-threads", str(threads),
+      # 每个切片以关键帧开头，各档切片边界一致
+      "-force_key_frames", f"expr:gte(t,n_forced*{segment_seconds})",
+      # 统一为 AAC-LC，与主播放列表声明的 mp4a.40.2 一致
+      "-c:a", "aac", "-b:a", "128k",
+      "-f", "hls", "-hls_time", str(segment_seconds), "-hls_playlist_type", "vod",
+      "-hls_segment_filename", os.path.join(variant_dir, "seg_%04d.ts"),
+      os.path.join(variant_dir, "index.m3u8")
+    ])
+    return variant_dir
+
+  @staticmethod
+  def _hls_level(height: int) -> str:
+    """H.264 level：30fps 下 480p / 720p / 1080p 分别对应 3.0 / 3.1 / 4.0"""
+    if height <= 480:
+      return "3.0"
+    if height <= 720:
+      return "3.1"
+    if height <= 1080:
+      return "4.0"
+    return "5.1"
+
+  @staticmethod
+  def _parse_bitrate(bitrate: str) -> int:
+    """'2048k' -> 2048000"""
+    value = bitrate.strip().lower()
+    if value.endswith("k"):
+      return int(float(value[:-1]) * 1000)
+    if value.endswith("m"):
+      return int(float(value[:-1]) * 1000_000)
+    return int(float(value))
+
+  def _segment_key(self, item: Dict, fade_in: bool, image_hashes: Dict[str, str]) -> str:
+    """
+    片段缓存键：书页内容哈希 + 帧数 + 转场 + 全部编码参数 + 运镜参数 + 本场景烧录的字幕。
+    片段是纯视频流，配音只通过时长（帧数）影响画面，因此不计入音频内容本身。
+    """
+    img_path = item["img_path"]
+    if img_path not in image_hashes:
+      image_hashes[img_path] = ArtifactCache.hash_file(img_path)
+    return ArtifactCache.make_key(
+        "segment",
+        image_hashes[img_path],
+        item["frames"],
+        fade_in,
+        self.FADE_DURATION,
+        self.output_width,
+        self.output_height,
+        self._video_codec_args(threads=0),
+        item["camera_action"],
+        item["focus_area"],
+        item.get("cues") or [],
     )
-    final.close()
+
+  def _encode_segment(self, item: Dict, fade_in: bool, segment_path: str, threads: int, cache_key: str | None = None, ass_path: str | None = None) -> str:
+    """编码单个场景片段（静态 / 运镜 / 高亮），精确输出 frames 帧"""
+    input_args = ["-i", item["img_path"]]
+    overlay_label = None
+    if item["camera_action"] == "Highlight":
+      input_args += self._overlay_input(item, f"{os.path.splitext(segment_path)[0]}_highlight.png")
+      overlay_label = "1:v"
+    graph = self._scene_filter(item, item["frames"], "0:v", "scene", overlay_label)
+
+    post = []
+    if ass_path:
+      post.append(self._subtitles_filter(ass_path))
+    if fade_in:
+      post.append(f"fade=t=in:st=0:d={min(self.FADE_DURATION, item['duration'] / 2):.3f}")
+    if post:
+      graph += f";[scene]{','.join(post)}[out]"
+    FfmpegHelper.run([
+      *input_args,
+      "-filter_complex", graph,
+      "-map", "[out]" if post else "[scene]",
+      "-frames:v", str(item["frames"]),
+      *self._video_codec_args(threads),
+      "-an",
+      segment_path
+    ])
+    if self.segment_cache and cache_key:
+      self.segment_cache.put(cache_key, segment_path, {"scene_id": item["scene_id"], "frames": item["frames"]}, suffix=".mp4")
+    return segment_path
+
+  def _render_ffmpeg(self, plan: List[Dict], narration_path: str, chapters_path: str, output_path: str, subtitle_path: str | None = None) -> str:
+    """
+    单次 ffmpeg 调用完成渲染：
+    - 每个场景的书页作为单帧输入，缩放后用 loop 滤镜复用同一帧，解码/缩放只做一次
+    - 非末尾场景多保留 FADE_DURATION 秒画面，用 xfade 与下一场景交叉淡化，总时长与旁白音轨一致
+    - 旁白音轨已预混，直接流复制封装
+    所有场景在同一个 libx264 编码流里串行编码，多核场景下优先使用 segment 引擎。
+    """
+    fps = self.fps
+    input_args: List[str] = []
+    filters: List[str] = []
+    n = len(plan)
+    fade = min([self.FADE_DURATION] + [p["duration"] / 2 for p in plan])
+
+    # 输入顺序：n 张书页 → 旁白音轨 → 章节元数据 → Highlight 遮罩图
+    overlay_args: List[str] = []
+    overlay_paths: List[str] = []
+    for i, item in enumerate(plan):
+      input_args += ["-i", item["img_path"]]
+      overlay_label = None
+      if item["camera_action"] == "Highlight":
+        overlay_label = f"{n + 2 + len(overlay_paths)}:v"
+        overlay_paths.append(f"{os.path.splitext(output_path)[0]}_highlight_{i:04d}.png")
+        overlay_args += self._overlay_input(item, overlay_paths[-1])
+      frames = item["frames"] + (round(fade * fps) if i < n - 1 else 0)
+      filters.append(self._scene_filter(item, frames, f"{i}:v", f"v{i}", overlay_label))
+
+    # 交叉淡化链：第 k 次 xfade 的 offset = 前 k 个场景时长之和
+    prev = "v0"
+    offset = 0.0
+    for k in range(1, n):
+      offset += plan[k - 1]["duration"]
+      out = "vout" if k == n - 1 else f"x{k}"
+      filters.append(f"[{prev}][v{k}]xfade=transition=fade:duration={fade:.3f}:offset={offset:.3f}[{out}]")
+      prev = out
+    if n == 1:
+      filters.append("[v0]null[vout]")
+    if subtitle_path:
+      filters[-1] = filters[-1].replace("[vout]", "[vraw]")
+      filters.append(f"[vraw]{self._subtitles_filter(subtitle_path)}[vout]")
+
+    try:
+      FfmpegHelper.run([
+        *input_args,
+        "-i", narration_path,
+        "-i", chapters_path,
+        *overlay_args,
+        "-filter_complex", ";".join(filters),
+        "-map", "[vout]", "-map", f"{n}:a", "-map_chapters", str(n + 1),
+        *self._video_codec_args(),
+        "-c:a", "copy", *self.FASTSTART_ARGS,
+        output_path
+      ])
+    finally:
+      for path in overlay_paths:
+        if os.path.exists(path):
+          os.remove(path)
     return output_path
 
-  def _make_static_clip(self, img_path: str, duration: float) -> VideoClip:
-    """等比例缩放至视频尺寸，无动态效果"""
-    pil_img = Image.open(img_path).convert("RGB")
-    resized_img = pil_img.resize((self.output_width, self.output_height), Image.LANCZOS)
-    frame_array = np.array(resized_img)
-    return VideoClip(make_frame=lambda t: frame_array, duration=duration)
+  def _render_moviepy(self, plan: List[Dict], narration_path: str, output_path: str, subtitle_path: str | None = None) -> str:
+    """
+    逐帧合成路径（兜底）。
+    场景 Clip 只记录图片路径，帧在首次被取用时才解码，并经共享的 FrameCache 复用与淘汰；
+    预混旁白以文件形式交给 write_videofile 直接封装，逐帧循环中不再解码、重采样任何音频。
+    峰值内存与场景数量无关，只取决于 FrameCache 容量。
+    """
+    frame_cache = FrameCache(self.output_width, self.output_height)
+    clips = []
+    for i, item in enumerate(plan):
+      # 创建惰性书页 Clip，非首个场景自黑场淡入
+      fade_in = self.FADE_DURATION if i > 0 else 0.0
+      clips.append(self._make_scene_clip(item, frame_cache, fade_in))
+
+    # 所有场景尺寸一致，用 chain 顺序取帧；compose 会为每个场景额外生成整幅浮点 mask，内存随场景数线性增长
+    final = concatenate_videoclips(clips, method="chain")
+    try:
+      final.write_videofile(
+          output_path,
+          fps=self.fps,
+          codec="libx264",
+          audio=narration_path,
+          preset=self.preset,
+          bitrate=self.bitrate,
+          threads=4,
+          ffmpeg_params=[*self.FASTSTART_ARGS, *(["-vf", self._subtitles_filter(subtitle_path)] if subtitle_path else [])]
+      )
+    finally:
+      final.close()
+      frame_cache.clear()
+    return output_path
+
+  def _make_scene_clip(self, item: Dict, frame_cache: "FrameCache", fade_in: float = 0.0) -> VideoClip:
+    """
+    帧按需从 FrameCache 获取，Clip 本身不持有整页像素数据；运镜与 ffmpeg 引擎共用 MotionHelper 的轨迹：
+    ZoomIn / ZoomOut 按 crop_box 一次完成裁剪 + 缩放，Highlight 以 NumPy 向量化叠加遮罩。
+    moviepy 1.0.3 的 VideoClip(make_frame=...) 与 fx 都会立即调用 get_frame(0) 探测尺寸，
+    这里直接指定尺寸并在 make_frame 内完成淡入，避免构建时间线时就解码全部书页。
+    """
+    img_path, duration = item["img_path"], item["duration"]
+    action, focus = item["camera_action"], item["focus_area"]
+    w, h = self.output_width, self.output_height
+    motion = self.motion
+
+    overlay_rgb = overlay_alpha = None
+    if action == "Highlight":
+      overlay = np.asarray(motion.highlight_overlay(focus), dtype=np.float32)
+      overlay_rgb, overlay_alpha = overlay[..., :3], overlay[..., 3:] / 255.0
+
+    def make_frame(t):
+      frame = frame_cache.get(img_path)
+      if action in ("ZoomIn", "ZoomOut"):
+        x, y, cw, ch = motion.crop_box(action, focus, min(t / duration, 1.0))
+        box = (x * w, y * h, (x + cw) * w, (y + ch) * h)
+        frame = np.asarray(Image.fromarray(frame).resize((w, h), Image.BILINEAR, box=box))
+      elif overlay_alpha is not None and t > MotionHelper.HIGHLIGHT_DELAY:
+        alpha = overlay_alpha * min((t - MotionHelper.HIGHLIGHT_DELAY) / MotionHelper.HIGHLIGHT_FADE, 1.0)
+        frame = (frame * (1 - alpha) + overlay_rgb * alpha).astype(np.uint8)
+      if fade_in > 0 and t < fade_in:
+        return (frame * (t / fade_in)).astype(np.uint8)
+      return frame
+
+    clip = VideoClip(duration=duration)
+    clip.make_frame = make_frame
+    clip.size = (w, h)
+    return clip
 
   # def _make_ken_burns_clip(self, img_path: str, duration: float) -> VideoClip:
   #   """
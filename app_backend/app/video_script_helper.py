@@ -3,10 +3,15 @@ import base64
 import json
 import logging
 import textwrap
+import time
 from typing import List, Dict
 
 import litellm
 
+from .config import thba_app_settings
+from .hedge_helper import hedged_call
+from .rate_limiter import llm_rate_limiter, estimate_tokens, response_total_tokens
+
 logger = logging.getLogger(__name__)
 
 
@@ -19,11 +24,29 @@ class VideoScriptHelper:
       base_url: str = "",
       model: str = "gemini/gemini-2.5-flash",
       temperature: float = 0.3,
+      fallback_model: str = "",
+      fallback_api_key: str = "",
+      fallback_base_url: str = "",
+      deadline: float = 0,
+      hedge_percentile: float = thba_app_settings.LLM_HEDGE_PERCENTILE,
+      hedge_default_delay: float = thba_app_settings.LLM_HEDGE_DEFAULT_DELAY,
   ):
+    """
+    :param fallback_model: 备用模型（LiteLLM 标识），主模型慢于历史 hedge_percentile 分位或返回无效结果时发出对冲请求
+    :param deadline: 单次脚本生成的截止时间（秒），超时放弃并返回空结果，0 表示不限
+    :param hedge_default_delay: 主模型耗时样本不足时的对冲等待时间（秒）
+    """
     self.api_key = api_key
     self.base_url = base_url
     self.model = model
     self.temperature = temperature
+    self.fallback_model = fallback_model
+    self.fallback_api_key = fallback_api_key
+    self.fallback_base_url = fallback_base_url
+    self.deadline = deadline
+    self.hedge_percentile = hedge_percentile
+    self.hedge_default_delay = hedge_default_delay
+    self.last_call: Dict = {}
 
   async def generate_script(
       self,
@@ -66,50 +89,7 @@ class VideoScriptHelper:
       {"role": "system", "content": system_prompt},
       {"role": "user", "content": user_content}
     ]
-
-    kwargs = {
-      "model": self.model,
-      "messages": messages,
-      "temperature": self.temperature,
-    }
-    if self.api_key:
-      kwargs["api_key"] = self.api_key
-    if self.base_url:
-      kwargs["api_base"] = self.base_url
-
-    try:
-      response = await litellm.acompletion(**kwargs)
-      raw = response.choices[0].message.content
-      if not raw:
-        logger.error("LLM 返回空内容")
-        return []
-
-      clean = raw.replace("```json", "").replace("```", "").strip()
-      script = json.loads(clean)
-
-      if isinstance(script, list) and len(script) > 0:
-        for idx, item in enumerate(script):
-          item.setdefault("scene_id", idx + 1)  # 兜底：按位置补全，保证连续
-          item.setdefault("img_index", 1)
-          item.setdefault("narration", "")
-          item.setdefault("focus_area", [0.0, 0.0, 1.0, 1.0])
-          item.setdefault("camera_action", "Steady")
-          item.setdefault("duration", 5.0)
-          # 兼容旧字段名：AI 偶尔还是会返回 page_no
-          if "page_no" in item and "img_index" not in item:
-            item["img_index"] = item.pop("page_no")
-        # 按 scene_id 排序，防止 AI 乱序输出
-        script.sort(key=lambda s: s.get("scene_id", 0))
-        return script
-
-      return []
-
-    except json.JSONDecodeError as e:
-      logger.error(f"LLM 返回非 JSON: {raw[:500]}")
-      return []
-    except Exception as e:
-      logger.error(f"LLM API 调用失败: {e}")
-      return []
+    return await self._request(messages, "images")
 
   async def generate_script_from_pdf(
       self,
@@ -158,22 +138,105 @@ class VideoScriptHelper:
       {"role": "system", "content": system_prompt},
       {"role": "user", "content": user_content}
     ]
+    return await self._request(messages, "pdf")
+
+  async def generate_script_from_text(
+      self,
+      page_texts: List[str],
+      book_title: str,
+      chapter_title: str,
+      context_hint: str = ""
+  ) -> List[Dict]:
+    """
+    只发送逐页文字（纯文字章节用，payload 与 token 远小于 PDF / 图片）。
+
+    :param page_texts: 每页的文字；行首可带 [x, y, w, h] 文字块相对坐标，供 AI 给出 focus_area
+    :return: [{scene_id, img_index, narration, focus_area, camera_action, duration}]
+    """
+    if not page_texts:
+      return []
+
+    system_prompt = self._build_system_prompt(book_title, chapter_title, context_hint)
+    pages = "\n\n".join(f"[第 {i + 1} 页]\n{text}" for i, text in enumerate(page_texts))
+    user_content = [
+      {
+        "type": "text",
+        "text": (
+          "以下是本章节逐页提取的文字（代替 PDF 发送），每页以 [第 N 页] 开头，N 即 img_index。"
+          "行首的 [x, y, w, h] 是该文字块在页面上的相对位置，focus_area 请直接取用或合并这些坐标；"
+          "没有坐标的页面 focus_area 一律填整页。请根据这些内容生成视频导读脚本。\n\n" + pages
+        )
+      }
+    ]
+
+    messages = [
+      {"role": "system", "content": system_prompt},
+      {"role": "user", "content": user_content}
+    ]
+    return await self._request(messages, "text")
 
+  async def _request(self, messages: List[Dict], mode: str) -> List[Dict]:
+    """
+    调用 LLM 并解析脚本（配置了备用模型时带对冲请求，超过 deadline 放弃）。
+    胜出调用的耗时、token 用量、请求体大小，以及胜出模型与节省的耗时记录在 self.last_call
+    """
+    calls: Dict[str, Dict] = {}
+
+    async def _call(model: str, api_key: str, base_url: str) -> List[Dict]:
+      calls[model] = {}
+      return await self._request_once(messages, mode, model, api_key, base_url, calls[model])
+
+    primary = (self.model, lambda: _call(self.model, self.api_key, self.base_url))
+    secondary = None
+    if self.fallback_model and self.fallback_model != self.model:
+      secondary = (self.fallback_model, lambda: _call(self.fallback_model, self.fallback_api_key or self.api_key, self.fallback_base_url))
+    script, hedge = await hedged_call(primary, secondary, self.deadline, self.hedge_percentile, self.hedge_default_delay)
+
+    winner = hedge["winner_model"] or self.model
+    self.last_call = {
+      "mode": mode,
+      "payload_bytes": len(json.dumps(messages, ensure_ascii=False).encode("utf-8")),
+      **calls.get(winner, {}),
+      "ok": bool(script),
+      "model": winner,
+      "hedged": hedge["hedged"],
+      "hedge_winner": hedge["winner"],
+      "hedge_delay_s": hedge["hedge_delay_s"],
+      "saved_s_est": hedge["saved_s_est"],
+      "timed_out": hedge["timed_out"],
+    }
+    if hedge["latency_s"] is not None:
+      self.last_call["latency_s"] = hedge["latency_s"]
+    if hedge["hedged"]:
+      logger.info(f"[视频脚本] 对冲请求结果: 胜出 {hedge['winner'] or '无'}（{winner}），耗时 {hedge['latency_s']}s，估计节省 {hedge['saved_s_est']}s")
+    return script or []
+
+  async def _request_once(self, messages: List[Dict], mode: str, model: str, api_key: str, base_url: str, call_info: Dict) -> List[Dict]:
+    """单个模型的一次调用；耗时与 token 用量写入 call_info"""
     kwargs = {
-      "model": self.model,
+      "model": model,
       "messages": messages,
       "temperature": self.temperature,
     }
-    if self.api_key:
-      kwargs["api_key"] = self.api_key
-    if self.base_url:
-      kwargs["api_base"] = self.base_url
+    if api_key:
+      kwargs["api_key"] = api_key
+    if base_url:
+      kwargs["api_base"] = base_url
 
+    started = time.perf_counter()
+    raw = None
     try:
-      response = await litellm.acompletion(**kwargs)
+      # 经进程级限流器调用：RPM / TPM 额度按模型共享，429 按 Retry-After 冷却后重试
+      response = await llm_rate_limiter.call(model, lambda: litellm.acompletion(**kwargs), estimate_tokens(messages), response_total_tokens)
+      usage = getattr(response, "usage", None)
+      call_info.update({
+        "prompt_tokens": getattr(usage, "prompt_tokens", None),
+        "completion_tokens": getattr(usage, "completion_tokens", None),
+        "total_tokens": getattr(usage, "total_tokens", None),
+      })
       raw = response.choices[0].message.content
       if not raw:
-        logger.error("LLM (PDF模式) 返回空内容")
+        logger.error(f"LLM ({mode}模式) 返回空内容")
         return []
 
       clean = raw.replace("```json", "").replace("```", "").strip()
@@ -181,25 +244,30 @@ class VideoScriptHelper:
 
       if isinstance(script, list) and len(script) > 0:
         for idx, item in enumerate(script):
-          item.setdefault("scene_id", idx + 1)
+          item.setdefault("scene_id", idx + 1)  # 兜底：按位置补全，保证连续
           item.setdefault("img_index", 1)
           item.setdefault("narration", "")
           item.setdefault("focus_area", [0.0, 0.0, 1.0, 1.0])
           item.setdefault("camera_action", "Steady")
           item.setdefault("duration", 5.0)
+          # 兼容旧字段名：AI 偶尔还是会返回 page_no
           if "page_no" in item and "img_index" not in item:
             item["img_index"] = item.pop("page_no")
+        # 按 scene_id 排序，防止 AI 乱序输出
         script.sort(key=lambda s: s.get("scene_id", 0))
+        call_info["scenes"] = len(script)
         return script
 
       return []
 
     except json.JSONDecodeError:
-      logger.error(f"LLM (PDF模式) 返回非 JSON: {raw[:500] if raw else ''}")
+      logger.error(f"LLM ({mode}模式) 返回非 JSON: {raw[:500] if raw else ''}")
       return []
     except Exception as e:
-      logger.error(f"LLM (PDF模式) API 调用失败: {e}")
+      logger.error(f"LLM ({mode}模式) API 调用失败: {e}")
       return []
+    finally:
+      call_info["latency_s"] = round(time.perf_counter() - started, 3)
 
   def _build_system_prompt(self, book_title: str, chapter_title: str, context_hint: str) -> str:
     hint = f"\n补充背景：{context_hint}" if context_hint else ""
@@ -245,10 +313,17 @@ class VideoScriptHelper:
       - 旁白讲解词。直接面向听众朗读，口语化，长度 60~200 字
 
       ### focus_area（数组）
-      - 【必须】统一固定为 [0.0, 0.0, 1.0, 1.0]
+      - 当前旁白所讲内容在该页上的区域，格式 [x, y, w, h]，均为相对整页宽高的比例（0~1），左上角为原点
+      - 讲解整页或无法确定具体位置时，填 [0.0, 0.0, 1.0, 1.0]
+      - 区域必须真实对应 PDF 页面上的内容位置，宁可给整页也不要猜测
 
       ### camera_action（字符串）
-      - 【必须】统一固定为 "Steady"
+      - 只能是以下之一："Steady"、"ZoomIn"、"ZoomOut"、"Highlight"
+      - Steady：镜头不动，适合概述整页、章节开场
+      - ZoomIn：从整页推近到 focus_area，适合聚焦某段关键论述、公式或图表
+      - ZoomOut：从 focus_area 拉远回整页，适合讲完局部后回到全局、承上启下
+      - Highlight：镜头不动，压暗 focus_area 以外的区域并描边，适合指出页面上的某个要点
+      - 相邻场景避免连续使用同一种推拉动作；focus_area 为整页时一律使用 Steady
 
       ### duration（浮点数）
       - 场景时长 = narration 字数 ÷ 3.5
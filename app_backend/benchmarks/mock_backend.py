@@ -0,0 +1,30 @@
+# benchmarks/mock_backend.py
+"""
+接入本地替身启动后端：edge-tts 在进程内指向 benchmarks.mock_provider，配音缓存放到独立目录，
+替身返回的静音音频不会混入正式缓存。LLM 仍按 mock_provider 中列出的环境变量指向替身。
+
+用法（在 app_backend 目录下，先启动 python -m benchmarks.mock_provider --port 8765）:
+  python -m benchmarks.mock_backend --provider 127.0.0.1:8765
+"""
+import argparse
+import os
+import runpy
+
+from benchmarks.mock_provider import patch_edge_tts
+
+
+def main():
+  parser = argparse.ArgumentParser(description="接入本地替身启动后端")
+  parser.add_argument("--provider", type=str, default="127.0.0.1:8765", help="mock_provider 的地址")
+  parser.add_argument("--cache-dir", type=str, default="var/bench_cache", help="基准专用的产物缓存目录")
+  args = parser.parse_args()
+
+  # 须在导入 app.config 之前设置
+  os.environ.setdefault("VIDEO_CACHE_DIR", args.cache_dir)
+  with patch_edge_tts(args.provider) as url:
+    print(f"edge-tts 已指向替身: {url}")
+    runpy.run_path("main.py", run_name="__main__")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,202 @@
+# benchmarks/mock_oss.py
+"""
+本地 S3 / MinIO 兼容替身：只实现视频上传用到的接口，落盘到本地目录，可注入延迟、限速与分片失败，
+用于离线测试成片的流式上传、分片并发与单片重传。签名（查询串预签名或 Authorization 头）只做存在性与过期检查，不校验内容。
+
+  PUT    /{bucket}/{key}                             单次上传
+  POST   /{bucket}/{key}?uploads                     CreateMultipartUpload
+  PUT    /{bucket}/{key}?partNumber=N&uploadId=ID    UploadPart
+  POST   /{bucket}/{key}?uploadId=ID                 CompleteMultipartUpload
+  DELETE /{bucket}/{key}?uploadId=ID                 AbortMultipartUpload
+  GET    /{bucket}/{key}                             下载
+
+用法（在 app_backend 目录下）:
+  python -m benchmarks.mock_oss --port 9000 --root var/mock_oss --latency 0.05 --bandwidth-mb 20 --fail-parts 3,7
+"""
+import argparse
+import hashlib
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Set, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+
+class MockOssHandler(BaseHTTPRequestHandler):
+  protocol_version = "HTTP/1.1"
+  server: "MockOssServer"
+
+  def log_message(self, format, *args):
+    pass
+
+  def _reply(self, status: int, body: bytes = b"", headers: dict | None = None):
+    self.send_response(status)
+    for k, v in (headers or {}).items():
+      self.send_header(k, v)
+    self.send_header("Content-Length", str(len(body)))
+    self.end_headers()
+    if body:
+      self.wfile.write(body)
+
+  def _error(self, status: int, code: str):
+    self._reply(status, f"<Error><Code>{code}</Code></Error>".encode(), {"Content-Type": "application/xml"})
+
+  def _parse(self) -> Tuple[str, dict] | None:
+    url = urlsplit(self.path)
+    query = {k: v[0] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+    if "X-Amz-Signature" in query and "X-Amz-Credential" in query:
+      # 预签名地址：检查是否过期
+      signed_at = datetime.strptime(query["X-Amz-Date"], "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc)
+      if (datetime.now(timezone.utc) - signed_at).total_seconds() > int(query.get("X-Amz-Expires", "0")):
+        self._error(403, "AccessDenied")
+        return None
+    elif not self.headers.get("Authorization", "").startswith("AWS4-HMAC-SHA256 "):
+      # SDK 请求：签名在 Authorization 头中
+      self._error(403, "AccessDenied")
+      return None
+    time.sleep(self.server.latency)
+    return unquote(url.path).lstrip("/"), query
+
+  def _read_body(self, dest_path: str) -> str:
+    """按 Content-Length 流式读入并落盘（可限速），返回 MD5 ETag"""
+    remaining = int(self.headers.get("Content-Length", "0"))
+    digest = hashlib.md5()
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    with open(f"{dest_path}.tmp", "wb") as f:
+      while remaining > 0:
+        chunk = self.rfile.read(min(256 * 1024, remaining))
+        if not chunk:
+          raise ConnectionError("请求体不完整")
+        remaining -= len(chunk)
+        digest.update(chunk)
+        f.write(chunk)
+        if self.server.bandwidth:
+          time.sleep(len(chunk) / self.server.bandwidth)
+    os.replace(f"{dest_path}.tmp", dest_path)
+    return f'"{digest.hexdigest()}"'
+
+  def do_PUT(self):
+    parsed = self._parse()
+    if not parsed:
+      return
+    path, query = parsed
+    if "uploadId" in query:
+      number = int(query["partNumber"])
+      with self.server.lock:
+        self.server.part_requests += 1
+        inject = (query["uploadId"], number) not in self.server.failed and number in self.server.fail_parts
+        if inject:
+          self.server.failed.add((query["uploadId"], number))
+      if inject:
+        # 读完请求体再返回 500，模拟分片写入途中的服务端错误
+        self._read_body(os.path.join(self.server.root, ".uploads", query["uploadId"], "discard"))
+        self._error(500, "InternalError")
+        return
+      etag = self._read_body(os.path.join(self.server.root, ".uploads", query["uploadId"], f"{number:05d}"))
+    else:
+      etag = self._read_body(os.path.join(self.server.root, path))
+    self._reply(200, headers={"ETag": etag})
+
+  def do_POST(self):
+    parsed = self._parse()
+    if not parsed:
+      return
+    path, query = parsed
+    body = self.rfile.read(int(self.headers.get("Content-Length", "0")))
+    if "uploads" in query:
+      upload_id = uuid.uuid4().hex
+      os.makedirs(os.path.join(self.server.root, ".uploads", upload_id))
+      self._reply(200, f"<InitiateMultipartUploadResult><UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>".encode(), {"Content-Type": "application/xml"})
+      return
+
+    upload_dir = os.path.join(self.server.root, ".uploads", query.get("uploadId", ""))
+    if not os.path.isdir(upload_dir):
+      self._error(404, "NoSuchUpload")
+      return
+    numbers = [int(n) for n in re.findall(rb"<PartNumber>(\d+)</PartNumber>", body)]
+    dest_path = os.path.join(self.server.root, path)
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    with open(dest_path, "wb") as out:
+      for number in numbers:
+        with open(os.path.join(upload_dir, f"{number:05d}"), "rb") as part:
+          shutil.copyfileobj(part, out)
+    shutil.rmtree(upload_dir, ignore_errors=True)
+    self._reply(200, f'<CompleteMultipartUploadResult><ETag>"{uuid.uuid4().hex}-{len(numbers)}"</ETag></CompleteMultipartUploadResult>'.encode(), {"Content-Type": "application/xml"})
+
+  def do_DELETE(self):
+    parsed = self._parse()
+    if not parsed:
+      return
+    _path, query = parsed
+    shutil.rmtree(os.path.join(self.server.root, ".uploads", query.get("uploadId", "")), ignore_errors=True)
+    self._reply(204)
+
+  def do_GET(self):
+    parsed = self._parse()
+    if not parsed:
+      return
+    path = os.path.join(self.server.root, parsed[0])
+    if not os.path.isfile(path):
+      self._error(404, "NoSuchKey")
+      return
+    self.send_response(200)
+    self.send_header("Content-Length", str(os.path.getsize(path)))
+    self.end_headers()
+    with open(path, "rb") as f:
+      shutil.copyfileobj(f, self.wfile)
+
+
+class MockOssServer(ThreadingHTTPServer):
+  daemon_threads = True
+
+  def __init__(self, address, root: str, latency: float = 0.0, bandwidth: float = 0.0, fail_parts: Set[int] | None = None):
+    """
+    :param latency: 每个请求的固定延迟（秒）
+    :param bandwidth: 每个连接的上传限速（字节/秒），0 表示不限速
+    :param fail_parts: 这些分片号在每次上传中的第一次请求返回 500，验证单片重传
+    """
+    super().__init__(address, MockOssHandler)
+    self.root = root
+    self.latency = latency
+    self.bandwidth = bandwidth
+    self.fail_parts = fail_parts or set()
+    self.failed: Set[Tuple[str, int]] = set()
+    self.part_requests = 0
+    self.lock = threading.Lock()
+
+
+def start_mock_oss(root: str, port: int = 0, **options) -> Tuple[MockOssServer, str]:
+  """在后台线程启动替身服务，返回 (server, endpoint)"""
+  os.makedirs(root, exist_ok=True)
+  server = MockOssServer(("127.0.0.1", port), root, **options)
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+  return server, f"127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+  parser = argparse.ArgumentParser(description="本地 S3 / MinIO 兼容替身")
+  parser.add_argument("--port", type=int, default=9000)
+  parser.add_argument("--root", type=str, default="var/mock_oss")
+  parser.add_argument("--latency", type=float, default=0.0, help="每个请求的延迟（秒）")
+  parser.add_argument("--bandwidth-mb", type=float, default=0.0, help="每个连接的上传限速（MB/s），0 表示不限速")
+  parser.add_argument("--fail-parts", type=str, default="", help="逗号分隔的分片号，首次上传返回 500")
+  args = parser.parse_args()
+
+  server, endpoint = start_mock_oss(
+      args.root, args.port, latency=args.latency, bandwidth=args.bandwidth_mb * 1024 * 1024,
+      fail_parts={int(n) for n in args.fail_parts.split(",") if n}
+  )
+  print(f"Mock OSS 已启动: http://{endpoint}，数据目录 {args.root}")
+  try:
+    threading.Event().wait()
+  except KeyboardInterrupt:
+    server.shutdown()
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,411 @@
+# benchmarks/mock_provider.py
+"""
+本地 LLM / TTS 替身：离线跑术语提取与视频生成的端到端基准，不需要真实服务商的 Key 与外网。
+
+  POST /v1/chat/completions    OpenAI 兼容接口（AiHelper 的 httpx 调用、LiteLLM 的 openai/ 前缀模型）
+  GET  /v1/models              模型列表
+  WS   /edge/v1                edge-tts 协议（TtsHelper），返回与 edge-tts 相同格式的 24kHz 单声道 48kbps 静音 MP3 与边界事件
+
+返回内容是确定性的：
+  - 术语提取：从请求正文中按出现频次挑选词语，术语确实出现在原文里，后续的术语匹配 / 坐标扫描有真实命中
+  - 视频脚本：按请求里的页数（PDF 页数 / 图片张数 / 文字页数）每页生成 1~2 个场景，img_index 不越界
+延迟、错误与吞吐可配置，随机量由 (seed, 请求体哈希, 同一请求体的第几次) 决定，重放同一组请求结果一致：
+  - 延迟 = 模型基础延迟 × (1 ± jitter) + 输出 token 数 / tokens_per_second
+  - 按模型的 RPM 滑动窗口，超出返回 429 + Retry-After（验证 llm_rate_limiter 的冷却）
+  - 按比例注入 500 与空内容（验证重试与对冲请求的备用模型兜底）
+
+用法（在 app_backend 目录下）:
+  python -m benchmarks.mock_provider --port 8765 --latency 2 --jitter 0.3 --model-latency mock-slow=30 \\
+    --error-rate 0.05 --empty-rate 0.02 --rpm 60 --tokens-per-second 80 --tts-latency 0.3 --tts-rtf 0.1
+
+  对应的后端配置（环境变量）:
+    AI_BASE_URL=http://127.0.0.1:8765/v1 AI_MODEL_NAME=mock-fast AI_FALLBACK_MODEL_NAME=mock-backup
+    VIDEO_AI_BASE_URL=http://127.0.0.1:8765/v1 VIDEO_AI_MODEL_NAME=openai/mock-slow VIDEO_AI_FALLBACK_MODEL_NAME=openai/mock-fast
+  edge-tts 没有服务地址参数，TTS 需在基准进程内用 patch_edge_tts 临时指向替身；
+  整个后端接入替身时用 python -m benchmarks.mock_backend --provider 127.0.0.1:8765 启动。
+  设置了 HTTP(S)_PROXY 时需把 127.0.0.1 加入 NO_PROXY（edge-tts 会读取代理环境变量）。
+"""
+import argparse
+import asyncio
+import base64
+import contextlib
+import hashlib
+import html
+import inspect
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from typing import Deque, Dict, Iterator, List, Tuple
+from unittest import mock
+
+import edge_tts
+from aiohttp import WSMsgType, web
+
+# edge-tts 固定请求的输出格式 audio-24khz-48kbitrate-mono-mp3：MPEG-2 Layer III 单声道，每帧 576 个采样、144 字节。
+# 帧头之后全为 0 即一帧合法的静音（side info 中 part2_3_length = 0，没有主数据）
+MP3_SILENT_FRAME = bytes([0xFF, 0xF3, 0x64, 0xC0]) + bytes(140)
+MP3_FRAME_SECONDS = 576 / 24000
+TICKS_PER_SECOND = 10_000_000
+
+SENTENCE_PATTERN = re.compile(r"[^。！？!?；;…\n]+[。！？!?；;…]*")
+WORD_PATTERN = re.compile(r"[A-Za-z][A-Za-z0-9\-]{2,}|[一-鿿]{2,4}")
+CAMERA_CYCLE = [
+  ("Steady", [0.0, 0.0, 1.0, 1.0]),
+  ("ZoomIn", [0.1, 0.2, 0.6, 0.3]),
+  ("Highlight", [0.1, 0.55, 0.8, 0.2]),
+  ("ZoomOut", [0.1, 0.2, 0.6, 0.3]),
+]
+
+
+def _parse_model_map(text: str) -> Dict[str, float]:
+  """解析 "模型=数值" 逗号分隔列表"""
+  result: Dict[str, float] = {}
+  for item in (text or "").split(","):
+    if "=" in item:
+      model, _, value = item.strip().rpartition("=")
+      result[model.strip()] = float(value)
+  return result
+
+
+def _message_parts(messages: List[Dict]) -> Tuple[str, List[str]]:
+  """拆出请求中的全部文字与 data URL（图片 / PDF）"""
+  texts: List[str] = []
+  urls: List[str] = []
+  for message in messages or []:
+    content = message.get("content") if isinstance(message, dict) else None
+    for part in content if isinstance(content, list) else [content]:
+      if isinstance(part, str):
+        texts.append(part)
+      elif isinstance(part, dict) and part.get("type") == "text":
+        texts.append(part.get("text") or "")
+      elif isinstance(part, dict) and part.get("type") == "image_url":
+        urls.append((part.get("image_url") or {}).get("url", ""))
+  return "\n".join(texts), urls
+
+
+def _pdf_page_count(data_url: str) -> int:
+  try:
+    import pymupdf
+    with pymupdf.open(stream=base64.b64decode(data_url.split(",", 1)[1]), filetype="pdf") as doc:
+      return doc.page_count
+  except Exception:
+    return 1
+
+
+def make_terms(text: str, limit: int = 30) -> List[Dict[str, str]]:
+  """按出现频次从书籍片段中挑选术语（至少出现 2 次，跳过提示词本身的词语）"""
+  body = text.split("书籍内容片段：", 1)[-1]
+  counts = Counter(WORD_PATTERN.findall(body))
+  terms = [word for word, n in counts.most_common() if n >= 2][:limit]
+  return [{"term": term, "desc": f"{term}：本地替身生成的模拟解释，共出现 {counts[term]} 次。"} for term in terms]
+
+
+def make_script(text: str, urls: List[str], rnd: random.Random) -> List[Dict]:
+  """按请求里的页数生成视频脚本，每页 1~2 个场景"""
+  page_texts = re.split(r"\[第 \d+ 页\]", text)[1:]
+  pdfs = [url for url in urls if url.startswith("data:application/pdf")]
+  if page_texts:
+    page_count = len(page_texts)
+  elif pdfs:
+    page_count = _pdf_page_count(pdfs[0])
+  else:
+    page_count = max(1, len(urls))
+
+  scenes: List[Dict] = []
+  for page in range(1, page_count + 1):
+    source = " ".join(re.sub(r"\[[\d.,\s]+\]", "", page_texts[page - 1]).split()) if page_texts else ""
+    for _ in range(rnd.choice((1, 1, 2))):
+      action, focus = CAMERA_CYCLE[len(scenes) % len(CAMERA_CYCLE)]
+      narration = (source[len(scenes) % 5 * 20:][:120] if source else "") or f"这一页讲的是本章的第 {page} 个要点，我们先看整体结构，再展开其中的关键论述。"
+      scenes.append({
+        "scene_id": len(scenes) + 1,
+        "img_index": page,
+        "narration": narration,
+        "focus_area": focus,
+        "camera_action": action,
+        "duration": round(len(narration) / 3.5, 1),
+      })
+  return scenes
+
+
+def make_audio(text: str, chars_per_second: float) -> Tuple[bytes, float]:
+  """按朗读语速生成静音 MP3，返回 (音频字节, 时长秒)"""
+  frames = max(1, round(max(0.5, len("".join(text.split())) / chars_per_second) / MP3_FRAME_SECONDS))
+  return MP3_SILENT_FRAME * frames, frames * MP3_FRAME_SECONDS
+
+
+class MockProvider:
+
+  def __init__(
+      self,
+      latency: float = 0.0,
+      jitter: float = 0.0,
+      model_latency: Dict[str, float] | None = None,
+      tokens_per_second: float = 0.0,
+      error_rate: float = 0.0,
+      model_error_rate: Dict[str, float] | None = None,
+      empty_rate: float = 0.0,
+      rpm: int = 0,
+      tts_latency: float = 0.0,
+      tts_rtf: float = 0.0,
+      tts_error_rate: float = 0.0,
+      tts_chars_per_second: float = 4.0,
+      seed: int = 7,
+  ):
+    """
+    :param latency: LLM 请求的基础延迟（秒），model_latency 可按模型覆盖
+    :param jitter: 延迟的相对抖动幅度（0.3 表示 ±30%）
+    :param tokens_per_second: 模拟输出速度，延迟额外加上 输出 token 数 / 该值，0 表示不计
+    :param error_rate: 返回 500 的比例，model_error_rate 可按模型覆盖
+    :param empty_rate: 返回空内容的比例（HTTP 200）
+    :param rpm: 每个模型每分钟的请求上限，超出返回 429，0 表示不限
+    :param tts_latency: TTS 首包延迟（秒）
+    :param tts_rtf: TTS 实时率：推送 1 秒音频耗时 tts_rtf 秒
+    :param tts_error_rate: TTS 连接直接断开（不返回音频）的比例
+    :param tts_chars_per_second: 合成音频的朗读语速，决定音频时长
+    """
+    self.latency = latency
+    self.jitter = jitter
+    self.model_latency = model_latency or {}
+    self.tokens_per_second = tokens_per_second
+    self.error_rate = error_rate
+    self.model_error_rate = model_error_rate or {}
+    self.empty_rate = empty_rate
+    self.rpm = rpm
+    self.tts_latency = tts_latency
+    self.tts_rtf = tts_rtf
+    self.tts_error_rate = tts_error_rate
+    self.tts_chars_per_second = tts_chars_per_second
+    self.seed = seed
+    self._seen: Counter = Counter()
+    self._windows: Dict[str, Deque[float]] = {}
+    self.stats: Counter = Counter()
+
+  def _rng(self, body: bytes) -> random.Random:
+    digest = hashlib.sha256(body).hexdigest()
+    self._seen[digest] += 1
+    return random.Random(f"{self.seed}:{digest}:{self._seen[digest]}")
+
+  def _retry_after(self, model: str) -> float | None:
+    """RPM 滑动窗口：未超限时记入本次请求并返回 None，超限时返回需等待的秒数"""
+    if not self.rpm:
+      return None
+    window = self._windows.setdefault(model, deque())
+    now = time.monotonic()
+    while window and now - window[0] >= 60:
+      window.popleft()
+    if len(window) >= self.rpm:
+      return 60 - (now - window[0])
+    window.append(now)
+    return None
+
+  async def chat_completions(self, request: web.Request) -> web.Response:
+    body = await request.read()
+    try:
+      payload = json.loads(body)
+    except ValueError:
+      return web.json_response({"error": {"message": "invalid json", "type": "invalid_request_error"}}, status=400)
+    model = payload.get("model") or "mock"
+    rnd = self._rng(body)
+    self.stats["llm_requests"] += 1
+
+    retry_after = self._retry_after(model)
+    if retry_after is not None:
+      self.stats["llm_429"] += 1
+      return web.json_response(
+          {"error": {"message": f"Rate limit reached for {model}", "type": "rate_limit_error"}},
+          status=429, headers={"Retry-After": f"{max(1, round(retry_after))}"}
+      )
+
+    text, urls = _message_parts(payload.get("messages"))
+    if "scene_id" in text and "img_index" in text:
+      content = json.dumps(make_script(text, urls, rnd), ensure_ascii=False)
+    elif "专业术语" in text:
+      content = json.dumps(make_terms(text), ensure_ascii=False)
+    else:
+      content = "OK"
+    prompt_tokens = len(text) + 1000 * len(urls)
+    completion_tokens = max(1, len(content) // 2)
+
+    delay = self.model_latency.get(model, self.latency) * (1 + self.jitter * rnd.uniform(-1, 1))
+    if self.tokens_per_second:
+      delay += completion_tokens / self.tokens_per_second
+    await asyncio.sleep(max(0.0, delay))
+
+    if rnd.random() < self.model_error_rate.get(model, self.error_rate):
+      self.stats["llm_500"] += 1
+      return web.json_response({"error": {"message": "mock internal error", "type": "server_error"}}, status=500)
+    if rnd.random() < self.empty_rate:
+      self.stats["llm_empty"] += 1
+      content = ""
+
+    return web.json_response({
+      "id": f"chatcmpl-mock-{uuid.uuid4().hex[:12]}",
+      "object": "chat.completion",
+      "created": int(time.time()),
+      "model": model,
+      "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+      "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+    })
+
+  async def models(self, request: web.Request) -> web.Response:
+    names = sorted({"mock-fast", "mock-slow", "mock-backup", *self.model_latency, *self.model_error_rate})
+    return web.json_response({"object": "list", "data": [{"id": name, "object": "model", "owned_by": "mock"} for name in names]})
+
+  async def edge_tts(self, request: web.Request) -> web.WebSocketResponse:
+    ws = web.WebSocketResponse()
+    await ws.prepare(request)
+    word_boundary = False
+    async for message in ws:
+      if message.type != WSMsgType.TEXT:
+        continue
+      headers, _, data = message.data.partition("\r\n\r\n")
+      if "Path:speech.config" in headers:
+        word_boundary = '"wordBoundaryEnabled":"true"' in data
+        continue
+      if "Path:ssml" not in headers:
+        continue
+
+      request_id = re.search(r"X-RequestId:(\w+)", headers).group(1)
+      voice = (re.search(r"<voice name='([^']*)'>", data) or re.search(r'<voice name="([^"]*)">', data)).group(1)
+      match = re.search(r"<prosody[^>]*>(.*)</prosody>", data, re.S)
+      text = html.unescape(match.group(1) if match else "")
+      rnd = self._rng(f"tts:{voice}:{text}".encode())
+      self.stats["tts_requests"] += 1
+      if rnd.random() < self.tts_error_rate:
+        # 不返回任何音频直接断开，edge-tts 抛出 NoAudioReceived
+        self.stats["tts_errors"] += 1
+        await ws.close()
+        break
+      await self._stream_tts(ws, request_id, text, word_boundary)
+      await ws.close()
+      break
+    return ws
+
+  async def _stream_tts(self, ws: web.WebSocketResponse, request_id: str, text: str, word_boundary: bool):
+    audio, duration = make_audio(text, self.tts_chars_per_second)
+
+    def _text_frame(path: str, body: str) -> str:
+      return f"X-RequestId:{request_id}\r\nContent-Type:application/json; charset=utf-8\r\nPath:{path}\r\n\r\n{body}"
+
+    # 边界事件：按字数比例在音频时长内分配 offset / duration（单位 100 纳秒）
+    units = [s for s in (re.findall(r"[A-Za-z0-9]+|[^\sA-Za-z0-9]", text) if word_boundary else SENTENCE_PATTERN.findall(text)) if s.strip()]
+    total_chars = sum(len(u) for u in units) or 1
+    boundaries, offset = [], 0
+    for unit in units:
+      span = int(duration * TICKS_PER_SECOND * len(unit) / total_chars)
+      kind = "WordBoundary" if word_boundary else "SentenceBoundary"
+      boundaries.append({"Metadata": [{"Type": kind, "Data": {"Offset": offset, "Duration": span, "text": {"Text": unit.strip(), "Length": len(unit.strip()), "BoundaryType": kind}}}]})
+      offset += span
+
+    await asyncio.sleep(self.tts_latency)
+    await ws.send_str(_text_frame("turn.start", '{"context":{"serviceTag":"mock"}}'))
+    header = f"X-RequestId:{request_id}\r\nContent-Type:audio/mpeg\r\nPath:audio\r\n".encode()
+    chunk_size = len(MP3_SILENT_FRAME) * 40  # 约 0.96 秒一块
+    chunks = [audio[i:i + chunk_size] for i in range(0, len(audio), chunk_size)]
+    for index, chunk in enumerate(chunks):
+      # 边界事件穿插在对应时间段的音频块之前
+      chunk_end = (index + 1) * chunk_size / len(audio) * duration * TICKS_PER_SECOND
+      while boundaries and boundaries[0]["Metadata"][0]["Data"]["Offset"] < chunk_end:
+        await ws.send_str(_text_frame("audio.metadata", json.dumps(boundaries.pop(0), ensure_ascii=False)))
+      await ws.send_bytes(len(header).to_bytes(2, "big") + header + chunk)
+      if self.tts_rtf:
+        await asyncio.sleep(len(chunk) / len(audio) * duration * self.tts_rtf)
+    await ws.send_str(_text_frame("turn.end", "{}"))
+
+  def app(self) -> web.Application:
+    app = web.Application(client_max_size=256 * 1024 * 1024)
+    app.router.add_post("/v1/chat/completions", self.chat_completions)
+    app.router.add_post("/chat/completions", self.chat_completions)
+    app.router.add_get("/v1/models", self.models)
+    app.router.add_get("/edge/v1", self.edge_tts)
+    app.router.add_get("/consumer/speech/synthesize/readaloud/edge/v1", self.edge_tts)
+    return app
+
+
+class MockProviderServer:
+  """在后台线程的独立事件循环里运行替身服务"""
+
+  def __init__(self, provider: MockProvider, port: int = 0):
+    self.provider = provider
+    self.loop = asyncio.new_event_loop()
+    self.runner = web.AppRunner(provider.app(), access_log=None)
+    self.port = port
+    started = threading.Event()
+    threading.Thread(target=self._serve, args=(started,), daemon=True).start()
+    started.wait()
+
+  def _serve(self, started: threading.Event):
+    asyncio.set_event_loop(self.loop)
+    self.loop.run_until_complete(self.runner.setup())
+    site = web.TCPSite(self.runner, "127.0.0.1", self.port)
+    self.loop.run_until_complete(site.start())
+    self.port = self.runner.addresses[0][1]
+    started.set()
+    self.loop.run_forever()
+
+  def shutdown(self):
+    asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result(timeout=10)
+    self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+@contextlib.contextmanager
+def patch_edge_tts(endpoint: str) -> Iterator[str]:
+  """
+  在 with 块内把 edge-tts 的服务地址指向替身（"127.0.0.1:端口"），退出时还原。
+  edge-tts 建连时以 f"{WSS_URL}&ConnectionId=..." 拼接模块级常量；拼接方式变化时直接报错，
+  避免补丁静默失效、基准流量打到官方服务。
+  """
+  source = inspect.getsource(edge_tts.communicate.Communicate)
+  if 'f"{WSS_URL}&ConnectionId=' not in source:
+    raise RuntimeError(f"edge-tts {edge_tts.__version__} 的建连地址拼接方式已变化，无法指向替身")
+  url = f"ws://{endpoint}/edge/v1?TrustedClientToken=mock"
+  with mock.patch.object(edge_tts.communicate, "WSS_URL", url):
+    yield url
+
+
+def start_mock_provider(port: int = 0, **options) -> Tuple[MockProviderServer, str]:
+  """在后台线程启动替身服务，返回 (server, "127.0.0.1:端口")"""
+  server = MockProviderServer(MockProvider(**options), port)
+  return server, f"127.0.0.1:{server.port}"
+
+
+def main():
+  parser = argparse.ArgumentParser(description="本地 LLM（OpenAI 兼容）/ edge-tts 替身")
+  parser.add_argument("--port", type=int, default=8765)
+  parser.add_argument("--latency", type=float, default=1.0, help="LLM 请求的基础延迟（秒）")
+  parser.add_argument("--jitter", type=float, default=0.2, help="延迟的相对抖动幅度")
+  parser.add_argument("--model-latency", type=str, default="", help="按模型覆盖基础延迟，如 mock-slow=30,mock-fast=2")
+  parser.add_argument("--tokens-per-second", type=float, default=0.0, help="模拟输出速度，0 表示不计")
+  parser.add_argument("--error-rate", type=float, default=0.0, help="返回 500 的比例")
+  parser.add_argument("--model-error-rate", type=str, default="", help="按模型覆盖 500 比例，如 mock-flaky=0.5")
+  parser.add_argument("--empty-rate", type=float, default=0.0, help="返回空内容的比例")
+  parser.add_argument("--rpm", type=int, default=0, help="每个模型每分钟请求上限，超出返回 429，0 表示不限")
+  parser.add_argument("--tts-latency", type=float, default=0.2, help="TTS 首包延迟（秒）")
+  parser.add_argument("--tts-rtf", type=float, default=0.05, help="TTS 实时率（推送 1 秒音频的耗时）")
+  parser.add_argument("--tts-error-rate", type=float, default=0.0, help="TTS 不返回音频直接断开的比例")
+  parser.add_argument("--tts-chars-per-second", type=float, default=4.0, help="合成音频的朗读语速")
+  parser.add_argument("--seed", type=int, default=7)
+  args = parser.parse_args()
+
+  server, endpoint = start_mock_provider(
+      args.port, latency=args.latency, jitter=args.jitter, model_latency=_parse_model_map(args.model_latency),
+      tokens_per_second=args.tokens_per_second, error_rate=args.error_rate,
+      model_error_rate=_parse_model_map(args.model_error_rate), empty_rate=args.empty_rate, rpm=args.rpm,
+      tts_latency=args.tts_latency, tts_rtf=args.tts_rtf, tts_error_rate=args.tts_error_rate,
+      tts_chars_per_second=args.tts_chars_per_second, seed=args.seed
+  )
+  print(f"Mock LLM / TTS 已启动: http://{endpoint}/v1，TTS ws://{endpoint}/edge/v1?TrustedClientToken=mock")
+  try:
+    threading.Event().wait()
+  except KeyboardInterrupt:
+    print(json.dumps(dict(server.provider.stats), ensure_ascii=False))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,121 @@
+# benchmarks/oss_upload.py
+"""
+成片上传基准：对本地 S3 替身（benchmarks.mock_oss）上传同一个大文件，对比
+  legacy    —— 旧实现：f.read() 整个文件后单次 PUT
+  stream    —— 流式单次 PUT（预签名地址，与 _upload_file 的小文件路径相同）
+  multipart —— minio SDK 分片并发上传（可多个并发度，与 _upload_file 的成片路径相同），可注入分片失败验证单片重传
+输出耗时、吞吐与子进程峰值 RSS，并校验落盘内容与源文件一致。每个用例在独立子进程中运行。
+
+用法（在 app_backend 目录下）:
+  python -m benchmarks.oss_upload --size-mb 512 --bandwidth-mb 50 --concurrency 1,4,8 --fail-parts 2
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import httpx
+from minio import Minio
+
+from benchmarks.mock_oss import start_mock_oss
+
+BUCKET = "bench"
+MB = 1024 * 1024
+
+
+def _sha256(path: str) -> str:
+  digest = hashlib.sha256()
+  with open(path, "rb") as f:
+    while chunk := f.read(MB):
+      digest.update(chunk)
+  return digest.hexdigest()
+
+
+async def _presigned_put(url: str, path: str, stream: bool):
+  async def _chunks():
+    with open(path, "rb") as f:
+      while chunk := await asyncio.to_thread(f.read, MB):
+        yield chunk
+
+  async with httpx.AsyncClient(timeout=600) as client:
+    if stream:
+      resp = await client.put(url, content=_chunks(), headers={"Content-Type": "video/mp4", "Content-Length": str(os.path.getsize(path))})
+    else:
+      with open(path, "rb") as f:
+        resp = await client.put(url, content=f.read(), headers={"Content-Type": "video/mp4"})
+    resp.raise_for_status()
+
+
+def run_case(args, mode: str, concurrency: int) -> dict:
+  # 指定 region，避免 SDK 先请求 GetBucketLocation
+  client = Minio(args.endpoint, "bench", "bench-secret", secure=False, region="us-east-1")
+  key = f"{mode}_{concurrency}.mp4"
+  started = time.perf_counter()
+  if mode == "multipart":
+    client.fput_object(BUCKET, key, args.file, content_type="video/mp4", part_size=args.part_mb * MB, num_parallel_uploads=concurrency)
+  else:
+    asyncio.run(_presigned_put(client.presigned_put_object(BUCKET, key), args.file, stream=mode == "stream"))
+  wall = time.perf_counter() - started
+  return {"key": key, "wall_s": round(wall, 3), "rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+
+
+def main():
+  parser = argparse.ArgumentParser(description="成片上传基准（本地 S3 替身）")
+  parser.add_argument("--size-mb", type=int, default=256, help="测试文件大小")
+  parser.add_argument("--part-mb", type=int, default=16, help="分片大小")
+  parser.add_argument("--concurrency", type=str, default="1,4,8", help="逗号分隔的分片并发度")
+  parser.add_argument("--latency", type=float, default=0.02, help="替身每个请求的延迟（秒）")
+  parser.add_argument("--bandwidth-mb", type=float, default=0.0, help="替身每个连接的限速（MB/s），模拟慢链路")
+  parser.add_argument("--fail-parts", type=str, default="", help="首次上传返回 500 的分片号")
+  parser.add_argument("--work-dir", type=str, default="var/bench")
+  parser.add_argument("--case", type=str, default="", help=argparse.SUPPRESS)
+  parser.add_argument("--endpoint", type=str, default="", help=argparse.SUPPRESS)
+  parser.add_argument("--file", type=str, default="", help=argparse.SUPPRESS)
+  args = parser.parse_args()
+
+  if args.case:
+    mode, concurrency = args.case.split(":")
+    print(json.dumps(run_case(args, mode, int(concurrency))))
+    return
+
+  os.makedirs(args.work_dir, exist_ok=True)
+  src_path = os.path.join(args.work_dir, f"upload_{args.size_mb}mb.bin")
+  if not os.path.exists(src_path) or os.path.getsize(src_path) != args.size_mb * MB:
+    with open(src_path, "wb") as f:
+      for _ in range(args.size_mb):
+        f.write(os.urandom(MB))
+  src_sha = _sha256(src_path)
+
+  oss_root = os.path.join(args.work_dir, "mock_oss")
+  server, endpoint = start_mock_oss(
+      oss_root, latency=args.latency, bandwidth=args.bandwidth_mb * MB,
+      fail_parts={int(n) for n in args.fail_parts.split(",") if n}
+  )
+  cases = [("legacy", 1), ("stream", 1)] + [("multipart", int(c)) for c in args.concurrency.split(",") if c]
+
+  print(f"{'case':<16} {'wall(s)':>8} {'MB/s':>8} {'RSS(MB)':>8} {'verified':>9}")
+  for mode, concurrency in cases:
+    proc = subprocess.run(
+        [sys.executable, "-m", "benchmarks.oss_upload", *sys.argv[1:], "--case", f"{mode}:{concurrency}", "--endpoint", endpoint, "--file", src_path],
+        capture_output=True, text=True
+    )
+    name = f"{mode}×{concurrency}" if mode == "multipart" else mode
+    if proc.returncode != 0:
+      print(f"{name:<16} 失败: {proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else proc.returncode}")
+      continue
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    uploaded = os.path.join(oss_root, BUCKET, result["key"])
+    verified = os.path.exists(uploaded) and _sha256(uploaded) == src_sha
+    print(f"{name:<16} {result['wall_s']:>8.2f} {args.size_mb / result['wall_s']:>8.1f} {result['rss_mb']:>8.1f} {str(verified):>9}")
+    if os.path.exists(uploaded):
+      os.remove(uploaded)
+  server.shutdown()
+
+
+if __name__ == "__main__":
+  main()
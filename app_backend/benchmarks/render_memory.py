@@ -0,0 +1,70 @@
+# benchmarks/render_memory.py
+"""
+渲染内存基准：同一份素材分别渲染不同场景数的章节，记录每次渲染的峰值 RSS。
+每个场景数在独立子进程中运行，ru_maxrss 互不干扰；峰值内存应与场景数无关，基本保持水平。
+
+用法（在 app_backend 目录下）:
+  python -m benchmarks.render_memory --scenes 10,30,60 --engine moviepy
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from app.video_renderer import VideoRenderer
+from benchmarks.synthetic import setup_ffmpeg, make_pages, make_silent_audio, make_scenes
+
+
+def peak_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+  # Linux 下 ru_maxrss 单位为 KB
+  return resource.getrusage(who).ru_maxrss / 1024
+
+
+def run_child(args):
+  setup_ffmpeg()
+  pages = make_pages(os.path.join(args.work_dir, "pages"), args.pages)
+  audio = make_silent_audio(os.path.join(args.work_dir, "audio"), args.child, args.duration)
+  scenes = make_scenes(args.child, args.pages, args.duration)
+
+  renderer = VideoRenderer(engine=args.engine, preset="ultrafast", workers=args.workers)
+  output_path = os.path.join(args.work_dir, f"memory_{args.engine}_{args.child}.mp4")
+  started = time.perf_counter()
+  renderer.render(scenes, pages, audio, output_path)
+  print(json.dumps({
+    "scenes": args.child,
+    "wall": time.perf_counter() - started,
+    "rss_mb": peak_rss_mb(),
+    "children_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN),
+  }))
+
+
+def main():
+  parser = argparse.ArgumentParser(description="渲染峰值内存基准")
+  parser.add_argument("--scenes", type=str, default="10,30,60", help="逗号分隔的场景数列表")
+  parser.add_argument("--pages", type=int, default=20, help="书页数（多个场景共享同一书页）")
+  parser.add_argument("--duration", type=float, default=2.0, help="每个场景时长（秒）")
+  parser.add_argument("--engine", type=str, default="moviepy", help="segment / ffmpeg / moviepy")
+  parser.add_argument("--workers", type=int, default=0)
+  parser.add_argument("--work-dir", type=str, default="var/bench")
+  parser.add_argument("--child", type=int, default=0, help=argparse.SUPPRESS)
+  args = parser.parse_args()
+
+  if args.child:
+    run_child(args)
+    return
+
+  print(f"{'scenes':>7} {'wall(s)':>9} {'python RSS(MB)':>15} {'ffmpeg RSS(MB)':>15}")
+  for count in sorted({int(c) for c in args.scenes.split(",") if c}):
+    proc = subprocess.run(
+        [sys.executable, "-m", "benchmarks.render_memory", *sys.argv[1:], "--child", str(count)],
+        capture_output=True, text=True, check=True
+    )
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    print(f"{count:>7} {result['wall']:>9.2f} {result['rss_mb']:>15.1f} {result['children_rss_mb']:>15.1f}")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,178 @@
+# benchmarks/render_suite.py
+"""
+渲染基准套件：合成书页 + 静音配音，按 引擎 × 编码预设 × 运镜 × 草稿 的组合逐一渲染，
+输出每个用例的耗时、实时率、峰值 RSS、CPU 利用率与成片大小，结果写为 JSON，便于版本间对比。
+全程离线，不依赖真实书籍、LLM 与 TTS；每个用例在独立子进程中运行，ru_maxrss 与 CPU 计时互不干扰。
+
+用法（在 app_backend 目录下）:
+  python -m benchmarks.render_suite --engines segment,ffmpeg --presets ultrafast,medium --motion --draft
+  python -m benchmarks.render_suite --output var/bench/new.json --baseline var/bench/old.json
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+from app.video_renderer import VideoRenderer
+from benchmarks.synthetic import setup_ffmpeg, make_pages, make_silent_audio, make_scenes
+
+
+def _cpu_seconds(who: int) -> float:
+  usage = resource.getrusage(who)
+  return usage.ru_utime + usage.ru_stime
+
+
+def _git_revision() -> str:
+  try:
+    proc = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10)
+    return proc.stdout.strip() or "unknown"
+  except Exception:
+    return "unknown"
+
+
+def run_case(args, case: dict) -> dict:
+  """子进程内执行单个用例；CPU 时间包含 ffmpeg 子进程，峰值 RSS 分别统计 Python 进程与 ffmpeg 子进程"""
+  setup_ffmpeg()
+  pages = make_pages(os.path.join(args.work_dir, "pages"), args.pages)
+  audio = make_silent_audio(os.path.join(args.work_dir, "audio"), args.scenes, args.duration)
+  scenes = make_scenes(args.scenes, args.pages, args.duration, motion=case["motion"])
+
+  renderer = VideoRenderer(engine=case["engine"], preset=case["preset"], workers=args.workers, draft=case["draft"])
+  output_path = os.path.join(args.work_dir, f"suite_{case['name'].replace('/', '_')}.mp4")
+  if os.path.exists(output_path):
+    os.remove(output_path)
+
+  cpu_started = _cpu_seconds(resource.RUSAGE_SELF) + _cpu_seconds(resource.RUSAGE_CHILDREN)
+  started = time.perf_counter()
+  renderer.render(scenes, pages, audio, output_path)
+  wall = time.perf_counter() - started
+  cpu = _cpu_seconds(resource.RUSAGE_SELF) + _cpu_seconds(resource.RUSAGE_CHILDREN) - cpu_started
+
+  media_seconds = args.scenes * args.duration
+  # Linux 下 ru_maxrss 单位为 KB
+  return {
+    **case,
+    "wall_s": round(wall, 3),
+    "media_s": media_seconds,
+    "rtf": round(wall / media_seconds, 4),
+    "x_realtime": round(media_seconds / wall, 2),
+    "cpu_s": round(cpu, 3),
+    "cpu_util": round(cpu / wall / (os.cpu_count() or 1), 3),
+    "rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    "children_rss_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+    "output_bytes": os.path.getsize(output_path),
+    "resolution": f"{renderer.output_width}x{renderer.output_height}",
+  }
+
+
+def build_cases(args) -> list[dict]:
+  engines = [e for e in args.engines.split(",") if e]
+  presets = [p for p in args.presets.split(",") if p]
+  motions = [False, True] if args.motion else [False]
+  cases = []
+  for engine, preset, motion in itertools.product(engines, presets, motions):
+    cases.append({"name": f"{engine}/{preset}/{'motion' if motion else 'static'}", "engine": engine, "preset": preset, "motion": motion, "draft": False})
+  if args.draft:
+    # 草稿模式固定使用 DRAFT_PRESET，每个引擎只跑一次
+    for engine in engines:
+      cases.append({"name": f"{engine}/draft", "engine": engine, "preset": VideoRenderer.DRAFT_PRESET, "motion": True, "draft": True})
+  return cases
+
+
+def compare(results: list[dict], baseline_path: str, threshold: float, log=sys.stdout) -> list[str]:
+  """与基线结果按用例名对比耗时、峰值内存与成片大小，超出阈值的记为回退"""
+  with open(baseline_path, "r", encoding="utf-8") as f:
+    baseline = {case["name"]: case for case in json.load(f)["cases"]}
+  regressions = []
+  print(f"\n{'case':<32} {'wall':>8} {'rss':>8} {'size':>8}   (相对基线 {os.path.basename(baseline_path)})", file=log)
+  for case in results:
+    base = baseline.get(case["name"])
+    if not base:
+      continue
+    ratios = {
+      "wall": case["wall_s"] / max(base["wall_s"], 1e-6),
+      "rss": max(case["rss_mb"], case["children_rss_mb"]) / max(base["rss_mb"], base["children_rss_mb"], 1e-6),
+      "size": case["output_bytes"] / max(base["output_bytes"], 1),
+    }
+    print(f"{case['name']:<32} {ratios['wall']:>7.2f}x {ratios['rss']:>7.2f}x {ratios['size']:>7.2f}x", file=log)
+    regressions += [f"{case['name']} {metric} {ratio:.2f}x" for metric, ratio in ratios.items() if ratio > threshold]
+  return regressions
+
+
+def main():
+  parser = argparse.ArgumentParser(description="渲染基准套件（离线、JSON 输出）")
+  parser.add_argument("--engines", type=str, default="segment,ffmpeg,moviepy", help="逗号分隔的渲染引擎")
+  parser.add_argument("--presets", type=str, default="ultrafast,medium", help="逗号分隔的 x264 预设")
+  parser.add_argument("--motion", action="store_true", help="额外跑一组轮换 ZoomIn / Highlight / ZoomOut 的运镜用例")
+  parser.add_argument("--draft", action="store_true", help="额外跑草稿模式用例")
+  parser.add_argument("--scenes", type=int, default=12, help="场景数")
+  parser.add_argument("--pages", type=int, default=8, help="书页数")
+  parser.add_argument("--duration", type=float, default=5.0, help="每个场景时长（秒）")
+  parser.add_argument("--workers", type=int, default=0, help="segment 引擎并行度，0 为全部核")
+  parser.add_argument("--work-dir", type=str, default="var/bench")
+  parser.add_argument("--output", type=str, default="var/bench/render_suite.json", help="结果 JSON 路径，- 表示输出到标准输出")
+  parser.add_argument("--baseline", type=str, default="", help="基线结果 JSON，存在回退时以非零状态退出")
+  parser.add_argument("--threshold", type=float, default=1.15, help="回退阈值（相对基线的倍数）")
+  parser.add_argument("--case", type=str, default="", help=argparse.SUPPRESS)
+  args = parser.parse_args()
+
+  if args.case:
+    print(json.dumps(run_case(args, json.loads(args.case))))
+    return
+
+  # 素材在父进程中预先生成，不计入任何用例的耗时
+  setup_ffmpeg()
+  make_pages(os.path.join(args.work_dir, "pages"), args.pages)
+  make_silent_audio(os.path.join(args.work_dir, "audio"), args.scenes, args.duration)
+
+  log = sys.stderr if args.output == "-" else sys.stdout
+  print(f"{'case':<32} {'wall(s)':>8} {'x realtime':>10} {'cpu util':>9} {'RSS(MB)':>8} {'ffmpeg RSS':>10} {'size(KB)':>9}", file=log)
+  results = []
+  for case in build_cases(args):
+    proc = subprocess.run(
+        [sys.executable, "-m", "benchmarks.render_suite", *sys.argv[1:], "--case", json.dumps(case)],
+        capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+      print(f"{case['name']:<32} 失败: {proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else proc.returncode}", file=log)
+      results.append({**case, "error": proc.stderr[-2000:]})
+      continue
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    results.append(result)
+    print(
+        f"{case['name']:<32} {result['wall_s']:>8.2f} {result['x_realtime']:>10.1f} {result['cpu_util']:>9.0%} "
+        f"{result['rss_mb']:>8.1f} {result['children_rss_mb']:>10.1f} {result['output_bytes'] / 1024:>9.0f}",
+        file=log
+    )
+
+  report = {
+    "revision": _git_revision(),
+    "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    "host": {"platform": platform.platform(), "python": platform.python_version(), "cpu_count": os.cpu_count()},
+    "params": {"scenes": args.scenes, "pages": args.pages, "duration": args.duration, "workers": args.workers},
+    "cases": results,
+  }
+  if args.output == "-":
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+  else:
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+      json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已写入 {args.output}")
+
+  if args.baseline:
+    regressions = compare([r for r in results if "error" not in r], args.baseline, args.threshold, log)
+    if regressions:
+      print("\n性能回退:\n  " + "\n  ".join(regressions), file=sys.stderr)
+      sys.exit(1)
+  if any("error" in r for r in results):
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+  main()
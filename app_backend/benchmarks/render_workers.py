@@ -0,0 +1,45 @@
+# benchmarks/render_workers.py
+"""
+segment 引擎并行度扩展性基准：同一章节分别以 1..N 个并行编码进程渲染，输出耗时与加速比。
+
+用法（在 app_backend 目录下）:
+  python -m benchmarks.render_workers --scenes 40 --duration 15 --workers 1,2,4,8
+"""
+import argparse
+import os
+import time
+
+from app.video_renderer import VideoRenderer
+from benchmarks.synthetic import setup_ffmpeg, make_pages, make_silent_audio, make_scenes
+
+
+def main():
+  parser = argparse.ArgumentParser(description="segment 引擎并行度扩展性基准")
+  parser.add_argument("--scenes", type=int, default=40, help="场景数")
+  parser.add_argument("--pages", type=int, default=20, help="书页数")
+  parser.add_argument("--duration", type=float, default=15.0, help="每个场景时长（秒），40×15s = 10 分钟")
+  parser.add_argument("--workers", type=str, default=f"1,2,4,{os.cpu_count()}", help="逗号分隔的并行度列表")
+  parser.add_argument("--preset", type=str, default="medium")
+  parser.add_argument("--work-dir", type=str, default="var/bench")
+  args = parser.parse_args()
+
+  setup_ffmpeg()
+  pages = make_pages(os.path.join(args.work_dir, "pages"), args.pages)
+  audio = make_silent_audio(os.path.join(args.work_dir, "audio"), args.scenes, args.duration)
+  scenes = make_scenes(args.scenes, args.pages, args.duration)
+  media_seconds = args.scenes * args.duration
+
+  baseline = None
+  print(f"{'workers':>8} {'wall(s)':>9} {'speedup':>8} {'x realtime':>11}")
+  for workers in sorted({int(w) for w in args.workers.split(",") if w}):
+    renderer = VideoRenderer(engine="segment", preset=args.preset, workers=workers)
+    output_path = os.path.join(args.work_dir, f"workers_{workers}.mp4")
+    started = time.perf_counter()
+    renderer.render(scenes, pages, audio, output_path)
+    wall = time.perf_counter() - started
+    baseline = baseline or wall
+    print(f"{workers:>8} {wall:>9.2f} {baseline / wall:>8.2f} {media_seconds / wall:>11.1f}")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,90 @@
+# benchmarks/synthetic.py
+"""离线基准素材：合成书页 WebP 与静音 MP3，不依赖真实书籍、LLM 与 TTS"""
+import os
+import random
+from typing import Dict
+
+from PIL import Image, ImageDraw
+
+from app.ffmpeg_helper import FfmpegHelper
+
+
+def setup_ffmpeg():
+  """与 main.py 一致：通过 imageio-ffmpeg 定位 ffmpeg"""
+  try:
+    from imageio_ffmpeg import get_ffmpeg_exe
+    os.environ.setdefault("IMAGEIO_FFMPEG_EXE", get_ffmpeg_exe())
+  except Exception as e:
+    print(f"Warning: Failed to locate ffmpeg via imageio-ffmpeg: {e}")
+
+
+def make_pages(out_dir: str, count: int, width: int = 1240, height: int = 1754, seed: int = 7) -> Dict[int, str]:
+  """生成 count 张模拟排版的书页 WebP，返回 {img_index: path}"""
+  os.makedirs(out_dir, exist_ok=True)
+  rnd = random.Random(seed)
+  paths: Dict[int, str] = {}
+  for i in range(1, count + 1):
+    path = os.path.join(out_dir, f"{i}.webp")
+    if not os.path.exists(path):
+      img = Image.new("RGB", (width, height), (250, 248, 240))
+      draw = ImageDraw.Draw(img)
+      margin = width // 10
+      y = height // 12
+      while y < height - height // 12:
+        line_w = rnd.randint(width // 2, width - 2 * margin)
+        draw.rectangle([margin, y, margin + line_w, y + height // 90], fill=(rnd.randint(20, 80),) * 3)
+        y += height // 45
+      draw.text((width // 2, height - height // 20), str(i), fill=(0, 0, 0))
+      img.save(path, "WEBP", quality=80)
+    paths[i] = path
+  return paths
+
+
+def make_silent_audio(out_dir: str, count: int, duration: float) -> Dict[int, str]:
+  """生成 count 段静音 MP3（与 edge-tts 输出一致：24kHz 单声道 48kbps），返回 {scene_id: path}"""
+  os.makedirs(out_dir, exist_ok=True)
+  template = os.path.join(out_dir, f"silence_{duration:.2f}.mp3")
+  if not os.path.exists(template):
+    FfmpegHelper.run([
+      "-f", "lavfi", "-t", f"{duration:.3f}", "-i", "anullsrc=r=24000:cl=mono",
+      "-c:a", "libmp3lame", "-b:a", "48k", "-write_xing", "0", "-id3v2_version", "0",
+      template
+    ])
+  return {i: template for i in range(1, count + 1)}
+
+
+# 运镜基准按顺序轮换的动作与焦点区域
+MOTION_CYCLE = [
+  ("Steady", [0.0, 0.0, 1.0, 1.0]),
+  ("ZoomIn", [0.1, 0.2, 0.6, 0.3]),
+  ("Highlight", [0.1, 0.45, 0.8, 0.2]),
+  ("ZoomOut", [0.3, 0.55, 0.6, 0.3]),
+]
+
+
+def make_scenes(count: int, pages: int, duration: float, motion: bool = False) -> list[dict]:
+  """按顺序把场景分配到书页上，模拟 AI 脚本；motion 为 True 时按 MOTION_CYCLE 轮换运镜动作"""
+  scenes = []
+  for i in range(1, count + 1):
+    action, focus = MOTION_CYCLE[(i - 1) % len(MOTION_CYCLE)] if motion else MOTION_CYCLE[0]
+    scenes.append({
+      "scene_id": i, "img_index": (i - 1) * pages // count + 1, "narration": "", "duration": duration,
+      "camera_action": action, "focus_area": list(focus),
+    })
+  return scenes
+
+
+def make_text_pdf(path: str, pages: int, vocabulary: list[str], words_per_page: int = 260, seed: int = 7) -> str:
+  """生成带文字层的中文 PDF（内置 china-s 字体），正文由 vocabulary 中的词随机拼成，用于术语扫描基准"""
+  if os.path.exists(path):
+    return path
+  import pymupdf
+  os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+  rnd = random.Random(seed)
+  with pymupdf.open() as doc:
+    for _ in range(pages):
+      page = doc.new_page(width=595, height=842)
+      text = "".join(rnd.choice(vocabulary) + ("。" if rnd.random() < 0.1 else "") for _ in range(words_per_page))
+      page.insert_textbox(pymupdf.Rect(50, 50, 545, 792), text, fontname="china-s", fontsize=11)
+    doc.save(path, garbage=1, deflate=True)
+  return path
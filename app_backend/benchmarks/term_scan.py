@@ -0,0 +1,96 @@
+# benchmarks/term_scan.py
+"""
+术语坐标扫描基准：合成带文字层的中文 PDF，对比
+  per_term  —— 旧实现的方式：每个术语逐页 page.search_for，一个术语扫一遍全书
+  automaton —— app.term_matcher.TermMatcher：所有术语建一个 Aho-Corasick 自动机，每页文字层只扫一遍
+在不同术语数量下的耗时与命中数；再以最大的术语数，对比 scan_terms_sharded 在不同进程数下的分片并行扫描。
+
+用法（在 app_backend 目录下）:
+  python -m benchmarks.term_scan --pages 200 --terms 50,200,500
+  python -m benchmarks.term_scan --pages 1000 --terms 500 --skip-per-term-above 0 --workers 1,2,4,8
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+import pymupdf
+
+from app.term_matcher import TermMatcher, scan_terms_sharded
+from benchmarks.synthetic import make_text_pdf
+
+SYLLABLES = "区块链共识机制智能合约分布式账本哈希函数公钥私钥签名验证节点网络交易手续费钱包地址挖矿算力难度调整侧链跨链预言机流动性质押治理代币"
+
+
+def make_vocabulary(size: int, seed: int = 7) -> list[str]:
+  rnd = random.Random(seed)
+  words = set()
+  while len(words) < size:
+    words.add("".join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 4))))
+  return sorted(words) + ["DeFi", "Ethereum", "Layer2", "zk-SNARK"]
+
+
+def scan_per_term(pdf_path: str, keywords: list[str]) -> int:
+  hits = 0
+  with pymupdf.open(pdf_path) as doc:
+    for keyword in keywords:
+      for page in doc:
+        hits += bool(page.search_for(keyword))
+  return hits
+
+
+def scan_automaton(pdf_path: str, keywords: list[str]) -> int:
+  result = TermMatcher.scan_terms_in_range(pdf_path, 1, 1 << 30, keywords)
+  return sum(len(matches) for matches in result.values())
+
+
+async def scan_sharded(pdf_path: str, keywords: list[str], workers: int, shard_pages: int) -> int:
+  pairs = 0
+  async for _done, _total, result in scan_terms_sharded(pdf_path, 1, 1 << 30, keywords, workers=workers, shard_pages=shard_pages):
+    pairs += sum(len(matches) for matches in result.values())
+  return pairs
+
+
+def main():
+  parser = argparse.ArgumentParser(description="术语坐标扫描基准（逐术语 vs 单遍自动机）")
+  parser.add_argument("--pages", type=int, default=100, help="书页数")
+  parser.add_argument("--terms", type=str, default="50,200,500", help="逗号分隔的术语数量")
+  parser.add_argument("--skip-per-term-above", type=int, default=1000, help="术语数超过该值时跳过逐术语用例（太慢）")
+  parser.add_argument("--workers", type=str, default=f"1,2,{os.cpu_count()}", help="逗号分隔的分片扫描进程数，留空跳过")
+  parser.add_argument("--shard-pages", type=int, default=50, help="分片扫描每个分片的页数")
+  parser.add_argument("--work-dir", type=str, default="var/bench")
+  args = parser.parse_args()
+
+  vocabulary = make_vocabulary(800)
+  pdf_path = make_text_pdf(f"{args.work_dir}/terms_{args.pages}p.pdf", args.pages, vocabulary)
+  rnd = random.Random(11)
+
+  print(f"{'terms':>6} {'per_term(s)':>12} {'automaton(s)':>13} {'speedup':>8} {'pairs':>12}")
+  for count in [int(n) for n in args.terms.split(",") if n]:
+    keywords = rnd.sample(vocabulary, min(count, len(vocabulary)))
+    started = time.perf_counter()
+    automaton_pairs = scan_automaton(pdf_path, keywords)
+    automaton_s = time.perf_counter() - started
+    if count <= args.skip_per_term_above:
+      started = time.perf_counter()
+      per_term_pairs = scan_per_term(pdf_path, keywords)
+      per_term_s = time.perf_counter() - started
+      print(f"{count:>6} {per_term_s:>12.2f} {automaton_s:>13.2f} {per_term_s / automaton_s:>7.1f}x {per_term_pairs:>5}/{automaton_pairs:<6}")
+    else:
+      print(f"{count:>6} {'-':>12} {automaton_s:>13.2f} {'-':>8} {'-':>5}/{automaton_pairs:<6}")
+
+  if not args.workers:
+    return
+  print(f"\n{'workers':>7} {'sharded(s)':>11} {'speedup':>8} {'pairs':>7}  （{len(keywords)} 个术语，含进程池启动）")
+  baseline = 0.0
+  for workers in sorted({int(n) for n in args.workers.split(",") if n}):
+    started = time.perf_counter()
+    pairs = asyncio.run(scan_sharded(pdf_path, keywords, workers, args.shard_pages))
+    elapsed = time.perf_counter() - started
+    baseline = baseline or elapsed
+    print(f"{workers:>7} {elapsed:>11.2f} {baseline / elapsed:>7.1f}x {pairs:>7}")
+
+
+if __name__ == "__main__":
+  main()